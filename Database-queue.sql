@@ -37,7 +37,10 @@ CREATE TABLE queue (
     user_id BIGINT NOT NULL,
     university_id INT NOT NULL,
     join_time DATETIME NOT NULL,
+    seq BIGINT NOT NULL AUTO_INCREMENT,
     PRIMARY KEY (user_id, university_id),
+    KEY idx_queue_seq (seq),
+    KEY idx_queue_university_seq (university_id, seq),
     FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
     FOREIGN KEY (university_id) REFERENCES universities(university_id) ON DELETE CASCADE
 );
@@ -48,10 +51,21 @@ CREATE TABLE user_history (
     id INT AUTO_INCREMENT PRIMARY KEY,
     user_id BIGINT NOT NULL,
     action VARCHAR(255) NOT NULL,
+    university_id INT NULL,
     timestamp DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_user_history_user_time (user_id, timestamp, id),
+    INDEX idx_user_history_time (timestamp),
     FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
 );
 
+-- Create the fsm_storage table (aiogram FSM state shared by all bot processes)
+DROP TABLE IF EXISTS fsm_storage;
+CREATE TABLE fsm_storage (
+    storage_key VARCHAR(255) PRIMARY KEY,
+    state VARCHAR(255) NULL,
+    data TEXT NULL
+);
+
 -- Create the broadcast_messages table (removed admin_name)
 DROP TABLE IF EXISTS broadcast_messages;
 CREATE TABLE broadcast_messages (
@@ -59,9 +73,68 @@ CREATE TABLE broadcast_messages (
     admin_id BIGINT NOT NULL,
     message_text TEXT NOT NULL,
     timestamp DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_broadcast_messages_time (timestamp),
     FOREIGN KEY (admin_id) REFERENCES users(user_id) ON DELETE CASCADE
 );
 
+-- Create the outbox tables (durable per-recipient delivery state)
+DROP TABLE IF EXISTS outbox_messages;
+DROP TABLE IF EXISTS outbox_batches;
+CREATE TABLE outbox_batches (
+    batch_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    admin_id BIGINT NULL,
+    total INT NOT NULL,
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    finished_at DATETIME NULL
+);
+CREATE TABLE outbox_messages (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    batch_id BIGINT NOT NULL,
+    chat_id BIGINT NOT NULL,
+    text TEXT NOT NULL,
+    priority TINYINT NOT NULL DEFAULT 1,
+    status ENUM('pending', 'sending', 'sent', 'failed') NOT NULL DEFAULT 'pending',
+    attempts INT NOT NULL DEFAULT 0,
+    claimed_at DATETIME NULL,
+    error VARCHAR(255) NULL,
+    UNIQUE KEY uq_outbox_batch_chat (batch_id, chat_id),
+    KEY idx_outbox_status (status, priority, id),
+    FOREIGN KEY (batch_id) REFERENCES outbox_batches(batch_id) ON DELETE CASCADE
+);
+
+-- Create the queue_timers table (first-in-line reminders and no-show timeouts)
+DROP TABLE IF EXISTS queue_timers;
+CREATE TABLE queue_timers (
+    university_id INT NOT NULL,
+    kind VARCHAR(32) NOT NULL,
+    user_id BIGINT NOT NULL,
+    due_at DATETIME(3) NOT NULL,
+    PRIMARY KEY (university_id, kind),
+    KEY idx_queue_timers_due (due_at)
+);
+
+-- Create the history_daily table (per-university daily totals of history events removed by retention)
+DROP TABLE IF EXISTS history_daily;
+CREATE TABLE history_daily (
+    day DATE NOT NULL,
+    university_id INT NOT NULL,
+    joins INT NOT NULL DEFAULT 0,
+    leaves INT NOT NULL DEFAULT 0,
+    calls INT NOT NULL DEFAULT 0,
+    broadcasts INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, university_id)
+);
+
+-- Create the schema_version table (applied migrations; the bot skips DDL when the schema is current)
+DROP TABLE IF EXISTS schema_version;
+CREATE TABLE schema_version (
+    version INT PRIMARY KEY,
+    description VARCHAR(255) NOT NULL,
+    applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+INSERT INTO schema_version (version, description) VALUES (1, 'базова схема'), (2, 'денні підсумки та очищення історії');
+
 -- Insert distinct Ukrainian universities
 INSERT INTO universities (name) VALUES
     ('Київський національний університет імені Тараса Шевченка'),
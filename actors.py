@@ -0,0 +1,87 @@
+import asyncio
+import contextvars
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Університети, чиї актори вже виконують поточну операцію (для вкладених викликів)
+_held = contextvars.ContextVar("held_universities", default=frozenset())
+
+
+class QueueActors:
+    """Актори черг: у кожного університету своя поштова скринька і завдання, що її обробляє.
+
+    Операції над чергою одного університету виконуються по одній у порядку
+    надходження, а різні університети обробляються паралельно. submit()
+    повертає asyncio.Future з результатом операції. Вкладений виклик для
+    університету, чий актор уже виконує поточну операцію, виконується одразу,
+    а операції над кількома університетами захоплюють їхніх акторів у порядку
+    зростання university_id, тому взаємне блокування неможливе.
+    """
+
+    def __init__(self):
+        self._mailboxes = {}  # {university_id: asyncio.Queue[(func, held, future)]}
+        self._tasks = {}  # {university_id: asyncio.Task}
+        self._closed = False
+
+    def submit(self, university_id: int, func) -> asyncio.Future:
+        """Ставить func() (корутинну функцію без аргументів) у скриньку актора університету"""
+        if self._closed:
+            raise RuntimeError("Актори черг зупинені")
+        future = asyncio.get_running_loop().create_future()
+        mailbox = self._mailboxes.get(university_id)
+        if mailbox is None:
+            mailbox = self._mailboxes[university_id] = asyncio.Queue()
+            self._tasks[university_id] = asyncio.create_task(self._run(university_id, mailbox))
+        mailbox.put_nowait((func, _held.get(), future))
+        return future
+
+    async def run(self, university_ids, func):
+        """Виконує func() ексклюзивно для всіх вказаних університетів"""
+        pending = sorted(set(university_ids) - _held.get())
+        if not pending:
+            return await func()
+        rest = pending[1:]
+        return await self.submit(pending[0], lambda: self.run(rest, func))
+
+    async def _run(self, university_id: int, mailbox: asyncio.Queue):
+        while True:
+            func, held, future = await mailbox.get()
+            try:
+                if future.cancelled():
+                    continue  # Той, хто викликав, перестав чекати ще до початку операції
+                token = _held.set(held | {university_id})
+                try:
+                    result = await func()
+                except asyncio.CancelledError:
+                    future.cancel()
+                    raise
+                except Exception as e:
+                    if not future.cancelled():
+                        future.set_exception(e)
+                else:
+                    if not future.cancelled():
+                        future.set_result(result)
+                finally:
+                    _held.reset(token)
+            finally:
+                mailbox.task_done()
+
+    def backlog(self) -> dict:
+        """Кількість операцій, що чекають у скриньках: {university_id: кількість}"""
+        return {university_id: mailbox.qsize() for university_id, mailbox in self._mailboxes.items() if mailbox.qsize()}
+
+    async def stop(self, timeout: float = 10.0):
+        """Перестає приймати операції, дочікується (не довше timeout) наявних і зупиняє акторів"""
+        self._closed = True
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(mailbox.join() for mailbox in self._mailboxes.values())), timeout
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"Не всі операції над чергами завершилися за {timeout} с")
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._mailboxes.clear()
+        self._tasks.clear()
@@ -0,0 +1,185 @@
+"""Пропускна здатність обробника кнопки з пулом з'єднань і без нього.
+
+Замість MySQL використовується SQLite із штучною затримкою на встановлення
+з'єднання та на кожен запит (імітація мережевого TCP-рукостискання та RTT).
+
+    python benchmarks/bench_db_pool.py --updates 500 --handshake-ms 5 --query-ms 1
+"""
+import argparse
+import asyncio
+import os
+import queue
+import sqlite3
+import sys
+import tempfile
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from brain import QueueManager  # noqa: E402
+from db import Database  # noqa: E402
+
+
+class StandInCursor:
+    def __init__(self, cursor, query_delay):
+        self._cursor = cursor
+        self._query_delay = query_delay
+
+    def execute(self, query, params=()):
+        time.sleep(self._query_delay)
+        self._cursor.execute(query.replace("%s", "?"), params)
+
+    def executemany(self, query, seq_params):
+        time.sleep(self._query_delay)
+        self._cursor.executemany(query.replace("%s", "?"), seq_params)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+
+class StandInConnection:
+    def __init__(self, path, handshake_delay, query_delay, release=None):
+        time.sleep(handshake_delay)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # Відбиток каталогу університетів рахується через CRC32, якої в SQLite немає
+        self._conn.create_function("CRC32", 1, lambda value: zlib.crc32(str(value).encode()))
+        self._query_delay = query_delay
+        self._release = release
+
+    def cursor(self):
+        return StandInCursor(self._conn.cursor(), self._query_delay)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def ping(self, reconnect=True, attempts=1, delay=0):
+        self._conn.execute("SELECT 1")
+
+    def close(self):
+        if self._release is not None:
+            self._release(self)
+        else:
+            self._conn.close()
+
+
+class StandInPool:
+    def __init__(self, path, size, handshake_delay, query_delay):
+        self._free = queue.Queue()
+        for _ in range(size):
+            self._free.put(StandInConnection(path, handshake_delay, query_delay, release=self._free.put))
+
+    def get_connection(self):
+        return self._free.get_nowait()
+
+
+class PooledStandIn(Database):
+    def __init__(self, path, pool_size, handshake_delay, query_delay):
+        super().__init__({}, pool_size=pool_size)
+        self._stand_in = (path, handshake_delay, query_delay)
+
+    def _create_pool(self):
+        path, handshake_delay, query_delay = self._stand_in
+        return StandInPool(path, self.pool_size, handshake_delay, query_delay)
+
+
+class UnpooledStandIn(Database):
+    """Стара поведінка: нове блокуюче з'єднання на кожен запит прямо в циклі подій"""
+
+    def __init__(self, path, handshake_delay, query_delay):
+        super().__init__({}, pool_size=1)
+        self._stand_in = (path, handshake_delay, query_delay)
+
+    async def run(self, func):
+        conn = StandInConnection(*self._stand_in)
+        cursor = conn.cursor()
+        try:
+            result = func(cursor)
+            conn.commit()
+            return result
+        finally:
+            cursor.close()
+            conn.close()
+
+
+def prepare_database(path, users):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE users (user_id INTEGER PRIMARY KEY, user_name TEXT, phone_number TEXT, is_admin INTEGER)")
+    conn.execute("CREATE TABLE universities (university_id INTEGER PRIMARY KEY, name TEXT)")
+    conn.executemany("INSERT INTO users VALUES (?, ?, ?, ?)",
+                     [(i, f"user{i}", f"+380{i:09d}", int(i % 50 == 0)) for i in range(1, users + 1)])
+    conn.executemany("INSERT INTO universities VALUES (?, ?)", [(i, f"Університет {i}") for i in range(1, 11)])
+    conn.commit()
+    conn.close()
+
+
+async def button_press(manager, user_id):
+    """Запити, які виконує button_handler для натискання 'Вибрати університет'"""
+    await manager.is_admin(user_id)
+    await manager.phone_exists(user_id)
+    await manager.get_universities()
+    await manager.is_admin(user_id)  # get_main_keyboard
+
+
+async def measure(manager, updates, users):
+    lag = 0.0
+    running = True
+
+    async def ticker():
+        nonlocal lag
+        while running:
+            started = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lag = max(lag, time.perf_counter() - started - 0.001)
+
+    ticker_task = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    await asyncio.gather(*(button_press(manager, i % users + 1) for i in range(updates)))
+    elapsed = time.perf_counter() - started
+    running = False
+    await ticker_task
+    return elapsed, lag
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=500)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--pool-size", type=int, default=8)
+    parser.add_argument("--handshake-ms", type=float, default=5.0)
+    parser.add_argument("--query-ms", type=float, default=1.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        prepare_database(path, args.users)
+        handshake, query_delay = args.handshake_ms / 1000, args.query_ms / 1000
+
+        for label, database in (
+            ("без пулу", UnpooledStandIn(path, handshake, query_delay)),
+            (f"пул ({args.pool_size})", PooledStandIn(path, args.pool_size, handshake, query_delay)),
+        ):
+            manager = QueueManager({})
+            await manager.db.close()
+            manager.db = database
+            elapsed, lag = await measure(manager, args.updates, args.users)
+            await database.close()
+            print(f"{label:>12}: {args.updates / elapsed:8.1f} оновлень/с, "
+                  f"час {elapsed:6.2f} с, макс. затримка циклу подій {lag * 1000:7.1f} мс")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,77 @@
+"""Пам'ять черг: окремі deque та словники з ключами (user_id, university_id) проти масивів MemoryQueueState.
+
+    python benchmarks/bench_memory.py --entries 100000 --universities 20
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import tracemalloc
+from collections import deque
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from queue_state import MemoryQueueState  # noqa: E402
+
+
+def rows(entries: int, universities: int, seed: int = 1):
+    """Рядки як із запиту до таблиці queue: кожен рядок несе власні str і datetime.
+
+    Приблизно третина користувачів стоїть у двох чергах одночасно.
+    """
+    rng = random.Random(seed)
+    started = datetime(2025, 6, 1, 9, 0)
+    user_id = 100_000_000
+    produced = 0
+    while produced < entries:
+        user_id += 1
+        for university_id in rng.sample(range(1, universities + 1), 2 if rng.random() < 0.33 else 1)[: entries - produced]:
+            joined = started + timedelta(seconds=produced)
+            yield user_id, f"Студент {user_id}", university_id, joined
+            produced += 1
+
+
+def legacy_layout(source):
+    """Попереднє представлення: deque на університет і два словники з ключами-кортежами"""
+    queues, user_names, join_times = {}, {}, {}
+    for user_id, user_name, university_id, join_time in source:
+        queues.setdefault(university_id, deque()).append(user_id)
+        user_names[(user_id, university_id)] = user_name
+        join_times[(user_id, university_id)] = join_time
+    return queues, user_names, join_times
+
+
+def compact_layout(source):
+    state = MemoryQueueState(db=None)
+    state._replace(source)
+    return state
+
+
+def measure(build, entries: int, universities: int):
+    gc.collect()
+    tracemalloc.start()
+    result = build(rows(entries, universities))
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--universities", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"Записів у чергах: {args.entries}, університетів: {args.universities}")
+    print(f"{'представлення':<34}{'МБ':>9}{'байт/запис':>12}{'пік, МБ':>10}")
+    for name, build in (("deque + словники (user_id, uni)", legacy_layout), ("MemoryQueueState (масиви)", compact_layout)):
+        result, current, peak = measure(build, args.entries, args.universities)
+        print(f"{name:<34}{current / 2**20:>9.2f}{current / args.entries:>12.1f}{peak / 2**20:>10.2f}")
+        del result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Мікробенчмарк /next на великій черзі: deque зі списковим пошуком проти UniversityQueue.
+
+    python benchmarks/bench_queue.py --size 10000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from university_queue import UniversityQueue  # noqa: E402
+
+
+def next_with_deque(queue: deque):
+    """Стара реалізація: popleft і list(queue).index() для кожного, хто залишився"""
+    queue.popleft()
+    for user_id in list(queue):
+        list(queue).index(user_id)
+
+
+def next_with_index(queue: UniversityQueue):
+    queue.popleft()
+    for position, user_id in enumerate(queue, start=1):
+        pass
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=10_000)
+    parser.add_argument("--lookups", type=int, default=10_000)
+    args = parser.parse_args()
+    user_ids = list(range(1, args.size + 1))
+
+    old = deque(user_ids)
+    new = UniversityQueue(user_ids)
+    print(f"/next на черзі з {args.size} осіб:")
+    print(f"  deque:           {timed(next_with_deque, old) * 1000:10.2f} мс")
+    print(f"  UniversityQueue: {timed(next_with_index, new) * 1000:10.2f} мс")
+
+    sample = random.sample(user_ids[1:], min(args.lookups, args.size - 1))
+    print(f"{len(sample)} запитів позиції ('Моя позиція'):")
+    print(f"  deque:           {timed(lambda: [list(old).index(u) for u in sample]) * 1000:10.2f} мс")
+    print(f"  UniversityQueue: {timed(lambda: [new.position(u) for u in sample]) * 1000:10.2f} мс")
+
+    leaving = sample[: len(sample) // 2]
+    print(f"{len(leaving)} виходів із середини черги:")
+    print(f"  deque:           {timed(lambda: [old.remove(u) for u in leaving]) * 1000:10.2f} мс")
+    print(f"  UniversityQueue: {timed(lambda: [new.remove(u) for u in leaving]) * 1000:10.2f} мс")
+    assert list(old) == list(new)
+
+
+if __name__ == "__main__":
+    main()
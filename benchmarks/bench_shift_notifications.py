@@ -0,0 +1,120 @@
+"""Виклики Bot API на рух черги: SHIFT_NOTIFICATIONS=each проти coalesce.
+
+QueueManager працює поверх SQLite (з load_test.py) з фейковим ботом, що
+лише рахує send_message, edit_message_text і pin_chat_message. У черзі
+стоять --users людей, адміністратор викликає --nexts наступних двома
+способами: швидко (частіше за вікно об'єднання) і повільно (трохи рідше
+за STATUS_EDIT_INTERVAL, тож кожен зсув обробляється окремо). Час
+масштабовано: вікно й інтервал редагування статусу — частки секунди.
+Код виходу 1, якщо coalesce зменшує кількість викликів менш ніж у
+--min-ratio разів для будь-якого зі способів.
+
+    python benchmarks/bench_shift_notifications.py --users 200 --nexts 10
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from load_test import QueryCounter, SQLitePool, prepare_database  # noqa: E402
+from brain import QueueManager  # noqa: E402
+from notifier import TokenBucket  # noqa: E402
+
+UNIVERSITY_ID = 1
+
+
+class CountingBot:
+    """Фейковий бот: рахує виклики Bot API"""
+
+    def __init__(self):
+        self.calls = {"sendMessage": 0, "editMessageText": 0, "pinChatMessage": 0}
+        self._message_ids = iter(range(1, 10**9))
+
+    async def send_message(self, chat_id: int, text: str):
+        self.calls["sendMessage"] += 1
+        return SimpleNamespace(message_id=next(self._message_ids))
+
+    async def edit_message_text(self, chat_id: int, message_id: int, text: str):
+        self.calls["editMessageText"] += 1
+
+    async def pin_chat_message(self, chat_id: int, message_id: int, disable_notification: bool = False):
+        self.calls["pinChatMessage"] += 1
+
+
+async def measure(args, mode: str, spacing: float) -> dict:
+    path = os.path.join(tempfile.mkdtemp(), "shift.db")
+    prepare_database(path, 1, [])
+    manager = QueueManager(
+        {}, pool_size=4, shift_notifications=mode, shift_window=args.window, shift_threshold=args.threshold,
+        shift_top_k=args.top_k, status_interval=args.status_interval, reminder_delay=3600.0
+    )
+    manager.db._create_pool = lambda: SQLitePool(path, 4, QueryCounter(), 0)
+    # Обмеження Telegram тут не вимірюються: рахуємо лише кількість викликів
+    manager.notifier.global_bucket = TokenBucket(1e6)
+    manager.notifier.per_chat_rate = 1e6
+    await manager.reload_universities()
+    bot = CountingBot()
+    manager.notifier.start()
+    manager.outbox.start(bot)
+    manager.coalescer.start(bot)
+
+    for user_id in range(10_000, 10_000 + args.users):
+        await manager.join_queue(user_id, f"Студент {user_id}", UNIVERSITY_ID)
+    for _ in range(args.nexts):
+        await manager.next_in_queue(UNIVERSITY_ID)
+        await asyncio.sleep(spacing)
+
+    await asyncio.sleep(args.window + args.status_interval)
+    await manager.actors.stop()
+    await manager.coalescer.stop()
+    while await manager.outbox.pending() or manager.notifier.pending:
+        await asyncio.sleep(0.05)
+    await manager.outbox.stop()
+    await manager.notifier.stop()
+    await manager.db.close()
+    return bot.calls
+
+
+async def run(args) -> bool:
+    logging.disable(logging.WARNING)
+    patterns = {
+        "швидко": args.window / 10,
+        "повільно": args.status_interval * 1.1,
+    }
+    print(f"Черга: {args.users} осіб, викликів: {args.nexts}, поріг {args.threshold}, top-K {args.top_k}")
+    print(f"{'виклики /next':<14}{'режим':<10}{'send':>7}{'edit':>7}{'pin':>7}{'усього':>8}")
+    ok = True
+    for pattern, spacing in patterns.items():
+        totals = {}
+        for mode in ("each", "coalesce"):
+            calls = await measure(args, mode, spacing)
+            totals[mode] = sum(calls.values())
+            print(f"{pattern:<14}{mode:<10}{calls['sendMessage']:>7}{calls['editMessageText']:>7}"
+                  f"{calls['pinChatMessage']:>7}{totals[mode]:>8}")
+        ratio = totals["each"] / max(totals["coalesce"], 1)
+        print(f"{'':<14}{'менше в':<10}{ratio:>29.1f} раза")
+        ok = ok and ratio >= args.min_ratio
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--nexts", type=int, default=10)
+    parser.add_argument("--threshold", type=int, default=10)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--window", type=float, default=0.05, help="вікно об'єднання зсувів, секунди")
+    parser.add_argument("--status-interval", type=float, default=0.2, help="мінімальний інтервал редагування статусу")
+    parser.add_argument("--min-ratio", type=float, default=10.0,
+                        help="код виходу 1, якщо coalesce не зменшує кількість викликів щонайменше в стільки разів")
+    sys.exit(0 if asyncio.run(run(parser.parse_args())) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Планувальник таймерів черг: десятки тисяч таймерів на одному циклі подій.
+
+    python benchmarks/bench_timers.py --timers 50000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scheduler import TimerScheduler  # noqa: E402
+
+
+class NullDatabase:
+    """Замінник бази даних: таймери лише в пам'яті"""
+
+    async def execute(self, query, params=()):
+        return 1
+
+
+async def run(args):
+    fired = []
+    scheduler = TimerScheduler(NullDatabase(), lambda kind, university_id, user_id: _record(fired, user_id))
+    scheduler.start()
+
+    started = time.perf_counter()
+    for university_id in range(args.timers):
+        await scheduler.schedule(university_id, "remind", university_id, args.delay)
+    scheduled = time.perf_counter() - started
+
+    # Половину таймерів переплановуємо, чверть скасовуємо — як під час активного руху черг
+    started = time.perf_counter()
+    for university_id in range(0, args.timers, 2):
+        await scheduler.schedule(university_id, "remind", university_id, args.delay)
+    for university_id in range(1, args.timers, 4):
+        await scheduler.cancel(university_id, "remind")
+    changed = time.perf_counter() - started
+
+    expected = len(scheduler)
+    started = time.perf_counter()
+    while len(fired) < expected:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    await scheduler.stop()
+
+    print(f"Таймерів: {args.timers}")
+    print(f"  планування:                {scheduled * 1e6 / args.timers:8.2f} мкс на таймер")
+    print(f"  перепланування/скасування: {changed * 1e6 / (args.timers * 3 // 4):8.2f} мкс на операцію")
+    print(f"  спрацювало {len(fired)} таймерів, останній через {elapsed:.2f} с (строк {args.delay} с)")
+
+
+async def _record(fired, user_id):
+    fired.append(user_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--timers", type=int, default=50_000)
+    parser.add_argument("--delay", type=float, default=1.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Запити до БД на одне оновлення до обробника: MySQLStorage і UserContextMiddleware.
+
+Dispatcher зі сховищем FSM у SQLite (з load_test.py) і middleware контексту
+користувача з main.py отримує повідомлення й callback-запити від --users
+студентів з вибраним університетом; обробники нічого не запитують.
+Перше оновлення кожного студента (промах кешу профілів) може коштувати
+двох запитів, кожне наступне — не більше одного. Код виходу 1, якщо
+будь-яке оновлення перевищило цю межу.
+
+    python benchmarks/check_update_queries.py --users 100 --updates 5
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram import Bot, Dispatcher  # noqa: E402
+
+from load_test import QueryCounter, SQLitePool, Traffic, prepare_database  # noqa: E402
+from brain import QueueManager  # noqa: E402
+from fsm_storage import MySQLStorage  # noqa: E402
+from user_context import UserContextMiddleware  # noqa: E402
+
+
+async def run(args) -> bool:
+    logging.disable(logging.WARNING)
+    path = os.path.join(tempfile.mkdtemp(), "queries.db")
+    prepare_database(path, 1, [])
+    counter = QueryCounter()
+    manager = QueueManager({}, pool_size=4)
+    manager.db._create_pool = lambda: SQLitePool(path, 4, counter, 0)
+    for user_id in range(10_000, 10_000 + args.users):
+        await manager.save_user_phone(user_id, f"Студент{user_id}", f"+380{user_id:09d}")
+    manager.profile_cache.clear()
+
+    dp = Dispatcher(storage=MySQLStorage(manager.db))
+    for observer in (dp.message, dp.callback_query):
+        observer.outer_middleware(UserContextMiddleware(manager))
+    seen = []
+
+    @dp.message()
+    async def on_message(message, university_id):
+        seen.append(university_id)
+
+    @dp.callback_query()
+    async def on_callback(callback, university_id):
+        seen.append(university_id)
+
+    bot = Bot("123456:queries")
+    traffic = Traffic()
+    for user_id in range(10_000, 10_000 + args.users):
+        await dp.storage.set_data(dp.fsm.get_context(bot, user_id, user_id).key, {"university_id": 1})
+
+    worst = {"перше": 0, "наступні": 0}
+    totals = {"перше": 0, "наступні": 0}
+    updates = {"перше": 0, "наступні": 0}
+    for round_ in range(args.updates):
+        kind = "перше" if round_ == 0 else "наступні"
+        for user_id in range(10_000, 10_000 + args.users):
+            update = traffic.message(user_id, "🪪 Моя позиція 🪪") if round_ % 2 == 0 else traffic.callback(user_id, "noop")
+            before = counter.count
+            await dp.feed_update(bot, update)
+            spent = counter.count - before
+            worst[kind] = max(worst[kind], spent)
+            totals[kind] += spent
+            updates[kind] += 1
+
+    await bot.session.close()
+    await manager.db.close()
+    print(f"Студентів: {args.users}, оновлень на студента: {args.updates}")
+    print(f"{'оновлення':<12}{'к-сть':>7}{'запитів у середньому':>24}{'найбільше':>12}{'межа':>7}")
+    limits = {"перше": 2, "наступні": 1}
+    for kind in worst:
+        if updates[kind]:
+            print(f"{kind:<12}{updates[kind]:>7}{totals[kind] / updates[kind]:>24.2f}{worst[kind]:>12}{limits[kind]:>7}")
+    if seen.count(1) != len(seen):
+        print("Обробники не отримали вибраний університет")
+        return False
+    return all(worst[kind] <= limits[kind] for kind in worst)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--updates", type=int, default=5, help="оновлень від кожного студента")
+    sys.exit(0 if asyncio.run(run(parser.parse_args())) else 1)
+
+
+if __name__ == "__main__":
+    main()
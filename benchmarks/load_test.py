@@ -0,0 +1,375 @@
+"""Навантажувальний тест справжнього Dispatcher з main.py на синтетичному трафіку студентів.
+
+Бот надсилає запити на локальний фейковий Bot API (aiohttp), а замість MySQL
+використовується SQLite із перекладом MySQL-специфічних конструкцій. Звіт:
+пропускна здатність, перцентилі затримки обробників, запити до БД на одне
+оновлення та швидкість надсилання повідомлень.
+
+    python benchmarks/load_test.py --users 500 --universities 10 --api-ms 20
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import queue
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from datetime import datetime
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("TELEGRAM_TOKEN", "123456:load-test")
+
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+from aiogram.types import Update  # noqa: E402
+
+SCHEMA = """
+CREATE TABLE universities (university_id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE users (user_id INTEGER PRIMARY KEY, user_name TEXT, phone_number TEXT, is_admin INTEGER DEFAULT 0);
+CREATE TABLE queue (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, university_id INTEGER, join_time DATETIME,
+    UNIQUE (user_id, university_id)
+);
+CREATE TABLE user_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, action TEXT, university_id INTEGER, timestamp DATETIME
+);
+CREATE TABLE broadcast_messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, admin_id INTEGER, message_text TEXT,
+    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE fsm_storage (storage_key TEXT PRIMARY KEY, state TEXT, data TEXT);
+CREATE TABLE outbox_batches (
+    batch_id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, admin_id INTEGER, total INTEGER,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP, finished_at TEXT
+);
+CREATE TABLE outbox_messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, batch_id INTEGER, chat_id INTEGER, text TEXT,
+    priority INTEGER DEFAULT 1, status TEXT DEFAULT 'pending', attempts INTEGER DEFAULT 0,
+    claimed_at DATETIME, error TEXT, UNIQUE (batch_id, chat_id)
+);
+CREATE INDEX idx_outbox_status ON outbox_messages (status, priority, id);
+CREATE TABLE queue_timers (
+    university_id INTEGER, kind TEXT, user_id INTEGER, due_at DATETIME, PRIMARY KEY (university_id, kind)
+);
+"""
+
+# Стовпці DATETIME повертаються як datetime, як у mysql.connector
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_converter("DATETIME", lambda value: datetime.fromisoformat(value.decode()))
+
+_UPSERT = re.compile(r"ON DUPLICATE KEY UPDATE", re.IGNORECASE)
+_UPSERT_VALUES = re.compile(r"VALUES\((\w+)\)")
+
+
+def translate(query: str) -> str:
+    """Переписує MySQL-запит у діалект SQLite"""
+    query = query.replace("%s", "?").replace(" SKIP LOCKED", "").replace(" FOR UPDATE", "")
+    parts = _UPSERT.split(query, 1)
+    if len(parts) == 1:
+        return query
+    head, assignments = parts
+    assignments = _UPSERT_VALUES.sub(r"excluded.\1", assignments)
+    return f"{head} ON CONFLICT DO UPDATE SET {assignments}"
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def add(self, n: int = 1):
+        with self._lock:
+            self.count += n
+
+
+class SQLiteCursor:
+    def __init__(self, cursor, counter, query_delay):
+        self._cursor = cursor
+        self._counter = counter
+        self._query_delay = query_delay
+
+    def execute(self, query, params=()):
+        self._counter.add()
+        if self._query_delay:
+            time.sleep(self._query_delay)
+        self._cursor.execute(translate(query), tuple(params))
+
+    def executemany(self, query, seq_params):
+        self._counter.add()
+        if self._query_delay:
+            time.sleep(self._query_delay)
+        self._cursor.executemany(translate(query), seq_params)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    def __init__(self, path, counter, query_delay, release):
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, detect_types=sqlite3.PARSE_DECLTYPES)
+        self._conn.create_function("CRC32", 1, lambda value: zlib.crc32(str(value).encode()))
+        self._counter = counter
+        self._query_delay = query_delay
+        self._release = release
+
+    def cursor(self):
+        return SQLiteCursor(self._conn.cursor(), self._counter, self._query_delay)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def ping(self, reconnect=True, attempts=1, delay=0):
+        self._conn.execute("SELECT 1")
+
+    def close(self):
+        self._release(self)
+
+
+class SQLitePool:
+    """Замінник MySQLConnectionPool поверх одного файлу SQLite"""
+
+    def __init__(self, path, size, counter, query_delay):
+        self._free = queue.Queue()
+        for _ in range(size):
+            self._free.put(SQLiteConnection(path, counter, query_delay, release=self._free.put))
+
+    def get_connection(self):
+        return self._free.get_nowait()
+
+
+class FakeBotAPI:
+    """Локальний сервер, що відповідає на запити Bot API як Telegram із заданою затримкою"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = {}
+        self.first_message = None
+        self.last_message = None
+        self._message_ids = itertools.count(1)
+        self._runner = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        data = await request.post()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.calls[method] = self.calls.get(method, 0) + 1
+        if method == "getMe":
+            return web.json_response({"ok": True, "result": {"id": 123456, "is_bot": True, "first_name": "Load"}})
+        if method != "sendMessage":
+            return web.json_response({"ok": True, "result": True})
+        now = time.perf_counter()
+        self.first_message = self.first_message or now
+        self.last_message = now
+        return web.json_response({"ok": True, "result": {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(data["chat_id"]), "type": "private"},
+            "text": data.get("text", ""),
+        }})
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}"
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+
+class Traffic:
+    """Генератор оновлень Telegram від імені студентів і адміністраторів"""
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+
+    def _user(self, user_id):
+        return {"id": user_id, "is_bot": False, "first_name": f"Студент{user_id}"}
+
+    def message(self, user_id, text=None, **extra):
+        message = {"message_id": next(self._ids), "date": int(time.time()),
+                   "chat": {"id": user_id, "type": "private"}, "from": self._user(user_id), **extra}
+        if text is not None:
+            message["text"] = text
+            if text.startswith("/"):
+                message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return Update(update_id=next(self._ids), message=message)
+
+    def contact(self, user_id):
+        return self.message(user_id, contact={"phone_number": f"+380{user_id:09d}", "first_name": "Студент",
+                                              "user_id": user_id})
+
+    def callback(self, user_id, data):
+        return Update(update_id=next(self._ids), callback_query={
+            "id": str(next(self._ids)), "chat_instance": "load", "data": data, "from": self._user(user_id),
+            "message": {"message_id": next(self._ids), "date": int(time.time()),
+                        "chat": {"id": user_id, "type": "private"}, "text": "Виберіть університет:"},
+        })
+
+
+class Harness:
+    def __init__(self, main, traffic):
+        self.main = main
+        self.traffic = traffic
+        self.latencies = {}  # {тип оновлення: [секунди]}
+        self.updates = 0
+
+    async def feed(self, kind, update):
+        started = time.perf_counter()
+        await self.main.dp.feed_update(self.main.bot, update)
+        self.latencies.setdefault(kind, []).append(time.perf_counter() - started)
+        self.updates += 1
+
+    async def student(self, user_id, university_id, leave):
+        t = self.traffic
+        await self.feed("/start", t.message(user_id, "/start"))
+        await self.feed("Почати", t.message(user_id, "➡️ Почати ⬅️"))
+        await self.feed("контакт", t.contact(user_id))
+        await self.feed("Вибрати університет", t.message(user_id, "🎓 Вибрати університет 🎓"))
+        await self.feed("uni_<id>", t.callback(user_id, f"uni_{university_id}"))
+        await self.feed("Записатися в чергу", t.message(user_id, "➕ Записатися в чергу ➕"))
+        await self.feed("Моя позиція", t.message(user_id, "🪪 Моя позиція 🪪"))
+        await self.feed("Переглянути чергу", t.message(user_id, "🔍 Переглянути чергу 🔍"))
+        if leave:
+            await self.feed("Покинути чергу", t.message(user_id, "➖ Покинути чергу ➖"))
+
+    async def admin(self, admin_id, university_id, calls):
+        t = self.traffic
+        await self.feed("uni_<id>", t.callback(admin_id, f"uni_{university_id}"))
+        for _ in range(calls):
+            await self.feed("/next", t.message(admin_id, "/next"))
+        await self.feed("/broadcast", t.message(admin_id, "/broadcast"))
+        await self.feed("uni_<id>", t.callback(admin_id, f"uni_{university_id}"))
+        await self.feed("текст оголошення", t.message(admin_id, "Аудиторія змінилася: 204 замість 101"))
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def prepare_database(path, universities, admins):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.executemany("INSERT INTO universities VALUES (?, ?)",
+                     [(i, f"Університет {i}") for i in range(1, universities + 1)])
+    conn.executemany("INSERT INTO users VALUES (?, ?, ?, 1)",
+                     [(admin_id, f"Адмін{admin_id}", f"+380{admin_id:09d}") for admin_id in admins])
+    conn.commit()
+    conn.close()
+
+
+async def run(args):
+    if not args.verbose:
+        logging.disable(logging.INFO)
+    import main
+    from notifier import Notifier
+
+    api = FakeBotAPI(args.api_ms / 1000)
+    main.bot.session.api = TelegramAPIServer.from_base(await api.start())
+
+    counter = QueryCounter()
+    tmp = tempfile.TemporaryDirectory()
+    path = os.path.join(tmp.name, "load.db")
+    admins = [1_000 + i for i in range(1, args.universities + 1)]
+    prepare_database(path, args.universities, admins)
+
+    manager = main.queue_manager
+    db = manager.db
+    db._create_pool = lambda: SQLitePool(path, db.pool_size, counter, args.query_ms / 1000)
+    manager.notifier = Notifier(workers=main.NOTIFIER_WORKERS, global_rate=args.telegram_rate)
+
+    async def init_db():
+        await manager.load_queue()
+    manager.init_db = init_db  # Схему вже створено в SQLite
+    manager.snapshot = None  # Не залишаємо файл знімка черг після прогону
+    await manager.startup(main.bot)
+
+    harness = Harness(main, Traffic())
+    students = range(10_000, 10_000 + args.users)
+    started = time.perf_counter()
+    queries_before = counter.count
+    await asyncio.gather(*(
+        harness.student(user_id, index % args.universities + 1, leave=index % 5 == 0)
+        for index, user_id in enumerate(students)
+    ))
+    await asyncio.gather(*(
+        harness.admin(admin_id, index + 1, args.next_calls) for index, admin_id in enumerate(admins)
+    ))
+    elapsed = time.perf_counter() - started
+    handler_queries = counter.count - queries_before
+
+    # Одразу надсилаємо об'єднані сповіщення про рух черги, не чекаючи кінця вікна,
+    # і дочікуємося фонової розсилки, щоб виміряти швидкість надсилання повідомлень
+    await manager.coalescer.stop()
+    while manager.notifier.pending or await manager.outbox.pending():
+        await asyncio.sleep(0.05)
+    await manager.history.flush()
+    total_queries = counter.count - queries_before
+
+    print(f"Студентів: {args.users}, університетів: {args.universities}, "
+          f"затримка API: {args.api_ms} мс, затримка запиту БД: {args.query_ms} мс")
+    print(f"Оновлень: {harness.updates} за {elapsed:.2f} с — {harness.updates / elapsed:.1f} оновлень/с")
+    print(f"Запитів до БД: {handler_queries / harness.updates:.2f} на оновлення в обробниках, "
+          f"{total_queries / harness.updates:.2f} разом із фоновим записом історії")
+    sent = api.calls.get("sendMessage", 0)
+    window = (api.last_message - api.first_message) if sent > 1 else 0
+    print(f"Надіслано повідомлень: {sent}" + (f", {sent / window:.1f} повідомлень/с" if window else ""))
+    print(f"Виклики Bot API: {dict(sorted(api.calls.items()))}")
+    print(f"{'оновлення':<22}{'к-сть':>7}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}")
+    all_latencies = []
+    for kind, values in harness.latencies.items():
+        all_latencies.extend(values)
+        print(f"{kind:<22}{len(values):>7}{percentile(values, 0.5) * 1000:>10.2f}"
+              f"{percentile(values, 0.95) * 1000:>10.2f}{percentile(values, 0.99) * 1000:>10.2f}")
+    print(f"{'усі':<22}{len(all_latencies):>7}{percentile(all_latencies, 0.5) * 1000:>10.2f}"
+          f"{percentile(all_latencies, 0.95) * 1000:>10.2f}{percentile(all_latencies, 0.99) * 1000:>10.2f}")
+
+    await main.shutdown()
+    await api.stop()
+    tmp.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--universities", type=int, default=10)
+    parser.add_argument("--next-calls", type=int, default=5, help="скільки разів кожен адміністратор викликає /next")
+    parser.add_argument("--api-ms", type=float, default=20.0, help="затримка відповіді фейкового Bot API")
+    parser.add_argument("--query-ms", type=float, default=0.0, help="додаткова затримка кожного запиту до БД")
+    parser.add_argument("--telegram-rate", type=float, default=30.0, help="глобальний ліміт розсилки, повідомлень/с")
+    parser.add_argument("--verbose", action="store_true", help="не вимикати INFO-логи бота")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
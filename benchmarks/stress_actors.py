@@ -0,0 +1,134 @@
+"""Стрес-тест акторів черг: конкурентні записи, виходи, /next і масові виклики по кількох університетах.
+
+Замість MySQL використовується SQLite із load_test.py. Після прогону
+перевіряється, що жоден запис не загубився і не продублювався: стан у пам'яті
+збігається з таблицею queue, у кожній черзі немає повторів, а для кожної пари
+(користувач, університет) кількість входів мінус виходи й виклики з історії
+дорівнює 1, якщо користувач у черзі, і 0 — якщо ні.
+
+    python benchmarks/stress_actors.py --users 1000 --universities 8 --query-ms 1
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from load_test import QueryCounter, SQLitePool, prepare_database  # noqa: E402
+from brain import QueueManager  # noqa: E402
+
+ADMIN_ID = 1
+
+
+async def student(manager, rng, user_id: int, universities: int, rounds: int):
+    for _ in range(rounds):
+        university_id = rng.randint(1, universities)
+        await manager.join_queue(user_id, f"Студент {user_id}", university_id)
+        await asyncio.sleep(rng.random() * 0.01)
+        if rng.random() < 0.4:
+            await manager.leave_queue(user_id, university_id)
+
+
+async def admin(manager, rng, university_id: int, calls: int):
+    for _ in range(calls):
+        if rng.random() < 0.2:
+            await manager.call_next(university_id, rng.randint(2, 5))
+        else:
+            await manager.next_in_queue(university_id)
+        await asyncio.sleep(rng.random() * 0.005)
+
+
+def verify(path: str, queues: dict) -> list:
+    """Повертає список знайдених порушень"""
+    problems = []
+    conn = sqlite3.connect(path)
+    table = {}
+    for user_id, university_id in conn.execute("SELECT user_id, university_id FROM queue ORDER BY seq"):
+        table.setdefault(university_id, []).append(user_id)
+    for university_id in queues.keys() | table.keys():
+        memory = queues.get(university_id, [])
+        if memory != table.get(university_id, []):
+            problems.append(f"університет {university_id}: стан у пам'яті не збігається з таблицею queue")
+        if len(set(memory)) != len(memory):
+            problems.append(f"університет {university_id}: повтори в черзі")
+
+    balance = Counter()
+    for user_id, action, university_id in conn.execute("SELECT user_id, action, university_id FROM user_history"):
+        if action.startswith("join_queue"):
+            balance[(user_id, university_id)] += 1
+        elif action.startswith(("leave_queue", "next_in_queue", "removed_from_queue")):
+            balance[(user_id, university_id)] -= 1
+    present = {(user_id, university_id) for university_id, members in queues.items() for user_id in members}
+    for key in balance.keys() | present:
+        if balance[key] != (1 if key in present else 0):
+            problems.append(f"користувач {key[0]} в університеті {key[1]}: баланс історії {balance[key]}")
+    conn.close()
+    return problems
+
+
+async def run(args):
+    logging.disable(logging.WARNING)
+    path = os.path.join(tempfile.mkdtemp(), "stress.db")
+    prepare_database(path, args.universities, [ADMIN_ID])
+    conn = sqlite3.connect(path)
+    students = range(10_000, 10_000 + args.users)
+    conn.executemany("INSERT INTO users VALUES (?, ?, ?, 0)",
+                     [(user_id, f"Студент {user_id}", f"+380{user_id:09d}") for user_id in students])
+    conn.commit()
+    conn.close()
+
+    manager = QueueManager({}, pool_size=args.pool_size, queue_backend="memory", shift_notifications="each")
+    counter = QueryCounter()
+    manager.db._create_pool = lambda: SQLitePool(path, args.pool_size, counter, args.query_ms / 1000)
+    await manager.load_queue()
+    manager.history.start()
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(student(manager, random.Random(rng.random()), user_id, args.universities, args.rounds) for user_id in students),
+        *(admin(manager, random.Random(rng.random()), university_id, args.admin_calls)
+          for university_id in range(1, args.universities + 1)),
+    )
+    elapsed = time.perf_counter() - started
+    await manager.actors.stop()
+    await manager.history.close()
+    await manager.save_queue()
+
+    operations = args.users * args.rounds + args.universities * args.admin_calls
+    queues = {university_id: list(queue) for university_id, queue in manager.state.queues.items()}
+    print(f"Студентів: {args.users}, університетів: {args.universities}, затримка запиту БД: {args.query_ms} мс")
+    print(f"Операцій: ~{operations} за {elapsed:.2f} с — {operations / elapsed:.0f} операцій/с, "
+          f"запитів до БД: {counter.count}")
+    print(f"Залишилось у чергах: {sum(len(members) for members in queues.values())}")
+    problems = verify(path, queues)
+    for problem in problems[:20]:
+        print(f"  ✗ {problem}")
+    print("Порушень не знайдено" if not problems else f"Порушень: {len(problems)}")
+    await manager.db.close()
+    return not problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--universities", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=3, help="входів у чергу на студента")
+    parser.add_argument("--admin-calls", type=int, default=60, help="викликів /next на університет")
+    parser.add_argument("--query-ms", type=float, default=1.0)
+    parser.add_argument("--pool-size", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(run(args)) else 1)
+
+
+if __name__ == "__main__":
+    main()
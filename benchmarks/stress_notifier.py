@@ -0,0 +1,134 @@
+"""Перевірка Notifier на фейковому боті, що відповідає 429 (TelegramRetryAfter) на частину надсилань.
+
+Після розсилки перевіряється, що кожне повідомлення доставлене рівно один
+раз, кожна відповідь 429 дала повтор, жодне надсилання (у будь-який чат —
+flood-wait Telegram діє на весь бот) не відбулося до завершення retry_after,
+а моменти надсилань укладаються в глобальне відро токенів і відра окремих
+чатів.
+
+    python benchmarks/stress_notifier.py --chats 60 --messages 5 --rate 200 --chat-rate 5 --flood 0.02
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram.exceptions import TelegramRetryAfter  # noqa: E402
+from aiogram.methods import SendMessage  # noqa: E402
+from notifier import Notifier  # noqa: E402
+
+SLACK = 0.02  # Допуск на неточність таймерів циклу подій (секунди)
+
+
+class FloodingBot:
+    """Фейковий бот: на перше надсилання частини повідомлень відповідає 429 з retry_after"""
+
+    def __init__(self, flood_rate: float, retry_after: int, seed: int):
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.sent = []  # [(момент, chat_id, text)]
+        self.floods = 0
+        self.flooded_until = 0.0  # Момент, до якого бот заблоковано останньою відповіддю 429
+        self.early = []  # Надсилання до завершення retry_after
+        self._attempted = set()
+        self._message_ids = iter(range(1, 10**9))
+
+    async def send_message(self, chat_id: int, text: str):
+        now = time.monotonic()
+        if now + SLACK < self.flooded_until:
+            self.early.append((chat_id, text))
+        if text not in self._attempted:
+            self._attempted.add(text)
+            if self.rng.random() < self.flood_rate:
+                self.floods += 1
+                self.flooded_until = max(self.flooded_until, now + self.retry_after)
+                raise TelegramRetryAfter(
+                    method=SendMessage(chat_id=chat_id, text=text), message="Too Many Requests",
+                    retry_after=self.retry_after
+                )
+        self.sent.append((now, chat_id, text))
+        return SimpleNamespace(message_id=next(self._message_ids))
+
+
+def bucket_violations(times, rate: float, capacity: float) -> int:
+    """Кількість пар i <= j, у яких між times[i] і times[j] видано більше токенів, ніж дозволяє відро"""
+    times = sorted(times)
+    violations = 0
+    for j in range(len(times)):
+        for i in range(j + 1):
+            if j - i + 1 > capacity + rate * (times[j] - times[i] + SLACK):
+                violations += 1
+                break
+    return violations
+
+
+async def run(args) -> list:
+    if not args.verbose:
+        logging.disable(logging.WARNING)  # Попередження про кожну відповідь 429
+    bot = FloodingBot(args.flood, args.retry_after, args.seed)
+    notifier = Notifier(workers=args.workers, global_rate=args.rate, per_chat_rate=args.chat_rate,
+                        max_retries=args.max_retries)
+    messages = [(10_000 + chat, f"повідомлення {index} для {chat}")
+                for index in range(args.messages) for chat in range(args.chats)]
+    started = time.monotonic()
+    delivery = notifier.submit(bot, messages, name="перевірка 429")
+    report = await delivery.wait()
+    elapsed = time.monotonic() - started
+    await notifier.stop()
+
+    problems = []
+    if report.sent != len(messages) or report.failed:
+        problems.append(f"доставлено {report.sent} з {len(messages)}, помилок {report.failed}: "
+                        f"{list(report.errors.items())[:3]}")
+    if report.retries != bot.floods:
+        problems.append(f"відповідей 429: {bot.floods}, повторів: {report.retries}")
+    duplicates = [text for text, count in Counter(text for _, _, text in bot.sent).items() if count > 1]
+    if duplicates:
+        problems.append(f"повідомлень, надісланих двічі: {len(duplicates)}")
+    if bot.early:
+        problems.append(f"надсилань до завершення retry_after: {len(bot.early)}")
+    violations = bucket_violations([moment for moment, _, _ in bot.sent], args.rate, max(args.rate, 1.0))
+    if violations:
+        problems.append(f"перевищень глобального ліміту {args.rate}/с: {violations}")
+    by_chat = {}
+    for moment, chat_id, _ in bot.sent:
+        by_chat.setdefault(chat_id, []).append(moment)
+    chat_violations = sum(bucket_violations(times, args.chat_rate, 1.0) for times in by_chat.values())
+    if chat_violations:
+        problems.append(f"перевищень ліміту чату {args.chat_rate}/с: {chat_violations}")
+
+    print(f"Повідомлень: {len(messages)} у {args.chats} чатів, ліміти {args.rate}/с загалом і {args.chat_rate}/с на чат")
+    print(f"Відповідей 429: {bot.floods}, повторів: {report.retries}, доставлено: {report.sent} за {elapsed:.2f} с "
+          f"({report.sent / elapsed:.1f} повідомлень/с)")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chats", type=int, default=60)
+    parser.add_argument("--messages", type=int, default=5, help="повідомлень у кожен чат")
+    parser.add_argument("--rate", type=float, default=200.0, help="глобальний ліміт, повідомлень/с")
+    parser.add_argument("--chat-rate", type=float, default=5.0, help="ліміт на чат, повідомлень/с")
+    parser.add_argument("--flood", type=float, default=0.02, help="частка перших спроб, на які бот відповідає 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--max-retries", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="не вимикати попередження рушія розсилки")
+    problems = asyncio.run(run(parser.parse_args()))
+    for problem in problems:
+        print(f"  ✗ {problem}")
+    print("Порушень не знайдено" if not problems else f"Порушень: {len(problems)}")
+    sys.exit(0 if not problems else 1)
+
+
+if __name__ == "__main__":
+    main()
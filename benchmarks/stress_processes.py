@@ -0,0 +1,203 @@
+"""Стрес-тест DatabaseQueueState: кілька процесів бота над однією спільною базою даних.
+
+Кожен процес працює зі своїм DatabaseQueueState поверх спільного файлу
+SQLite. Транзакції відкриваються через BEGIN IMMEDIATE, що в SQLite
+відповідає блокуванню SELECT ... FOR UPDATE у MySQL. Процеси-студенти
+стають у черги й виходять із них, процеси-адміністратори викликають
+наступного (pop_first). Тригери записують кожну вставку й видалення рядка
+queue в журнал у порядку транзакцій. Після прогону перевіряється:
+
+* жоден успішний вхід не загубився: кожен запис або залишився в черзі, або
+  видалений рівно одним успішним виходом чи викликом;
+* немає дублів і «фантомних» видалень;
+* кожен виклик забрав запис з найменшим seq у своїй черзі (порядок FIFO).
+
+    python benchmarks/stress_processes.py --processes 4 --admins 2 --users 400 --universities 6
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import queue
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from load_test import QueryCounter, SQLiteConnection, SQLitePool, prepare_database  # noqa: E402
+from db import Database  # noqa: E402
+from queue_state import DatabaseQueueState  # noqa: E402
+
+AUDIT = """
+CREATE TABLE queue_log (id INTEGER PRIMARY KEY AUTOINCREMENT, event TEXT, seq INTEGER, user_id INTEGER,
+                        university_id INTEGER);
+CREATE TRIGGER queue_log_insert AFTER INSERT ON queue BEGIN
+    INSERT INTO queue_log (event, seq, user_id, university_id) VALUES ('join', NEW.seq, NEW.user_id, NEW.university_id);
+END;
+CREATE TRIGGER queue_log_delete AFTER DELETE ON queue BEGIN
+    INSERT INTO queue_log (event, seq, user_id, university_id) VALUES ('delete', OLD.seq, OLD.user_id, OLD.university_id);
+END;
+"""
+
+
+class LockingConnection(SQLiteConnection):
+    """З'єднання, у якого кожна транзакція починається з BEGIN IMMEDIATE (ексклюзивний запис між процесами)"""
+
+    def __init__(self, path, release):
+        super().__init__(path, QueryCounter(), 0, release)
+        self._conn.isolation_level = None
+
+    def cursor(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+        return super().cursor()
+
+    def commit(self):
+        self._conn.execute("COMMIT")
+
+    def rollback(self):
+        if self._conn.in_transaction:
+            self._conn.execute("ROLLBACK")
+
+
+class LockingPool(SQLitePool):
+    def __init__(self, path, size):
+        self._free = queue.Queue()
+        for _ in range(size):
+            self._free.put(LockingConnection(path, release=self._free.put))
+
+
+def open_state(path: str, pool_size: int) -> DatabaseQueueState:
+    db = Database({}, pool_size=pool_size)
+    db._create_pool = lambda: LockingPool(path, pool_size)
+    return DatabaseQueueState(db)
+
+
+async def students(path, user_ids, universities, rounds, seed):
+    """Кожен студент стає в rounds різних черг (кожну пару користувач-черга — не більше одного разу)"""
+    state = open_state(path, 4)
+    rng = random.Random(seed)
+    joined, left = [], []
+
+    async def student(user_id):
+        for university_id in rng.sample(range(1, universities + 1), rounds):
+            if await state.join(university_id, user_id, f"Студент {user_id}", datetime.now()) is not None:
+                joined.append((user_id, university_id))
+            await asyncio.sleep(rng.random() * 0.02)
+            if rng.random() < 0.4 and await state.leave(university_id, user_id) is not None:
+                left.append((user_id, university_id))
+
+    await asyncio.gather(*(student(user_id) for user_id in user_ids))
+    await state.db.close()
+    return {"joined": joined, "left": left, "popped": []}
+
+
+async def admin(path, universities, calls, seed):
+    state = open_state(path, 2)
+    rng = random.Random(seed)
+    popped = []
+    for _ in range(calls):
+        university_id = rng.randint(1, universities)
+        result = await state.pop_first(university_id)
+        if result is not None:
+            popped.append((result[0], university_id))
+        await asyncio.sleep(rng.random() * 0.005)
+    await state.db.close()
+    return {"joined": [], "left": [], "popped": popped}
+
+
+def student_process(args):
+    return asyncio.run(students(*args))
+
+
+def admin_process(args):
+    return asyncio.run(admin(*args))
+
+
+def verify(path: str, joined, left, popped) -> list:
+    problems = []
+    removals = Counter(left) + Counter(popped)
+    conn = sqlite3.connect(path)
+    present = Counter(conn.execute("SELECT user_id, university_id FROM queue").fetchall())
+    for pair, count in present.items():
+        if count > 1:
+            problems.append(f"користувач {pair[0]} двічі в черзі {pair[1]}")
+    joined = Counter(joined)
+    for pair in joined.keys() | removals.keys() | present.keys():
+        if joined[pair] != 1 and (removals[pair] or present[pair]):
+            problems.append(f"користувач {pair[0]}, черга {pair[1]}: запис без успішного входу")
+        elif joined[pair] and removals[pair] + present[pair] != 1:
+            problems.append(f"користувач {pair[0]}, черга {pair[1]}: видалень {removals[pair]}, у черзі {present[pair]}")
+
+    # Відтворюємо журнал: виклик має забирати запис із найменшим seq у своїй черзі
+    popped = set(popped)
+    queues = {}
+    for event, seq, user_id, university_id in conn.execute(
+            "SELECT event, seq, user_id, university_id FROM queue_log ORDER BY id"):
+        members = queues.setdefault(university_id, set())
+        if event == "join":
+            members.add(seq)
+            continue
+        if (user_id, university_id) in popped and seq != min(members):
+            problems.append(f"черга {university_id}: викликано seq {seq}, хоча першим був seq {min(members)}")
+        members.discard(seq)
+    conn.close()
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=4, help="процесів зі студентами")
+    parser.add_argument("--admins", type=int, default=2, help="процесів, що викликають наступного")
+    parser.add_argument("--users", type=int, default=400)
+    parser.add_argument("--universities", type=int, default=6)
+    parser.add_argument("--rounds", type=int, default=3, help="різних черг на студента")
+    parser.add_argument("--admin-calls", type=int, default=300, help="викликів наступного на процес")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "stress.db")
+    prepare_database(path, args.universities, [])
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(AUDIT)
+    users = list(range(10_000, 10_000 + args.users))
+    conn.executemany("INSERT INTO users VALUES (?, ?, ?, 0)",
+                     [(user_id, f"Студент {user_id}", f"+380{user_id:09d}") for user_id in users])
+    conn.commit()
+    conn.close()
+
+    context = multiprocessing.get_context("spawn")
+    started = time.perf_counter()
+    with context.Pool(args.processes + args.admins) as pool:
+        results = [
+            pool.apply_async(student_process, ((path, users[i::args.processes], args.universities,
+                                                min(args.rounds, args.universities), args.seed + i),))
+            for i in range(args.processes)
+        ] + [
+            pool.apply_async(admin_process, ((path, args.universities, args.admin_calls, args.seed + 1000 + i),))
+            for i in range(args.admins)
+        ]
+        results = [result.get() for result in results]
+    elapsed = time.perf_counter() - started
+
+    joined = [pair for result in results for pair in result["joined"]]
+    left = [pair for result in results for pair in result["left"]]
+    popped = [pair for result in results for pair in result["popped"]]
+    print(f"Процесів: {args.processes} студентських і {args.admins} адміністраторських, "
+          f"університетів: {args.universities}, за {elapsed:.2f} с")
+    print(f"Входів: {len(joined)}, виходів: {len(left)}, викликів: {len(popped)}")
+    problems = verify(path, joined, left, popped)
+    for problem in problems[:20]:
+        print(f"  ✗ {problem}")
+    print("Порушень не знайдено" if not problems else f"Порушень: {len(problems)}")
+    sys.exit(0 if not problems else 1)
+
+
+if __name__ == "__main__":
+    main()
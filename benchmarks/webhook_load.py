@@ -0,0 +1,164 @@
+"""Навантажувальний тест вебхука: справжній Dispatcher з main.py за локальним WebhookServer.
+
+Скрипт сам запускає WebhookServer, фейковий Bot API (з load_test.py) і
+SQLite замість MySQL, після чого надсилає HTTP-запити з оновленнями, як це
+робить Telegram. Тексти кнопок беруться з main.BUTTON_ROUTES, тож кожне
+оновлення доходить до справжнього обробника.
+
+    python benchmarks/webhook_load.py --users 200 --updates 2000 --concurrency 40
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import socket
+import sqlite3
+import sys
+import tempfile
+import time
+
+from aiohttp import ClientSession
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("TELEGRAM_TOKEN", "123456:load-test")
+
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+from load_test import FakeBotAPI, QueryCounter, SQLitePool, percentile, prepare_database  # noqa: E402
+from webhook import SECRET_HEADER, WebhookServer  # noqa: E402
+
+SECRET = "load-test-secret"
+
+
+def make_message(update_id: int, user_id: int, text: str) -> dict:
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": f"Load{user_id}"},
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text)}]
+    return {"update_id": update_id, "message": message}
+
+
+def make_callback(update_id: int, user_id: int, data: str) -> dict:
+    sender = {"id": user_id, "is_bot": False, "first_name": f"Load{user_id}"}
+    return {"update_id": update_id, "callback_query": {
+        "id": str(update_id), "chat_instance": "load", "data": data, "from": sender,
+        "message": {"message_id": update_id, "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"}, "text": "Виберіть університет:"},
+    }}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run(args):
+    if not args.verbose:
+        logging.disable(logging.INFO)
+    import main
+
+    # Тексти кнопок за назвою обробника: {"join_button": "➕ Записатися в чергу ➕", ...}
+    labels = {handler.__name__: text for text, (handler, _, _) in main.BUTTON_ROUTES.items()}
+
+    api = FakeBotAPI(args.api_ms / 1000)
+    main.bot.session.api = TelegramAPIServer.from_base(await api.start())
+
+    tmp = tempfile.TemporaryDirectory()
+    path = os.path.join(tmp.name, "webhook.db")
+    prepare_database(path, args.universities, [])
+    users = range(args.first_user, args.first_user + args.users)
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO users VALUES (?, ?, ?, 0)",
+                     [(user_id, f"Load{user_id}", f"+380{user_id:09d}") for user_id in users])
+    conn.commit()
+    conn.close()
+
+    manager = main.queue_manager
+    db = manager.db
+    db._create_pool = lambda: SQLitePool(path, db.pool_size, QueryCounter(), args.query_ms / 1000)
+
+    async def init_db():
+        await manager.load_queue()
+    manager.init_db = init_db  # Схему вже створено в SQLite
+    manager.snapshot = None
+    manager.retention = None
+    await manager.startup(main.bot)
+
+    port = free_port()
+    server = WebhookServer(main.dp, main.bot, path="/webhook", secret_token=SECRET,
+                           max_concurrency=args.concurrency)
+    await server.start("127.0.0.1", port)
+    url = f"http://127.0.0.1:{port}/webhook"
+
+    update_ids = itertools.count(1)
+    latencies = []
+    statuses = {}
+    headers = {SECRET_HEADER: SECRET}
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def post(session, payload, measure=True):
+        async with semaphore:
+            started = time.perf_counter()
+            async with session.post(url, json=payload, headers=headers) as response:
+                await response.read()
+            if measure:
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status] = statuses.get(response.status, 0) + 1
+
+    async with ClientSession() as session:
+        # Підготовка: кожен користувач вибирає університет і стає в чергу
+        await asyncio.gather(*(
+            post(session, make_callback(next(update_ids), user_id, f"uni_{user_id % args.universities + 1}"), False)
+            for user_id in users
+        ))
+        await asyncio.gather(*(
+            post(session, make_message(next(update_ids), user_id, labels["join_button"]), False) for user_id in users
+        ))
+        replies_before = api.calls.get("sendMessage", 0)
+
+        texts = itertools.cycle(["/start", labels["position_button"], labels["view_button"]])
+        payloads = [
+            make_message(next(update_ids), args.first_user + index % args.users, next(texts))
+            for index in range(args.updates)
+        ]
+        started = time.perf_counter()
+        await asyncio.gather(*(post(session, payload) for payload in payloads))
+        elapsed = time.perf_counter() - started
+
+    replies = api.calls.get("sendMessage", 0) - replies_before
+    print(f"Оновлень: {args.updates}, одночасно: {args.concurrency}, затримка API: {args.api_ms} мс, за {elapsed:.2f} с")
+    print(f"  пропускна здатність: {args.updates / elapsed:10.1f} оновлень/с")
+    print(f"  затримка p50:        {percentile(latencies, 0.50) * 1000:10.2f} мс")
+    print(f"  затримка p99:        {percentile(latencies, 0.99) * 1000:10.2f} мс")
+    print(f"  коди відповіді:      {statuses}")
+    print(f"  відповідей бота:     {replies} (має бути не менше {args.updates})")
+
+    await server.stop()
+    await main.shutdown()
+    await api.stop()
+    tmp.cleanup()
+    return replies >= args.updates
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=40)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--universities", type=int, default=5)
+    parser.add_argument("--first-user", type=int, default=10_000_000)
+    parser.add_argument("--api-ms", type=float, default=20.0, help="затримка відповіді фейкового Bot API")
+    parser.add_argument("--query-ms", type=float, default=0.0, help="додаткова затримка кожного запиту до БД")
+    parser.add_argument("--verbose", action="store_true", help="не вимикати INFO-логи бота")
+    sys.exit(0 if asyncio.run(run(parser.parse_args())) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,383 +1,707 @@
 import mysql.connector
-from collections import deque
+from dataclasses import dataclass
 from datetime import datetime
 import asyncio
+import functools
+import inspect
 import logging
 
-# Налаштування логування
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+from actors import QueueActors
+from cache import TTLCache
+from catalogue import UniversityCatalogue
+from coalescer import ShiftCoalescer, position_text
+from db import Database
+from history import HistoryWriter
+from logging_setup import HOT_PATH
+from migrations import migrate
+from notifier import Notifier
+from outbox import PRIORITY_QUEUE, Outbox, OutboxBatch
+from queue_state import QUEUE_BACKENDS
+from retention import HistoryRetention
+from scheduler import TimerScheduler
+from snapshot import QueueSnapshot
+from stats import QueueStats, format_duration
+
 logger = logging.getLogger(__name__)
 
+# Типи дій в історії: {коротка назва для команд і кнопок: префікс дії в user_history}
+HISTORY_ACTIONS = {
+    "join": "join_queue",
+    "leave": "leave_queue",
+    "next": "next_in_queue",
+    "removed": "removed_from_queue",
+    "moved": "moved_",
+    "bc": "broadcast_message",
+}
+HISTORY_PAGE_SIZE = 20
+QUEUE_PAGE_SIZE = 20  # Рядків черги на сторінці перегляду (20 імен вміщуються в ліміт 4096 символів)
+QUEUE_NEIGHBOURS = 2  # Скільки сусідів з кожного боку показується навколо місця користувача
+
+
+def render_table(title: str, lines) -> str:
+    """Таблиця в рамці з заголовком"""
+    width = max(len(title), *(len(line) for line in lines))
+    return "\n".join([
+        "╔" + "═" * (width + 2) + "╗",
+        f"║ {title.center(width)} ║",
+        "╟" + "─" * (width + 2) + "╢",
+        *(f"║ {line.ljust(width)} ║" for line in lines),
+        "╚" + "═" * (width + 2) + "╝",
+    ])
+
+
+def serialized(*params):
+    """Виконує метод QueueManager в акторах університетів із параметрів params і зберігає зміни черг.
+
+    Виклик повертається, коли операція застосована і збережена; операції над
+    однією чергою не перемежовуються між await.
+    """
+    def decorate(method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            arguments = signature.bind(self, *args, **kwargs).arguments
+
+            university_ids = [arguments[name] for name in params]
+
+            async def operation():
+                result = await method(self, *args, **kwargs)
+                await self.save_queue(university_ids)
+                return result
+            return await self.actors.run(university_ids, operation)
+        return wrapper
+    return decorate
+
+
+@dataclass(frozen=True)
+class UserProfile:
+    user_name: str
+    phone_number: str
+    is_admin: bool
+
+
 class QueueManager:
-    def __init__(self, db_config):
+    def __init__(self, db_config, pool_size: int = 5, health_check_interval: float = 30.0, notifier_workers: int = 8,
+                 profile_cache_ttl: float = 300.0, profile_cache_size: int = 10_000,
+                 catalogue_refresh_interval: float = 60.0, history_batch_size: int = 100,
+                 history_flush_interval: float = 1.0, queue_backend: str = "memory", outbox_batch_size: int = 100,
+                 outbox_keep_days: int = 7,
+                 reminder_delay: float = 60.0, no_show_timeout: float = 0.0, shift_notifications: str = "coalesce",
+                 shift_window: float = 3.0, shift_threshold: int = 10, shift_top_k: int = 3,
+                 status_interval: float = 30.0, snapshot_path: str = None, snapshot_interval: float = 30.0,
+                 history_retention_days: int = 0, archive_dir: str = None, retention_interval: float = 3600.0,
+                 retention_chunk_size: int = 1000):
         self.db_config = db_config
-        logger.info(f"Ініціалізація QueueManager з db_config: {db_config}")
-        self.queues = {}  # Словник черг: {university_id: deque}
-        self.user_names = {}  # Кеш імен: {(user_id, university_id): user_name}
-        self.join_times = {}  # Кеш часу входу: {(user_id, university_id): join_time}
+        logger.info(f"Ініціалізація QueueManager: база даних {db_config.get('database')} на {db_config.get('host')}")
+        self.db = Database(db_config, pool_size=pool_size, health_check_interval=health_check_interval)
+        self.notifier = Notifier(workers=notifier_workers)
+        # Усі сповіщення проходять через стійку чергу вихідних повідомлень і переживають перезапуск
+        self.outbox = Outbox(self.db, self.notifier, batch_size=outbox_batch_size, keep_days=outbox_keep_days)
+        # Сповіщення про рух черги: "each" — повідомлення кожному на кожен /next, "coalesce" — об'єднані
+        self.shift_notifications = shift_notifications
+        self.coalescer = ShiftCoalescer(self.outbox, self.notifier, window=shift_window, threshold=shift_threshold,
+                                        top_k=shift_top_k, status_interval=status_interval)
+        # Таймери першого в черзі: нагадування через reminder_delay і пропуск через no_show_timeout (0 — вимкнено)
+        self.reminder_delay = reminder_delay
+        self.no_show_timeout = no_show_timeout
+        self.timers = TimerScheduler(self.db, self._on_timer)
+        self.history = HistoryWriter(self.db, batch_size=history_batch_size, flush_interval=history_flush_interval)
+        # Архівування і видалення старої історії та оголошень (0 днів — зберігати все)
+        self.retention = None
+        if history_retention_days > 0:
+            self.retention = HistoryRetention(self.db, retention_days=history_retention_days, archive_dir=archive_dir,
+                                              interval=retention_interval, chunk_size=retention_chunk_size)
+        self.profile_cache = TTLCache(maxsize=profile_cache_size, ttl=profile_cache_ttl)  # {user_id: UserProfile | None}
+        self.catalogue = UniversityCatalogue()
+        self.catalogue_refresh_interval = catalogue_refresh_interval
+        self._catalogue_task = None
+        # Стан черг: у пам'яті одного процесу ("memory") або в базі даних, спільний для кількох процесів ("database")
+        self.state = QUEUE_BACKENDS[queue_backend](self.db)
+        # Зміни черги одного університету виконує лише його актор, різні університети — паралельно
+        self.actors = QueueActors()
+        self.stats = QueueStats()
+        # Відрендерені сторінки перегляду черги: {university_id: (версія черги, розмір, {сторінка: текст})}
+        self._view_pages = {}
+        logger.info(f"Сховище стану черг: {queue_backend}")
+        # Локальний знімок черг для швидкого старту (лише для черг у пам'яті)
+        self.snapshot = None
+        if snapshot_path and queue_backend == "memory":
+            self.snapshot = QueueSnapshot(snapshot_path, self.state, interval=snapshot_interval)
 
-    async def startup(self):
+    async def startup(self, bot):
         """Виконує ініціалізацію під час запуску бота"""
         logger.info("Запуск ініціалізації бази даних")
         await self.init_db()
+        await self.reload_universities()
+        self.notifier.start()
+        self.outbox.start(bot)  # Продовжує розсилки, не завершені до перезапуску
+        self.coalescer.start(bot)
+        await self.timers.load()
+        self.timers.start()
+        self.history.start()
+        if self.snapshot is not None:
+            self.snapshot.start()
+        if self.retention is not None:
+            self.retention.start()
+        self._catalogue_task = asyncio.create_task(self._refresh_catalogue())
+
+    async def shutdown(self):
+        """Звільняє ресурси під час зупинки бота"""
+        if self._catalogue_task is not None:
+            self._catalogue_task.cancel()
+            self._catalogue_task = None
+        if self.retention is not None:
+            await self.retention.stop()
+        await self.timers.stop()
+        await self.actors.stop()
+        if self.snapshot is not None:
+            await self.snapshot.stop()
+        await self.coalescer.stop()
+        await self.outbox.stop()
+        await self.notifier.stop()
+        await self.history.close()
+        await self.db.close()
 
     async def init_db(self):
-        """Ініціалізація бази даних і таблиць"""
+        """Ініціалізація бази даних: міграції схеми та відновлення черг"""
         try:
             logger.info("Спроба підключення до MySQL")
-            conn = mysql.connector.connect(**self.db_config)
-            cursor = conn.cursor()
-            logger.info("Підключення до MySQL успішне")
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS universities (
-                    university_id INT AUTO_INCREMENT PRIMARY KEY,
-                    name VARCHAR(255) NOT NULL,
-                    UNIQUE (name)
-                )
-            """)
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id BIGINT PRIMARY KEY,
-                    user_name VARCHAR(255) NOT NULL,
-                    phone_number VARCHAR(20) NOT NULL,
-                    is_admin BOOLEAN NOT NULL DEFAULT FALSE
-                )
-            """)
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS queue (
-                    user_id BIGINT NOT NULL,
-                    university_id INT NOT NULL,
-                    join_time DATETIME NOT NULL,
-                    PRIMARY KEY (user_id, university_id),
-                    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
-                    FOREIGN KEY (university_id) REFERENCES universities(university_id) ON DELETE CASCADE
-                )
-            """)
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS user_history (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    user_id BIGINT NOT NULL,
-                    action VARCHAR(255) NOT NULL,
-                    timestamp DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
-                )
-            """)
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS broadcast_messages (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    admin_id BIGINT NOT NULL,
-                    message_text TEXT NOT NULL,
-                    timestamp DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (admin_id) REFERENCES users(user_id) ON DELETE CASCADE
-                )
-            """)
-            conn.commit()
+            await migrate(self.db)
             logger.info("База даних ініціалізована")
-            await self.load_queue()
+            # Знімок черг відновлюється без запиту до бази даних; звірка з нею відбувається у фоні
+            if self.snapshot is None or not await self.snapshot.restore():
+                await self.load_queue()
         except mysql.connector.Error as e:
             logger.error(f"Помилка ініціалізації бази даних: {e}")
             raise
-        finally:
-            if 'cursor' in locals(): cursor.close()
-            if 'conn' in locals(): conn.close()
+
+    async def get_user_profile(self, user_id: int):
+        """Повертає профіль користувача з кешу або з бази даних (None, якщо користувача немає)"""
+        profile = self.profile_cache.get(user_id)
+        if not TTLCache.is_miss(profile):
+            return profile
+        generation = self.profile_cache.generation
+        result = await self.db.fetchone(
+            "SELECT user_name, phone_number, is_admin FROM users WHERE user_id = %s", (user_id,)
+        )
+        profile = UserProfile(result[0], result[1], bool(result[2])) if result else None
+        self.profile_cache.set_if_current(user_id, profile, generation)
+        return profile
+
+    def invalidate_user(self, user_id: int):
+        """Скидає кешований профіль користувача"""
+        self.profile_cache.invalidate(user_id)
+
+    def register_metrics(self, registry):
+        """Реєструє показники стану черг, розсилки та пулу з'єднань для /metrics"""
+        registry.register_gauge(
+            "queuebot_queue_length", "Кількість людей у черзі університету", self.state.lengths, label="university_id"
+        )
+        registry.register_gauge(
+            "queuebot_notifier_pending", "Повідомлення, що очікують надсилання", lambda: self.notifier.pending
+        )
+        registry.register_gauge(
+            "queuebot_outbox_pending", "Повідомлення в outbox, що ще не доставлені", self.outbox.pending
+        )
+        registry.register_gauge(
+            "queuebot_history_backlog", "Події історії, ще не записані в базу даних", lambda: self.history.backlog
+        )
+        registry.register_gauge(
+            "queuebot_db_connections_in_use", "З'єднання з базою даних, узяті з пулу", lambda: self.db.in_use
+        )
+        registry.register_gauge("queuebot_db_pool_size", "Розмір пулу з'єднань", lambda: self.db.pool_size)
+        registry.register_gauge(
+            "queuebot_service_interval_seconds", "EWMA інтервалу між викликами з черги університету",
+            self.stats.service_times, label="university_id"
+        )
+        registry.register_counter(
+            "queuebot_profile_cache_lookups_total", "Звернення до кешу профілів користувачів",
+            lambda: {"hit": self.profile_cache.hits, "miss": self.profile_cache.misses}, label="result"
+        )
+        registry.register_gauge("queuebot_profile_cache_size", "Профілі в кеші", lambda: len(self.profile_cache))
+        registry.register_gauge(
+            "queuebot_actor_backlog", "Операції, що чекають в акторі черги університету", self.actors.backlog,
+            label="university_id"
+        )
 
     async def is_admin(self, user_id: int) -> bool:
         """Перевіряє, чи є користувач адміністратором"""
         try:
-            conn = mysql.connector.connect(**self.db_config)
-            cursor = conn.cursor()
-            cursor.execute("SELECT is_admin FROM users WHERE user_id = %s", (user_id,))
-            result = cursor.fetchone()
-            return result is not None and result[0]
+            profile = await self.get_user_profile(user_id)
+            return profile is not None and profile.is_admin
         except mysql.connector.Error as e:
             logger.error(f"Помилка перевірки статусу адміністратора: {e}")
             return False
-        finally:
-            if 'cursor' in locals(): cursor.close()
-            if 'conn' in locals(): conn.close()
 
     async def get_universities(self):
-        """Отримує список університетів"""
+        """Отримує список університетів з каталогу в пам'яті"""
+        if not self.catalogue.loaded:
+            await self.reload_universities()
+        return self.catalogue.universities
+
+    async def reload_universities(self) -> bool:
+        """Перечитує таблицю universities, якщо вона змінилася; повертає True при зміні"""
+        def load(cursor):
+            cursor.execute(
+                "SELECT COUNT(*), COALESCE(MAX(university_id), 0), COALESCE(SUM(CRC32(name)), 0) FROM universities"
+            )
+            fingerprint = tuple(cursor.fetchone())
+            if fingerprint == self.catalogue.fingerprint:
+                return fingerprint, None
+            cursor.execute("SELECT university_id, name FROM universities ORDER BY university_id")
+            return fingerprint, cursor.fetchall()
+
         try:
-            conn = mysql.connector.connect(**self.db_config)
-            cursor = conn.cursor()
-            cursor.execute("SELECT university_id, name FROM universities")
-            universities = cursor.fetchall()
-            logger.info("Університети успішно завантажені")
-            return universities
+            fingerprint, universities = await self.db.run(load)
         except mysql.connector.Error as e:
             logger.error(f"Помилка завантаження університетів: {e}")
-            return []
-        finally:
-            if 'cursor' in locals(): cursor.close()
-            if 'conn' in locals(): conn.close()
+            return False
+        if universities is None:
+            return False
+        changed = self.catalogue.replace(universities, fingerprint)
+        if changed:
+            logger.info(f"Університети успішно завантажені ({len(universities)}), версія каталогу {self.catalogue.version}")
+        return changed
+
+    async def _refresh_catalogue(self):
+        """Періодично перевіряє, чи змінилася таблиця universities"""
+        while True:
+            await asyncio.sleep(self.catalogue_refresh_interval)
+            await self.reload_universities()
 
     async def load_queue(self):
         """Завантаження черг з бази даних для всіх університетів"""
-        self.queues.clear()
-        self.user_names = {}
-        self.join_times = {}
-        try:
-            conn = mysql.connector.connect(**self.db_config)
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT q.user_id, u.user_name, q.university_id, q.join_time 
-                FROM queue q
-                JOIN users u ON q.user_id = u.user_id
-                ORDER BY q.join_time
-            """)
-            for row in cursor.fetchall():
-                user_id, user_name, university_id, join_time = row
-                if university_id not in self.queues:
-                    self.queues[university_id] = deque()
-                self.queues[university_id].append(user_id)
-                self.user_names[(user_id, university_id)] = user_name
-                self.join_times[(user_id, university_id)] = join_time
-            logger.info("Черги успішно завантажені з бази даних")
-        except mysql.connector.Error as e:
-            logger.error(f"Помилка завантаження черг: {e}")
-        finally:
-            if 'cursor' in locals(): cursor.close()
-            if 'conn' in locals(): conn.close()
+        await self.state.load()
 
-    async def save_queue(self):
-        """Збереження всіх черг у базу даних"""
-        try:
-            conn = mysql.connector.connect(**self.db_config)
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM queue")
-            for university_id, queue in self.queues.items():
-                for user_id in queue:
-                    cursor.execute(
-                        "INSERT INTO queue (user_id, university_id, join_time) VALUES (%s, %s, %s)",
-                        (user_id, university_id, self.join_times[(user_id, university_id)])
-                    )
-            conn.commit()
-            logger.info("Черги успішно збережені в базі даних")
-        except mysql.connector.Error as e:
-            logger.error(f"Помилка збереження черг: {e}")
-        finally:
-            if 'cursor' in locals(): cursor.close()
-            if 'conn' in locals(): conn.close()
+    async def save_queue(self, university_ids=None):
+        """Збереження змін черг university_ids (усіх, якщо None), накопичених з моменту попереднього збереження"""
+        await self.state.flush(university_ids)
+
+    async def sync_queue(self):
+        """Повна синхронізація всіх черг з базою даних одним пакетним записом"""
+        await self.state.sync()
 
     async def save_user_phone(self, user_id: int, user_name: str, phone_number: str):
         """Збереження номера телефону користувача"""
         try:
-            conn = mysql.connector.connect(**self.db_config)
-            cursor = conn.cursor()
-            cursor.execute(
+            await self.db.execute(
                 "INSERT INTO users (user_id, user_name, phone_number, is_admin) VALUES (%s, %s, %s, %s) "
                 "ON DUPLICATE KEY UPDATE user_name=%s, phone_number=%s",
                 (user_id, user_name, phone_number, False, user_name, phone_number)
             )
-            conn.commit()
-            logger.info(f"Збережено номер: {phone_number} для {user_name} (ID: {user_id})")
+            logger.info(f"Збережено номер телефону для {user_name} (ID: {user_id})")
         except mysql.connector.Error as e:
             logger.error(f"Помилка збереження номера телефону: {e}")
         finally:
-            if 'cursor' in locals(): cursor.close()
-            if 'conn' in locals(): conn.close()
+            self.invalidate_user(user_id)
 
     async def phone_exists(self, user_id: int) -> str:
         """Перевірка, чи існує номер телефону для користувача"""
         try:
-            conn = mysql.connector.connect(**self.db_config)
-            cursor = conn.cursor()
-            cursor.execute("SELECT phone_number FROM users WHERE user_id = %s", (user_id,))
-            result = cursor.fetchone()
-            return result[0] if result else None
+            profile = await self.get_user_profile(user_id)
+            return profile.phone_number if profile else None
         except mysql.connector.Error as e:
             logger.error(f"Помилка перевірки номера телефону: {e}")
             return None
-        finally:
-            if 'cursor' in locals(): cursor.close()
-            if 'conn' in locals(): conn.close()
 
-    async def log_action(self, user_id: int, user_name: str, action: str):
-        """Запис дії в історію"""
-        try:
-            conn = mysql.connector.connect(**self.db_config)
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO user_history (user_id, action) VALUES (%s, %s)",
-                (user_id, action)
-            )
-            conn.commit()
-            logger.info(f"Дія записана: {action} для {user_name} (ID: {user_id})")
-        except mysql.connector.Error as e:
-            logger.error(f"Помилка запису історії: {e}")
-        finally:
-            if 'cursor' in locals(): cursor.close()
-            if 'conn' in locals(): conn.close()
+    def log_action(self, user_id: int, user_name: str, action: str, university_id: int = None):
+        """Запис дії в історію (через буфер відкладеного запису)"""
+        self.history.add(user_id, action, university_id)
+        logger.info(f"Дія записана: {action} для {user_name} (ID: {user_id})", extra=HOT_PATH)
+
+    async def get_user_history(self, user_id: int, cursor: tuple = None, action: str = None,
+                               university_id: int = None, limit: int = HISTORY_PAGE_SIZE) -> tuple[str, tuple]:
+        """Повертає сторінку історії дій користувача (доступно лише для адмінів).
 
-    async def get_user_history(self, user_id: int) -> str:
-        """Повертає історію дій користувача (доступно лише для адмінів)"""
+        Сторінки вибираються за ключем (timestamp, id): cursor — це ключ останнього
+        запису попередньої сторінки. Повертає текст і курсор наступної сторінки
+        (None, якщо записів більше немає).
+        """
+        conditions = ["h.user_id = %s"]
+        params = [user_id]
+        if cursor is not None:
+            conditions.append("(h.timestamp < %s OR (h.timestamp = %s AND h.id < %s))")
+            params += [cursor[0], cursor[0], cursor[1]]
+        if action is not None:
+            conditions.append("h.action LIKE %s")
+            params.append(HISTORY_ACTIONS[action] + "%")
+        if university_id is not None:
+            conditions.append("h.university_id = %s")
+            params.append(university_id)
+        params.append(limit + 1)
         try:
-            conn = mysql.connector.connect(**self.db_config)
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT u.user_name, h.action, h.timestamp 
+            history = await self.db.fetchall(f"""
+                SELECT h.id, u.user_name, h.action, h.timestamp 
                 FROM user_history h
                 JOIN users u ON h.user_id = u.user_id
-                WHERE h.user_id = %s 
-                ORDER BY h.timestamp DESC
-            """, (user_id,))
-            history = cursor.fetchall()
-            if not history:
-                return "Історія дій порожня."
-            result = ["📜 Історія дій:"]
-            for user_name, action, timestamp in history:
-                result.append(f"[{timestamp}] {user_name}: {action}")
-            return "\n".join(result)
+                WHERE {" AND ".join(conditions)}
+                ORDER BY h.timestamp DESC, h.id DESC
+                LIMIT %s
+            """, tuple(params))
         except mysql.connector.Error as e:
             logger.error(f"Помилка отримання історії користувача: {e}")
-            return "Помилка при отриманні історії."
-        finally:
-            if 'cursor' in locals(): cursor.close()
-            if 'conn' in locals(): conn.close()
+            return "Помилка при отриманні історії.", None
+        if not history:
+            return ("Історія дій порожня." if cursor is None else "Більше записів немає."), None
+        next_cursor = None
+        if len(history) > limit:
+            history = history[:limit]
+            next_cursor = (history[-1][3], history[-1][0])
+        result = ["📜 Історія дій:"]
+        for _, user_name, action_text, timestamp in history:
+            result.append(f"[{timestamp}] {user_name}: {action_text}")
+        return "\n".join(result), next_cursor
 
-    async def broadcast_message(self, bot, admin_id: int, admin_name: str, message_text: str, university_id: int):
-        """Зберігає повідомлення в базу даних і надсилає його користувачам у черзі вибраного університету"""
+    async def broadcast_message(self, bot, admin_id: int, admin_name: str, message_text: str, university_id: int) -> OutboxBatch:
+        """Зберігає повідомлення в базу даних і ставить його в чергу розсилки користувачам вибраного університету"""
         try:
             # Збереження повідомлення в базу даних
-            conn = mysql.connector.connect(**self.db_config)
-            cursor = conn.cursor()
-            cursor.execute(
+            await self.db.execute(
                 "INSERT INTO broadcast_messages (admin_id, message_text) VALUES (%s, %s)",
                 (admin_id, message_text)
             )
-            conn.commit()
             logger.info(f"Оголошення збережено від {admin_name} (ID: {admin_id})")
 
             # Логування дії
-            await self.log_action(admin_id, admin_name, f"broadcast_message_university_{university_id}: {message_text[:50]}...")
+            self.log_action(admin_id, admin_name, f"broadcast_message_university_{university_id}: {message_text[:50]}...", university_id)
 
             # Отримання користувачів у черзі вибраного університету
-            users = list(self.queues.get(university_id, deque()))
+            users = [user_id for user_id, _ in await self.state.members(university_id)]
             logger.info(f"Надсилання оголошення {len(users)} користувачам університету {university_id}")
 
             # Форматування повідомлення
             broadcast_text = f"📢 Оголошення від адміністратора {admin_name}:\n{message_text}"
 
-            # Надсилання повідомлення кожному користувачу в черзі
-            for user_id in users:
-                try:
-                    await bot.send_message(chat_id=user_id, text=broadcast_text)
-                    logger.info(f"Оголошення надіслано користувачу {user_id} у університеті {university_id}")
-                except Exception as e:
-                    logger.error(f"Помилка надсилання оголошення користувачу {user_id}: {e}")
-                    continue
+            # Розсилка зберігається в outbox і надсилається у фоні; звіт отримає адміністратор
+            return await self.outbox.enqueue(
+                f"Оголошення університету {university_id}",
+                [(user_id, broadcast_text) for user_id in users],
+                admin_id=admin_id
+            )
 
         except mysql.connector.Error as e:
             logger.error(f"Помилка збереження оголошення: {e}")
             raise
-        finally:
-            if 'cursor' in locals(): cursor.close()
-            if 'conn' in locals(): conn.close()
 
-    def join_queue(self, user_id: int, user_name: str, university_id: int) -> str:
+    @serialized("university_id")
+    async def join_queue(self, user_id: int, user_name: str, university_id: int) -> str:
         """Додає користувача до черги університету"""
-        if university_id not in self.queues:
-            self.queues[university_id] = deque()
-        queue = self.queues[university_id]
-        if user_id not in queue:
-            queue.append(user_id)
-            self.user_names[(user_id, university_id)] = user_name
-            self.join_times[(user_id, university_id)] = datetime.now()
-            asyncio.create_task(self.log_action(user_id, user_name, f"join_queue_university_{university_id}"))
-            return f"{user_name}, ви додані до черги університету. Ваш номер: {len(queue)}"
-        return "Ви вже в черзі цього університету!"
-
-    def leave_queue(self, user_id: int, university_id: int) -> str:
+        position = await self.state.join(university_id, user_id, user_name, datetime.now())
+        if position is None:
+            return "Ви вже в черзі цього університету!"
+        self.stats.on_join(university_id, position)
+        self.log_action(user_id, user_name, f"join_queue_university_{university_id}", university_id)
+        return f"{user_name}, ви додані до черги університету. Ваш номер: {position}"
+
+    @serialized("university_id")
+    async def leave_queue(self, user_id: int, university_id: int) -> str:
         """Видаляє користувача з черги університету"""
-        if university_id not in self.queues or user_id not in self.queues[university_id]:
+        user_name = await self.state.leave(university_id, user_id)
+        if user_name is None:
             logger.warning(f"Користувач (ID: {user_id}) не в черзі університету {university_id}")
             return "Вас немає в черзі цього університету!"
-        self.queues[university_id].remove(user_id)
-        user_name = self.user_names.pop((user_id, university_id))
-        self.join_times.pop((user_id, university_id))
-        if not self.queues[university_id]:
-            del self.queues[university_id]
         logger.info(f"Користувач {user_name} (ID: {user_id}) покинув чергу університету {university_id}")
-        asyncio.create_task(self.log_action(user_id, user_name, f"leave_queue_university_{university_id}"))
+        self.stats.on_leave(university_id, await self.state.size(university_id))
+        self.log_action(user_id, user_name, f"leave_queue_university_{university_id}", university_id)
+        if self.shift_notifications == "coalesce":
+            self.coalescer.close(university_id, [user_id])
+        if self._is_tracked(university_id, user_id):
+            await self._track_first(university_id)
         return f"{user_name}, ви покинули чергу університету."
 
-    def view_queue(self, university_id: int) -> str:
-        """Повертає список учасників черги університету в рамці"""
-        if university_id not in self.queues or not self.queues[university_id]:
+    async def view_queue(self, university_id: int, user_id: int = None, page: int = 0) -> tuple[str, int, int]:
+        """Сторінка черги університету в рамці: (текст, сторінка, кількість сторінок).
+
+        Сторінки кешуються за версією черги, тож поки черга не змінилася,
+        повторний перегляд не читає і не рендерить її заново. Якщо user_id
+        стоїть поза сторінкою, під нею показується його місце із сусідами.
+        """
+        version = await self.state.version(university_id)
+        cached = self._view_pages.get(university_id)
+        if cached is None or cached[0] != version:
+            cached = self._view_pages[university_id] = (version, await self.state.size(university_id), {})
+        _, size, pages = cached
+        if not size:
             logger.info(f"Черга для університету {university_id} порожня")
-            return "Черга порожня."
-        
-        queue_list = [f"{i+1}. {self.user_names[(uid, university_id)]}" for i, uid in enumerate(self.queues[university_id])]
-        max_length = max(len(line) for line in queue_list) if queue_list else 10
-        max_length = max(max_length, len("Поточна черга"))
-        
-        top_border = "╔" + "═" * (max_length + 2) + "╗"
-        bottom_border = "╚" + "═" * (max_length + 2) + "╝"
-        title = f"║ {'Поточна черга'.center(max_length)} ║"
-        separator = "╟" + "─" * (max_length + 2) + "╢"
-        queue_rows = [f"║ {line.ljust(max_length)} ║" for line in queue_list]
-        
-        result = [top_border, title, separator] + queue_rows + [bottom_border]
-        logger.info(f"Запит на перегляд черги для університету {university_id}")
-        return "\n".join(result)
-
-    async def next_in_queue(self, university_id: int, bot) -> tuple[str, list[int]]:
+            return "Черга порожня.", 0, 0
+
+        total = -(-size // QUEUE_PAGE_SIZE)
+        page = max(0, min(page, total - 1))
+        text = pages.get(page)
+        if text is None:
+            start = page * QUEUE_PAGE_SIZE + 1
+            members = await self.state.window(university_id, start, QUEUE_PAGE_SIZE)
+            title = "Поточна черга" if total == 1 else f"Поточна черга ({page + 1}/{total})"
+            text = pages[page] = render_table(
+                title, [f"{start + i}. {user_name}" for i, (_, user_name) in enumerate(members)]
+            )
+
+        found = await self.state.position(university_id, user_id) if user_id is not None else None
+        if found and not page * QUEUE_PAGE_SIZE < found[0] <= (page + 1) * QUEUE_PAGE_SIZE:
+            start = max(1, found[0] - QUEUE_NEIGHBOURS)
+            around = await self.state.window(university_id, start, 2 * QUEUE_NEIGHBOURS + 1)
+            text += "\n" + render_table("Ваше місце", [
+                f"{'➤ ' if member == user_id else ''}{start + i}. {user_name}"
+                for i, (member, user_name) in enumerate(around)
+            ])
+        logger.info(f"Запит на перегляд черги для університету {university_id}, сторінка {page + 1}/{total}", extra=HOT_PATH)
+        return text, page, total
+
+    @serialized("university_id")
+    async def next_in_queue(self, university_id: int, bot=None) -> tuple[str, list[int]]:
         """Викликає наступного користувача з черги університету та сповіщає всіх про нову позицію"""
-        if university_id not in self.queues or not self.queues[university_id]:
+        # Видаляємо першого користувача
+        popped = await self.state.pop_first(university_id)
+        if popped is None:
             logger.info(f"Черга для університету {university_id} порожня при виклику наступного")
             return "Черга порожня.", []
-        # Видаляємо першого користувача
-        next_user = self.queues[university_id].popleft()
-        next_name = self.user_names.pop((next_user, university_id))
-        self.join_times.pop((next_user, university_id))
+        next_user, next_name = popped
+        self.log_action(next_user, next_name, f"next_in_queue_university_{university_id}", university_id)
+        members = await self.state.members(university_id)
+        self.stats.on_serve(university_id, 1, len(members))
         # Перевіряємо, чи залишилися користувачі в черзі
-        if not self.queues[university_id]:
-            del self.queues[university_id]
+        if not members:
             logger.info(f"Черга для університету {university_id} порожня після видалення {next_name} (ID: {next_user})")
+            await self.timers.cancel(university_id, "remind", "no_show")
+            if self.shift_notifications == "coalesce":
+                self.coalescer.advance(university_id, [])
             return "Черга порожня.", []
         # Отримуємо ім'я наступного користувача (тепер першого в черзі)
-        new_first_user = self.queues[university_id][0]
-        new_first_name = self.user_names[(new_first_user, university_id)]
-        updated_users = list(self.queues.get(university_id, deque()))
-        # Сповіщаємо всіх користувачів у черзі про їхні нові позиції
-        for index, user_id in enumerate(updated_users):
-            try:
-                position_message = await self.notify_position(user_id, university_id)
-                await bot.send_message(
-                    chat_id=user_id,
-                    text=f"Черга зрушила! {position_message}"
-                )
-                logger.info(f"Сповіщення про нову позицію надіслано користувачу {user_id} у університеті {university_id}")
-            except Exception as e:
-                logger.error(f"Помилка надсилання сповіщення користувачу {user_id}: {e}")
-                continue
+        new_first_user, new_first_name = members[0]
+        await self._track_first(university_id, new_first_user)
+        updated_users = [user_id for user_id, _ in members]
+        # Сповіщаємо користувачів у черзі про їхні нові позиції у фоні (позиція — це індекс у знімку черги)
+        if self.shift_notifications == "coalesce":
+            self.coalescer.advance(university_id, members)
+        else:
+            await self.outbox.enqueue(
+                f"Зсув черги університету {university_id}",
+                [(user_id, f"Черга зрушила! {position_text(user_name, index + 1)}")
+                 for index, (user_id, user_name) in enumerate(members)],
+                priority=PRIORITY_QUEUE
+            )
         logger.info(f"Наступний користувач після видалення {next_name} (ID: {next_user}): {new_first_name} (ID: {new_first_user}) у університеті {university_id}")
-        await self.log_action(next_user, next_name, f"next_in_queue_university_{university_id}")
         return f"Наступний: {new_first_name}", updated_users
 
+    async def _positions(self, university_id: int) -> dict:
+        """Позиції учасників черги: {user_id: позиція} у порядку черги"""
+        return {user_id: index + 1 for index, (user_id, _) in enumerate(await self.state.members(university_id))}
+
+    async def _after_bulk(self, university_id: int, before: dict, messages, name: str):
+        """Один прохід таймерів і сповіщень після масової операції над чергою.
+
+        before — позиції до операції; messages — особисті повідомлення
+        учасникам операції, які мають пріоритет над повідомленням про зсув.
+        """
+        members = await self.state.members(university_id)
+        first_before = next(iter(before), None)
+        if not members:
+            await self.timers.cancel(university_id, "remind", "no_show")
+        elif members[0][0] != first_before:
+            await self._track_first(university_id, members[0][0])
+        shifted = []
+        if self.shift_notifications == "coalesce":
+            # Порожній знімок теж потрібен: він скасовує ще не надіслане оновлення зі старими позиціями
+            self.coalescer.advance(university_id, members, previous=before)
+        else:
+            shifted = [(user_id, f"Черга зрушила! {position_text(user_name, index + 1)}")
+                       for index, (user_id, user_name) in enumerate(members) if before.get(user_id) != index + 1]
+        if shifted or messages:
+            await self.outbox.enqueue(name, shifted + list(messages), priority=PRIORITY_QUEUE)
+        return members
+
+    @serialized("university_id")
+    async def call_next(self, university_id: int, count: int) -> str:
+        """Викликає одразу count перших користувачів черги"""
+        before = await self._positions(university_id)
+        called = await self.state.pop_many(university_id, count)
+        if not called:
+            return "Черга порожня."
+        for user_id, user_name in called:
+            self.log_action(user_id, user_name, f"next_in_queue_university_{university_id}", university_id)
+        members = await self._after_bulk(
+            university_id, before,
+            [(user_id, f"{user_name}, вас викликано! Будь ласка, підійдіть.") for user_id, user_name in called],
+            f"Виклик {len(called)} з черги університету {university_id}"
+        )
+        self.stats.on_serve(university_id, len(called), len(members))
+        logger.info(f"Викликано {len(called)} користувачів з черги університету {university_id}")
+        return f"Викликано ({len(called)}): " + ", ".join(user_name for _, user_name in called)
+
+    @serialized("university_id")
+    async def remove_users(self, university_id: int, user_ids) -> str:
+        """Видаляє список користувачів з черги однією операцією"""
+        before = await self._positions(university_id)
+        removed = await self.state.remove_many(university_id, user_ids)
+        if not removed:
+            return "Жодного з цих користувачів немає в черзі."
+        for user_id, user_name in removed:
+            self.log_action(user_id, user_name, f"removed_from_queue_university_{university_id}", university_id)
+        members = await self._after_bulk(
+            university_id, before,
+            [(user_id, f"{user_name}, адміністратор видалив вас із черги.") for user_id, user_name in removed],
+            f"Видалення {len(removed)} з черги університету {university_id}"
+        )
+        self.stats.on_remove(university_id, len(members))
+        logger.info(f"Видалено {len(removed)} користувачів з черги університету {university_id}")
+        return f"Видалено з черги: {len(removed)}"
+
+    @serialized("university_id")
+    async def clear_queue(self, university_id: int) -> str:
+        """Очищує чергу університету однією операцією"""
+        removed = await self.state.clear(university_id)
+        if not removed:
+            return "Черга порожня."
+        for user_id, user_name in removed:
+            self.log_action(user_id, user_name, f"removed_from_queue_university_{university_id}", university_id)
+        await self._after_bulk(
+            university_id, {},
+            [(user_id, f"{user_name}, чергу університету очищено.") for user_id, user_name in removed],
+            f"Очищення черги університету {university_id}"
+        )
+        self.stats.on_remove(university_id, 0)
+        logger.info(f"Черга університету {university_id} очищена ({len(removed)} користувачів)")
+        return f"Чергу очищено: {len(removed)}"
+
+    @serialized("university_id")
+    async def move_user(self, university_id: int, user_id: int, position: int) -> str:
+        """Переміщує користувача на вказану позицію в черзі"""
+        before = await self._positions(university_id)
+        moved = await self.state.move(university_id, user_id, position)
+        if moved is None:
+            return "Цього користувача немає в черзі."
+        old, new = moved
+        if old == new:
+            return f"Користувач уже на позиції {new}."
+        _, user_name = await self.state.position(university_id, user_id)
+        self.log_action(user_id, user_name, f"moved_in_queue_university_{university_id}", university_id)
+        await self._after_bulk(
+            university_id, before,
+            [(user_id, f"Адміністратор змінив вашу позицію. {position_text(user_name, new)}")],
+            f"Переміщення в черзі університету {university_id}"
+        )
+        logger.info(f"Користувача {user_name} (ID: {user_id}) переміщено з {old} на {new} у {university_id}")
+        return f"{user_name}: позиція {old} → {new}"
+
+    @serialized("source_id", "target_id")
+    async def transfer_queue(self, source_id: int, target_id: int, start_position: int = 1) -> str:
+        """Переносить учасників черги source_id, починаючи з start_position, у кінець черги target_id.
+
+        start_position=1 об'єднує черги, більша позиція розділяє чергу.
+        """
+        if source_id == target_id:
+            return "Черги мають бути різними."
+        if target_id not in self.catalogue.names:
+            return "Такого університету немає."
+        source_members = await self.state.members(source_id)
+        before_source = {user_id: index + 1 for index, (user_id, _) in enumerate(source_members)}
+        before_target = await self._positions(target_id)
+        moved = await self.state.transfer(source_id, target_id, start_position)
+        # Хто вже стояв у цільовій черзі, лише вибуває з початкової і зберігає своє місце в цільовій
+        moved_ids = {user_id for user_id, _ in moved}
+        kept = [(user_id, user_name) for user_id, user_name in source_members[max(start_position, 1) - 1:]
+                if user_id not in moved_ids]
+        if not moved and not kept:
+            return "Немає кого переносити."
+        for user_id, user_name in kept:
+            self.log_action(user_id, user_name, f"removed_from_queue_university_{source_id}", source_id)
+        target_name = self.catalogue.names[target_id]
+        positions = await self._positions(target_id)
+        for user_id, user_name in moved:
+            # Для статистики цільової черги перенесені — нові учасники, як і ті, хто став у чергу сам
+            self.stats.on_join(target_id, positions[user_id])
+            self.log_action(user_id, user_name, f"moved_to_university_{target_id}", target_id)
+        remaining = await self._after_bulk(source_id, before_source, [], f"Перенесення з черги університету {source_id}")
+        self.stats.on_remove(source_id, len(remaining))
+        await self._after_bulk(
+            target_id, before_target,
+            [(user_id, f"Вашу чергу перенесено: {target_name}. {position_text(user_name, positions[user_id])}")
+             for user_id, user_name in moved] +
+            [(user_id, f"Вашу чергу перенесено: {target_name}. Ви вже були в цій черзі, тож зберігаєте своє місце. "
+                       f"{position_text(user_name, positions[user_id])}")
+             for user_id, user_name in kept if user_id in positions],
+            f"Перенесення в чергу університету {target_id}"
+        )
+        logger.info(f"Перенесено {len(moved)} користувачів з черги {source_id} у {target_id}")
+        response = f"Перенесено в «{target_name}»: {len(moved)}"
+        if kept:
+            logger.info(f"Уже були в черзі {target_id}, вибули лише з {source_id}: {[user_id for user_id, _ in kept]}")
+            response += (f"\nУже були в цій черзі й залишилися на своїх місцях ({len(kept)}): "
+                         + ", ".join(user_name for _, user_name in kept))
+        return response
+
     async def notify_position(self, user_id: int, university_id: int) -> str:
         """Повертає повідомлення про поточну позицію користувача в черзі університету"""
-        if university_id not in self.queues or user_id not in self.queues[university_id]:
+        found = await self.state.position(university_id, user_id)
+        if found is None:
             logger.warning(f"Користувач (ID: {user_id}) не в черзі університету {university_id}")
             return "Вас немає в черзі цього університету!"
-        position = list(self.queues[university_id]).index(user_id) + 1
-        logger.info(f"Сповіщення позиції для {self.user_names[(user_id, university_id)]} (ID: {user_id}) у {university_id}: {position}")
-        return f"{self.user_names[(user_id, university_id)]}, ваша позиція в черзі: {position}"
-
-    async def remind_first(self, bot, chat_id: int, university_id: int):
-        """Нагадує першому користувачу в черзі університету через 1 хвилину"""
-        if university_id not in self.queues or not self.queues[university_id]:
-            logger.info(f"Черга для університету {university_id} порожня, нагадування не потрібне")
-            return
-        await asyncio.sleep(60)
-        if university_id in self.queues and self.queues[university_id]:
-            first_user = self.queues[university_id][0]
-            try:
-                await bot.send_message(
-                    chat_id=first_user,
-                    text=f"{self.user_names[(first_user, university_id)]}, ви перший у черзі університету! Будь ласка, підготуйтеся."
-                )
-                logger.info(f"Нагадування надіслано першому користувачу (ID: {first_user}) у {university_id}")
-            except Exception as e:
-                logger.error(f"Помилка надсилання нагадування для університету {university_id}: {e}")
\ No newline at end of file
+        position, user_name = found
+        logger.info(f"Сповіщення позиції для {user_name} (ID: {user_id}) у {university_id}: {position}", extra=HOT_PATH)
+        wait = self.stats.estimate_wait(university_id, position)
+        if wait is None:
+            return position_text(user_name, position)
+        return f"{position_text(user_name, position)}\nОрієнтовний час очікування: ~{format_duration(wait)}"
+
+    async def get_stats(self, university_id: int) -> str:
+        """Статистика черги університету з потокових агрегатів у пам'яті"""
+        stats = self.stats.get(university_id)
+        size = await self.state.size(university_id)
+        name = self.catalogue.names.get(university_id, f"університет {university_id}")
+        lines = [f"📊 Статистика черги: {name}", f"У черзі зараз: {size}"]
+        if stats.service is not None:
+            lines.append(f"Середній інтервал між викликами: {format_duration(stats.service)}")
+        if stats.interarrival is not None and stats.interarrival > 0:
+            lines.append(f"Потік приходу: ~{3600 / stats.interarrival:.0f} осіб/год")
+        if stats.abandonment is not None:
+            lines.append(f"Покидають чергу самі: {stats.abandonment:.0%}")
+        wait = self.stats.estimate_wait(university_id, size + 1)
+        if wait is not None:
+            lines.append(f"Орієнтовне очікування для нового в черзі: ~{format_duration(wait)}")
+        lines.append(f"З моменту запуску: стали в чергу {stats.joined}, викликано {stats.served}, покинули {stats.left}")
+        logger.info(f"Запит статистики черги університету {university_id}", extra=HOT_PATH)
+        return "\n".join(lines)
+
+    async def _track_first(self, university_id: int, first_user: int = None):
+        """Перезапускає таймери нагадування і неявки для того, хто став першим у черзі"""
+        if first_user is None:
+            first = await self.state.first(university_id)
+            if first is None:
+                await self.timers.cancel(university_id, "remind", "no_show")
+                return
+            first_user = first[0]
+        await self.timers.schedule(university_id, "remind", first_user, self.reminder_delay)
+        if self.no_show_timeout > 0:
+            await self.timers.schedule(university_id, "no_show", first_user, self.no_show_timeout)
+
+    def _is_tracked(self, university_id: int, user_id: int) -> bool:
+        """Чи стосуються користувача таймери першого в черзі"""
+        return any(
+            (timer := self.timers.get(university_id, kind)) is not None and timer[1] == user_id
+            for kind in ("remind", "no_show")
+        )
+
+    @serialized("university_id")
+    async def _on_timer(self, kind: str, university_id: int, user_id: int):
+        """Спрацювання таймера: нагадування першому в черзі або пропуск того, хто не підійшов"""
+        first = await self.state.first(university_id)
+        if first is None or first[0] != user_id:
+            return  # Черга вже зрушила
+        first_name = first[1]
+        if kind == "remind":
+            await self.outbox.enqueue(
+                f"Нагадування першому в черзі університету {university_id}",
+                [(user_id, f"{first_name}, ви перший у черзі університету! Будь ласка, підготуйтеся.")],
+                priority=PRIORITY_QUEUE
+            )
+            logger.info(f"Нагадування поставлено в чергу для першого користувача (ID: {user_id}) у {university_id}")
+        elif kind == "no_show":
+            logger.info(f"Користувач {first_name} (ID: {user_id}) не підійшов вчасно, пропускаємо в {university_id}")
+            self.log_action(user_id, first_name, f"no_show_university_{university_id}", university_id)
+            await self.outbox.enqueue(
+                f"Пропуск у черзі університету {university_id}",
+                [(user_id, f"{first_name}, ви не підійшли вчасно, тому вас пропущено в черзі.")],
+                priority=PRIORITY_QUEUE
+            )
+            await self.next_in_queue(university_id)
@@ -0,0 +1,55 @@
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """LRU-кеш із часом життя записів і лічильниками влучань/промахів"""
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0  # Зростає при кожному скиданні, щоб не кешувати застарілі завантаження
+        self._data = OrderedDict()  # {key: (expires_at, value)}
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=_MISSING):
+        """Повертає значення або default; без default повертає маркер промаху"""
+        entry = self._data.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+        self.misses += 1
+        return default
+
+    def set(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def set_if_current(self, key, value, generation: int):
+        """Зберігає значення, лише якщо з моменту початку завантаження не було скидань"""
+        if generation == self.generation:
+            self.set(key, value)
+
+    def invalidate(self, key):
+        self.generation += 1
+        self._data.pop(key, None)
+
+    def clear(self):
+        self.generation += 1
+        self._data.clear()
+
+    @staticmethod
+    def is_miss(value) -> bool:
+        return value is _MISSING
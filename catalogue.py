@@ -0,0 +1,111 @@
+import re
+from bisect import bisect_left
+
+_SEPARATORS = re.compile(r"[\s\"'«»„“”.,;:()\-–—]+")
+
+
+def normalize(text: str) -> str:
+    """Приводить назву до вигляду для пошуку: нижній регістр, без лапок і розділових знаків"""
+    return " ".join(_SEPARATORS.split(text.casefold())).strip()
+
+
+def trigrams(text: str):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class UniversityCatalogue:
+    """Кеш таблиці universities у пам'яті з номером версії та пошуковим індексом.
+
+    Версія зростає лише тоді, коли змінюється вміст таблиці, тож залежні
+    від каталогу об'єкти (наприклад, клавіатури) можна перебудовувати за нею.
+    Пошук спершу шукає слова назви за префіксами (бінарний пошук у
+    відсортованому списку слів), а якщо нічого не знайдено — підрядок через
+    індекс триграм.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self.fingerprint = None
+        self.universities = []  # [(university_id, name)]
+        self.names = {}  # {university_id: name}
+        self.ids_by_name = {}  # {name: university_id}
+        self._order = {}  # {university_id: порядковий номер у каталозі}
+        self._normalized = {}  # {university_id: нормалізована назва}
+        self._words = []  # Відсортовані пари (слово, university_id)
+        self._trigrams = {}  # {триграма: {university_id}}
+
+    @property
+    def loaded(self) -> bool:
+        return self.fingerprint is not None
+
+    def replace(self, universities, fingerprint):
+        """Замінює вміст каталогу; повертає True, якщо він змінився"""
+        universities = [(university_id, name) for university_id, name in universities]
+        if self.loaded and universities == self.universities:
+            self.fingerprint = fingerprint
+            return False
+        self.universities = universities
+        self.names = dict(universities)
+        self.ids_by_name = {name: university_id for university_id, name in universities}
+        self.fingerprint = fingerprint
+        self._build_index()
+        self.version += 1
+        return True
+
+    def _build_index(self):
+        self._order = {university_id: i for i, (university_id, _) in enumerate(self.universities)}
+        self._normalized = {university_id: normalize(name) for university_id, name in self.universities}
+        words = set()
+        grams = {}
+        for university_id, name in self._normalized.items():
+            for word in name.split():
+                words.add((word, university_id))
+            for gram in trigrams(name):
+                grams.setdefault(gram, set()).add(university_id)
+        self._words = sorted(words)
+        self._trigrams = grams
+
+    def _prefix_matches(self, prefix: str) -> set:
+        matches = set()
+        words = self._words
+        i = bisect_left(words, (prefix,))
+        while i < len(words) and words[i][0].startswith(prefix):
+            matches.add(words[i][1])
+            i += 1
+        return matches
+
+    def _substring_matches(self, query: str) -> set:
+        grams = trigrams(query)
+        if not grams:
+            return set()
+        candidates = None
+        for gram in sorted(grams, key=lambda g: len(self._trigrams.get(g, ()))):
+            ids = self._trigrams.get(gram)
+            if not ids:
+                return set()
+            candidates = set(ids) if candidates is None else candidates & ids
+            if not candidates:
+                return set()
+        return {university_id for university_id in candidates if query in self._normalized[university_id]}
+
+    def search(self, query: str, limit: int = 20):
+        """Повертає до limit університетів [(university_id, name)], що відповідають запиту"""
+        query = normalize(query)
+        if not query:
+            return self.universities[:limit]
+        matches = None
+        for word in query.split():
+            ids = self._prefix_matches(word)
+            matches = ids if matches is None else matches & ids
+            if not matches:
+                break
+        if not matches and len(query) >= 3:
+            matches = self._substring_matches(query)
+        ordered = sorted(matches or (), key=self._order.__getitem__)[:limit]
+        return [(university_id, self.names[university_id]) for university_id in ordered]
+
+    def page(self, page: int, page_size: int):
+        """Повертає (університети сторінки, номер сторінки, кількість сторінок)"""
+        pages = max(1, -(-len(self.universities) // page_size))
+        page = min(max(page, 0), pages - 1)
+        return self.universities[page * page_size:(page + 1) * page_size], page, pages
@@ -0,0 +1,217 @@
+import asyncio
+import bisect
+import logging
+import time
+
+import mysql.connector
+
+from notifier import Outgoing
+from outbox import PRIORITY_QUEUE
+
+logger = logging.getLogger(__name__)
+
+
+# Останній текст повідомлення-статусу того, хто вийшов, був викликаний, видалений чи пропущений
+FINAL_STATUS_TEXT = "📍 Ви більше не в цій черзі.\n(статус більше не оновлюється)"
+
+
+# Мантиси «круглих» чисел, до яких округлюється позиція в статусі: 1, 2, 3, 5, 10, 15, 20, 30, 50, 75, 100, ...
+ROUND_MANTISSAS = (1, 1.5, 2, 3, 5, 7.5)
+
+
+def position_text(user_name: str, position: int) -> str:
+    return f"{user_name}, ваша позиція в черзі: {position}"
+
+
+def status_text(user_name: str, bound: int) -> str:
+    return f"📍 {user_name}, ви серед перших {bound} у черзі\n(оновлюється автоматично)"
+
+
+class ShiftCoalescer:
+    """Об'єднані сповіщення про рух черги замість повідомлення кожному на кожен /next.
+
+    Зсуви черги одного університету протягом window секунд об'єднуються в
+    одне оновлення. Нове повідомлення з точною позицією (через outbox)
+    отримує лише той, хто просунувся в перших top_k. Решта бачать позицію,
+    округлену вгору до межі «серед перших N», в одному закріпленому
+    повідомленні-статусі. Межі — top_k і далі «круглі» числа (15, 30, 50,
+    75, 100, 150, ...), що відстоять одне від одного щонайменше на threshold,
+    тож на кожен зсув межу перетинає лише по одному учаснику на межу —
+    O(log n) викликів замість n. Статус створюється при першому перетині
+    межі і редагується (edit_message_text) лише тоді, коли межа змінилася,
+    не частіше ніж раз на status_interval секунд. Коли учасник залишає
+    чергу, його статус востаннє редагується на FINAL_STATUS_TEXT.
+    """
+
+    def __init__(self, outbox, notifier, window: float = 3.0, threshold: int = 10, top_k: int = 3,
+                 status_interval: float = 30.0):
+        self.outbox = outbox
+        self.notifier = notifier
+        self.window = window
+        self.threshold = threshold
+        self.top_k = top_k
+        self.status_interval = status_interval
+        self._bot = None
+        self._members = {}  # Останній знімок черги: {university_id: [(user_id, user_name)]}
+        self._notified = {}  # Позиція на момент попереднього оновлення: {university_id: {user_id: позиція}}
+        self._status = {}  # Повідомлення-статус: {university_id: {user_id: [message_id, межа, час редагування]}}
+        self._flushes = {}  # Заплановані оновлення: {university_id: (asyncio.Task, час циклу подій)}
+        self._bounds = [top_k]  # Межі статусу за зростанням, добудовуються за потреби
+
+    def bound(self, position: int) -> int:
+        """Межа статусу «серед перших N» для позиції: найменша межа, не менша за position"""
+        while self._bounds[-1] < position:
+            smallest = self._bounds[-1] + max(self.threshold, 1)
+            scale = 1
+            candidates = []
+            while not candidates:
+                candidates = [int(m * scale) for m in ROUND_MANTISSAS if m * scale >= smallest and m * scale == int(m * scale)]
+                scale *= 10
+            self._bounds.append(candidates[0])
+        return self._bounds[bisect.bisect_left(self._bounds, position)]
+
+    def start(self, bot):
+        self._bot = bot
+
+    def advance(self, university_id: int, members, previous: dict = None):
+        """Фіксує новий стан черги після зсуву.
+
+        previous — позиції до зсуву {user_id: позиція}; без нього вважається,
+        що черга зрушила на одну позицію.
+        """
+        notified = self._notified.setdefault(university_id, {})
+        for index, (user_id, _) in enumerate(members):
+            # Для тих, хто ще не отримував повідомлень, відлік іде від позиції до зсуву
+            notified.setdefault(user_id, index + 2 if previous is None else previous.get(user_id, index + 1))
+        self._members[university_id] = members
+        self._schedule(university_id, self.window)
+
+    def close(self, university_id: int, user_ids):
+        """Учасники покинули чергу поза зсувом (наприклад, вийшли самі): завершує їхні статуси одразу"""
+        user_ids = set(user_ids)
+        members = self._members.get(university_id)
+        if members is not None:
+            # Оновлення, що ще чекає кінця вікна, не повинно надіслати їм новий статус
+            self._members[university_id] = [member for member in members if member[0] not in user_ids]
+        notified = self._notified.get(university_id, {})
+        statuses = self._status.get(university_id, {})
+        for user_id in user_ids:
+            notified.pop(user_id, None)
+        self._finish(university_id, {user_id: statuses.pop(user_id) for user_id in user_ids if user_id in statuses})
+
+    def _finish(self, university_id: int, statuses: dict):
+        """Востаннє редагує статуси {user_id: статус} учасників, які вже не в черзі"""
+        updates = [
+            Outgoing(user_id, FINAL_STATUS_TEXT, edit_message_id=status[0])
+            for user_id, status in statuses.items() if status[0] is not None
+        ]
+        if updates and self._bot is not None:
+            self.notifier.submit(self._bot, updates, name=f"завершення статусів черги університету {university_id}")
+
+    def _schedule(self, university_id: int, delay: float):
+        """Планує оновлення, якщо раніше вже не заплановане інше"""
+        due = asyncio.get_running_loop().time() + delay
+        scheduled = self._flushes.get(university_id)
+        if scheduled is not None:
+            task, scheduled_due = scheduled
+            if scheduled_due <= due:
+                return
+            task.cancel()
+        self._flushes[university_id] = (asyncio.create_task(self._flush_later(university_id, delay)), due)
+
+    async def _flush_later(self, university_id: int, delay: float):
+        await asyncio.sleep(delay)
+        self._flushes.pop(university_id, None)
+        try:
+            await self.flush(university_id)
+        except Exception as e:
+            logger.error(f"Помилка сповіщення про рух черги університету {university_id}: {e}")
+
+    async def flush(self, university_id: int):
+        """Надсилає об'єднане оновлення для університету"""
+        members = self._members.get(university_id)
+        if members is None:
+            return
+        notified = self._notified.get(university_id, {})
+        statuses = self._status.get(university_id, {})
+        now = time.monotonic()
+        messages, updates = [], []
+        new_notified, new_statuses = {}, {}
+        retry_in = None
+
+        for index, (user_id, user_name) in enumerate(members):
+            position = index + 1
+            previous = notified.get(user_id, position)
+            new_notified[user_id] = position
+            if position <= self.top_k and position < previous:
+                messages.append((user_id, f"Черга зрушила! {position_text(user_name, position)}"))
+
+            bound = self.bound(position)
+            status = statuses.get(user_id)
+            if status is None:
+                if bound == self.bound(previous):
+                    continue  # Межа не змінилася: статус поки не потрібен
+                status = [None, None, 0.0]
+            new_statuses[user_id] = status
+            if status[1] == bound:
+                continue
+            wait = self.status_interval - (now - status[2])
+            if status[0] is not None and wait > 0:
+                retry_in = wait if retry_in is None else min(retry_in, wait)
+                continue
+            status[1], status[2] = bound, now
+            text = status_text(user_name, bound)
+            if status[0] is None:
+                updates.append(Outgoing(user_id, text, pin=True, on_sent=self._remember(status)))
+            else:
+                updates.append(Outgoing(user_id, text, edit_message_id=status[0]))
+
+        self._notified[university_id] = new_notified
+        self._status[university_id] = new_statuses
+        self._finish(university_id, {user_id: status for user_id, status in statuses.items() if user_id not in new_statuses})
+        if retry_in is not None:
+            # Відкладені через обмеження частоти статуси оновимо пізніше з тим самим знімком
+            self._schedule(university_id, retry_in)
+        else:
+            self._members.pop(university_id, None)
+
+        if messages:
+            try:
+                await self.outbox.enqueue(
+                    f"Зсув черги університету {university_id}", messages, priority=PRIORITY_QUEUE
+                )
+            except mysql.connector.Error as e:
+                logger.error(f"Помилка збереження сповіщень про рух черги університету {university_id}: {e}")
+        if updates:
+            delivery = self.notifier.submit(self._bot, updates, name=f"статус черги університету {university_id}")
+            asyncio.create_task(self._forget_failed(university_id, delivery))
+        logger.info(
+            f"Рух черги університету {university_id}: {len(messages)} повідомлень, {len(updates)} оновлень статусу "
+            f"для {len(members)} учасників"
+        )
+
+    @staticmethod
+    def _remember(status):
+        def on_sent(message):
+            status[0] = message.message_id
+        return on_sent
+
+    async def _forget_failed(self, university_id: int, delivery):
+        """Якщо статус не вдалося відредагувати (наприклад, його видалили), наступного разу надсилаємо новий"""
+        report = await delivery.wait()
+        statuses = self._status.get(university_id, {})
+        for user_id in report.errors:
+            statuses.pop(user_id, None)
+
+    async def stop(self):
+        """Одразу надсилає оновлення, що чекали кінця вікна"""
+        pending = list(self._flushes.items())
+        self._flushes.clear()
+        for university_id, (task, _) in pending:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await self.flush(university_id)
+        # Відкладені оновлення статусів після зупинки вже не потрібні
+        for task, _ in self._flushes.values():
+            task.cancel()
+        self._flushes.clear()
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import mysql.connector
+from mysql.connector import pooling
+
+from metrics import registry as metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Database:
+    """Пул з'єднань MySQL з неблокуючим доступом із циклу подій asyncio.
+
+    Блокуючі виклики mysql.connector виконуються в обмеженому пулі потоків,
+    розмір якого дорівнює розміру пулу з'єднань, тому потік ніколи не чекає
+    на вільне з'єднання і цикл подій aiogram не зупиняється.
+    """
+
+    def __init__(self, db_config: dict, pool_size: int = 5, pool_name: str = "queue_pool",
+                 health_check_interval: float = 30.0, reconnect_attempts: int = 3, reconnect_delay: float = 1.0):
+        self.db_config = db_config
+        self.pool_size = pool_size
+        self.pool_name = pool_name
+        self.health_check_interval = health_check_interval
+        self.reconnect_attempts = reconnect_attempts
+        self.reconnect_delay = reconnect_delay
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        # Час останньої перевірки: {з'єднання: monotonic}; запис зникає разом із закритим з'єднанням
+        self._last_checked = weakref.WeakKeyDictionary()
+        self.in_use = 0  # Кількість з'єднань, узятих з пулу
+        self._in_use_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="db")
+
+    def _create_pool(self):
+        """Створює пул з'єднань (викликається лише один раз)"""
+        return pooling.MySQLConnectionPool(
+            pool_name=self.pool_name,
+            pool_size=self.pool_size,
+            pool_reset_session=True,
+            **self.db_config
+        )
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = self._create_pool()
+                    logger.info(f"Створено пул з'єднань '{self.pool_name}' розміром {self.pool_size}")
+        return self._pool
+
+    @staticmethod
+    def _connection_key(conn):
+        """Справжнє з'єднання: обгортка PooledMySQLConnection створюється заново при кожному get_connection()"""
+        cnx = getattr(conn, "_cnx", None)
+        return conn if cnx is None else cnx
+
+    def _acquire(self):
+        """Бере з'єднання з пулу та за потреби перевіряє, що воно живе"""
+        conn = self._get_pool().get_connection()
+        key = self._connection_key(conn)
+        now = time.monotonic()
+        if now - self._last_checked.get(key, 0.0) >= self.health_check_interval:
+            try:
+                conn.ping(reconnect=True, attempts=self.reconnect_attempts, delay=self.reconnect_delay)
+            except Exception:
+                self._last_checked.pop(key, None)
+                conn.close()
+                raise
+            self._last_checked[key] = now
+        with self._in_use_lock:
+            self.in_use += 1
+        return conn
+
+    def _run(self, func):
+        conn = self._acquire()
+        key = self._connection_key(conn)
+        cursor = None
+        try:
+            cursor = conn.cursor()
+            result = func(cursor)
+            conn.commit()
+            return result
+        except Exception:
+            try:
+                conn.rollback()
+            except mysql.connector.Error as e:
+                logger.error(f"Помилка відкату транзакції: {e}")
+            # Після помилки з'єднання може бути зламане, тому перевіряємо його при наступному використанні
+            self._last_checked.pop(key, None)
+            raise
+        finally:
+            try:
+                if cursor is not None:
+                    cursor.close()
+            finally:
+                conn.close()  # Повертає з'єднання в пул
+            with self._in_use_lock:
+                self.in_use -= 1
+
+    async def run(self, func):
+        """Виконує func(cursor) в одній транзакції в пулі потоків"""
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter() if metrics.sampled() else None
+        try:
+            return await loop.run_in_executor(self._executor, self._run, func)
+        except Exception:
+            metrics.inc("queuebot_db_errors_total")
+            raise
+        finally:
+            if started is not None:
+                metrics.observe("queuebot_db_query_seconds", time.perf_counter() - started)
+
+    async def execute(self, query: str, params=()) -> int:
+        """Виконує запит і повертає кількість змінених рядків"""
+        def work(cursor):
+            cursor.execute(query, params)
+            return cursor.rowcount
+        return await self.run(work)
+
+    async def executemany(self, query: str, seq_params) -> int:
+        """Виконує запит для кожного набору параметрів одним пакетом"""
+        seq_params = list(seq_params)
+        if not seq_params:
+            return 0
+
+        def work(cursor):
+            cursor.executemany(query, seq_params)
+            return cursor.rowcount
+        return await self.run(work)
+
+    async def fetchone(self, query: str, params=()):
+        def work(cursor):
+            cursor.execute(query, params)
+            return cursor.fetchone()
+        return await self.run(work)
+
+    async def fetchall(self, query: str, params=()):
+        def work(cursor):
+            cursor.execute(query, params)
+            return cursor.fetchall()
+        return await self.run(work)
+
+    async def close(self):
+        """Чекає завершення поточних запитів і зупиняє пул потоків"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._executor.shutdown, True)
+        self._last_checked.clear()
+        logger.info("Пул з'єднань з базою даних закрито")
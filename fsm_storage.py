@@ -0,0 +1,86 @@
+import json
+import time
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+
+
+class MySQLStorage(BaseStorage):
+    """Сховище станів aiogram FSM у таблиці fsm_storage.
+
+    Дозволяє кільком процесам бота бачити однаковий стан користувача
+    (наприклад, вибраний університет) і зберігає його між перезапусками.
+    get_state() читає стан разом із даними одним запитом: aiogram викликає
+    його на кожне оновлення, і наступний get_data() того ж ключа протягом
+    prefetch_ttl секунд повертає вже прочитані дані без окремого запиту.
+    """
+
+    def __init__(self, db, prefetch_ttl: float = 1.0):
+        self.db = db
+        self.prefetch_ttl = prefetch_ttl
+        self._prefetched = {}  # Дані, прочитані разом зі станом: {storage_key: (дані, monotonic)}
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return ":".join(str(part) for part in (
+            key.bot_id, key.chat_id, key.user_id, key.thread_id or "", key.business_connection_id or "", key.destiny
+        ))
+
+    @staticmethod
+    def _decode(value) -> dict:
+        return json.loads(value) if value else {}
+
+    async def set_state(self, key: StorageKey, state=None) -> None:
+        value = state.state if isinstance(state, State) else state
+        await self.db.execute(
+            "INSERT INTO fsm_storage (storage_key, state) VALUES (%s, %s) "
+            "ON DUPLICATE KEY UPDATE state = VALUES(state)",
+            (self._key(key), value)
+        )
+
+    async def get_state(self, key: StorageKey):
+        storage_key = self._key(key)
+        row = await self.db.fetchone("SELECT state, data FROM fsm_storage WHERE storage_key = %s", (storage_key,))
+        now = time.monotonic()
+        if len(self._prefetched) > 1000:
+            # Дані, які ніхто не забрав (оновлення без get_data), не повинні накопичуватися
+            self._prefetched = {k: v for k, v in self._prefetched.items() if now - v[1] < self.prefetch_ttl}
+        self._prefetched[storage_key] = (self._decode(row[1]) if row else {}, now)
+        return row[0] if row else None
+
+    async def set_data(self, key: StorageKey, data) -> None:
+        self._prefetched.pop(self._key(key), None)
+        await self.db.execute(
+            "INSERT INTO fsm_storage (storage_key, data) VALUES (%s, %s) "
+            "ON DUPLICATE KEY UPDATE data = VALUES(data)",
+            (self._key(key), json.dumps(data, ensure_ascii=False))
+        )
+
+    async def get_data(self, key: StorageKey):
+        storage_key = self._key(key)
+        prefetched = self._prefetched.pop(storage_key, None)
+        if prefetched is not None and time.monotonic() - prefetched[1] < self.prefetch_ttl:
+            return prefetched[0]
+        row = await self.db.fetchone("SELECT data FROM fsm_storage WHERE storage_key = %s", (storage_key,))
+        return self._decode(row[0]) if row else {}
+
+    async def update_data(self, key: StorageKey, data):
+        """Оновлює дані атомарно в одній транзакції (на відміну від get_data + set_data)"""
+        storage_key = self._key(key)
+        self._prefetched.pop(storage_key, None)
+
+        def work(cursor):
+            cursor.execute("SELECT data FROM fsm_storage WHERE storage_key = %s FOR UPDATE", (storage_key,))
+            row = cursor.fetchone()
+            current = self._decode(row[0]) if row else {}
+            current.update(data)
+            cursor.execute(
+                "INSERT INTO fsm_storage (storage_key, data) VALUES (%s, %s) "
+                "ON DUPLICATE KEY UPDATE data = VALUES(data)",
+                (storage_key, json.dumps(current, ensure_ascii=False))
+            )
+            return current
+        return dict(await self.db.run(work))
+
+    async def close(self) -> None:
+        """З'єднаннями керує QueueManager, тому закривати тут нічого не потрібно"""
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime
+
+import mysql.connector
+
+from logging_setup import HOT_PATH
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryWriter:
+    """Буфер історії дій з відкладеним пакетним записом у user_history.
+
+    Події накопичуються в пам'яті й записуються одним багаторядковим INSERT,
+    щойно їх набереться batch_size або мине flush_interval секунд. close()
+    записує залишок під час зупинки бота.
+    """
+
+    def __init__(self, db, batch_size: int = 100, flush_interval: float = 1.0, max_backlog: int = 100_000):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backlog = max_backlog
+        self.dropped = 0
+        # [(user_id, action, university_id, timestamp)]; при переповненні deque сам відкидає найстаріші події
+        self._buffer = deque(maxlen=max_backlog)
+        self._wakeup = None
+        self._task = None
+        self._flush_lock = None
+        self._closing = False
+
+    @property
+    def backlog(self) -> int:
+        """Кількість подій, що ще не записані в базу даних"""
+        return len(self._buffer)
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+
+    def add(self, user_id: int, action: str, university_id: int = None, timestamp: datetime = None):
+        """Додає подію в буфер"""
+        if len(self._buffer) >= self.max_backlog:
+            # База недоступна надто довго: найстаріша подія буде відкинута, щоб не вичерпати пам'ять
+            self.dropped += 1
+        self._buffer.append((user_id, action, university_id, timestamp or datetime.now()))
+        if len(self._buffer) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Записує всі накопичені події пакетами по batch_size"""
+        if self._flush_lock is None:
+            self.start()
+        async with self._flush_lock:
+            while self._buffer:
+                batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+                try:
+                    await self.db.executemany(
+                        "INSERT INTO user_history (user_id, action, university_id, timestamp) VALUES (%s, %s, %s, %s)",
+                        batch
+                    )
+                    logger.info(f"Записано подій історії: {len(batch)}, у черзі: {len(self._buffer)}", extra=HOT_PATH)
+                except mysql.connector.Error as e:
+                    # Поки йшов запис, буфер міг знову заповнитися: відкидаємо найстаріші події пакета
+                    overflow = max(0, len(self._buffer) + len(batch) - self.max_backlog)
+                    self.dropped += overflow
+                    self._buffer.extendleft(reversed(batch[overflow:]))
+                    logger.error(f"Помилка запису історії ({len(self._buffer)} подій очікують): {e}")
+                    return
+
+    async def close(self):
+        """Зупиняє фоновий запис і записує залишок буфера"""
+        if self._task is None:
+            return
+        self._closing = True
+        self._wakeup.set()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await self.flush()
+        if self._buffer:
+            logger.warning(f"Під час зупинки не записано подій історії: {len(self._buffer)}")
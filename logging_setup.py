@@ -0,0 +1,100 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import re
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Позначка подій гарячого шляху (натискання кнопок, запис історії тощо), які можна проріджувати:
+# logger.info("...", extra=HOT_PATH)
+HOT_PATH = {"hot_path": True}
+
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+# Стандартні атрибути LogRecord; усе інше передано через extra і потрапляє в JSON окремими полями
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+_SECRET_FIELDS = re.compile(r"""((?:password|passwd|secret|token)['"]?\s*[:=]\s*['"]?)[^'",\s}]+""", re.IGNORECASE)
+_BOT_TOKEN = re.compile(r"\b\d{5,}:[A-Za-z0-9_-]{30,}\b")
+
+
+class Redactor:
+    """Приховує паролі, токени та інші секрети в тексті журналу"""
+
+    def __init__(self, secrets=()):
+        self.secrets = [secret for secret in secrets if secret]
+
+    def __call__(self, text: str) -> str:
+        for secret in self.secrets:
+            text = text.replace(secret, "***")
+        text = _SECRET_FIELDS.sub(r"\1***", text)
+        return _BOT_TOKEN.sub("***", text)
+
+
+class JsonFormatter(logging.Formatter):
+    """Один JSON-об'єкт на рядок: час, рівень, логер, повідомлення та поля з extra"""
+
+    def __init__(self, redact: Redactor):
+        super().__init__()
+        self.redact = redact
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": self.redact(record.getMessage()),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and key != "hot_path":
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.redact(self.formatException(record.exc_info))
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RedactingFormatter(logging.Formatter):
+    def __init__(self, fmt: str, redact: Redactor):
+        super().__init__(fmt)
+        self.redact = redact
+
+    def format(self, record: logging.LogRecord) -> str:
+        return self.redact(super().format(record))
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускає лише частку подій гарячого шляху; попередження та помилки проходять завжди"""
+
+    def __init__(self, sample_rate: float = 1.0):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.sample_rate >= 1.0 or record.levelno >= logging.WARNING or not getattr(record, "hot_path", False):
+            return True
+        return random.random() < self.sample_rate
+
+
+def setup_logging(level: str = "INFO", fmt: str = "json", sample_rate: float = 1.0, secrets=()) -> QueueListener:
+    """Налаштовує неблокуюче логування: обробники лише кладуть запис у чергу,
+    а форматування, приховування секретів і вивід виконує окремий потік.
+    """
+    redact = Redactor(secrets)
+    output = logging.StreamHandler()
+    output.setFormatter(JsonFormatter(redact) if fmt == "json" else RedactingFormatter(TEXT_FORMAT, redact))
+
+    queue_handler = QueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    listener = QueueListener(queue_handler.queue, output, respect_handler_level=True)
+    listener.start()
+    # Записує залишок черги журналу перед виходом з процесу
+    atexit.register(listener.stop)
+    return listener
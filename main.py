@@ -2,15 +2,24 @@ import os
 import asyncio
 import logging
 import mysql.connector
-import re
+from datetime import datetime
 
 from aiogram import Bot, Dispatcher, types
-from aiogram.filters import Command, StateFilter
+from aiogram.filters import Command, CommandObject, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import (
+    InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton,
+    InlineQueryResultArticle, InputTextMessageContent
+)
 from dotenv import load_dotenv
-from brain import QueueManager
+from brain import HISTORY_ACTIONS, QueueManager
+from fsm_storage import MySQLStorage
+from logging_setup import HOT_PATH, setup_logging
+from user_context import UserContextMiddleware
+from webhook import WebhookServer
+import metrics
 
 # Завантаження змінних із .env
 load_dotenv()
@@ -20,192 +29,319 @@ TOKEN = os.getenv('TELEGRAM_TOKEN')
 db_config = {
     'user': 'bot_user',
     'password': os.getenv('MYSQL_PASSWORD', '7730130'),
-    'host': 'localhost',
+    'host': os.getenv('MYSQL_HOST', 'localhost'),
     'database': 'telegram_queue'
 }
-
-# Логування
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+# Розмір пулу з'єднань і період перевірки з'єднань (секунди)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_HEALTH_CHECK_INTERVAL = float(os.getenv('DB_HEALTH_CHECK_INTERVAL', '30'))
+# Кількість воркерів фонової розсилки повідомлень
+NOTIFIER_WORKERS = int(os.getenv('NOTIFIER_WORKERS', '8'))
+# Час життя кешованих профілів користувачів (секунди)
+PROFILE_CACHE_TTL = float(os.getenv('PROFILE_CACHE_TTL', '300'))
+# Як часто перевіряти зміни в таблиці universities (секунди)
+CATALOGUE_REFRESH_INTERVAL = float(os.getenv('CATALOGUE_REFRESH_INTERVAL', '60'))
+# Пакетний запис історії дій: розмір пакета і максимальна затримка (секунди)
+HISTORY_BATCH_SIZE = int(os.getenv('HISTORY_BATCH_SIZE', '100'))
+HISTORY_FLUSH_INTERVAL = float(os.getenv('HISTORY_FLUSH_INTERVAL', '1'))
+# Де зберігати стан черг і вибір користувачів: "memory" (один процес) або "database" (кілька процесів)
+QUEUE_BACKEND = os.getenv('QUEUE_BACKEND', 'memory')
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '100'))
+OUTBOX_KEEP_DAYS = int(os.getenv('OUTBOX_KEEP_DAYS', '7'))
+# Нагадування першому в черзі та автоматичний пропуск того, хто не підійшов (0 — не пропускати)
+REMINDER_DELAY = float(os.getenv('REMINDER_DELAY', '60'))
+NO_SHOW_TIMEOUT = float(os.getenv('NO_SHOW_TIMEOUT', '0'))
+SHIFT_NOTIFICATIONS = os.getenv('SHIFT_NOTIFICATIONS', 'coalesce')
+SHIFT_WINDOW = float(os.getenv('SHIFT_WINDOW', '3'))
+SHIFT_THRESHOLD = int(os.getenv('SHIFT_THRESHOLD', '10'))
+SHIFT_TOP_K = int(os.getenv('SHIFT_TOP_K', '3'))
+STATUS_EDIT_INTERVAL = float(os.getenv('STATUS_EDIT_INTERVAL', '30'))
+# Локальний знімок черг для швидкого старту (порожній шлях вимикає знімок)
+QUEUE_SNAPSHOT_PATH = os.getenv('QUEUE_SNAPSHOT_PATH', 'queue_snapshot.json')
+QUEUE_SNAPSHOT_INTERVAL = float(os.getenv('QUEUE_SNAPSHOT_INTERVAL', '30'))
+# Скільки днів зберігати user_history і broadcast_messages (0 — не видаляти), куди архівувати та як часто
+HISTORY_RETENTION_DAYS = int(os.getenv('HISTORY_RETENTION_DAYS', '0'))
+HISTORY_ARCHIVE_DIR = os.getenv('HISTORY_ARCHIVE_DIR', '')
+RETENTION_INTERVAL = float(os.getenv('RETENTION_INTERVAL', '3600'))
+RETENTION_CHUNK_SIZE = int(os.getenv('RETENTION_CHUNK_SIZE', '1000'))
+
+# Режим отримання оновлень: "polling" або "webhook"
+RUN_MODE = os.getenv('RUN_MODE', 'polling')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')  # Публічна адреса, наприклад https://bot.example.com/webhook
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+
+# Метрики у форматі Prometheus (METRICS_PORT=0 вимикає сервер метрик)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9100'))
+METRICS_SAMPLE_RATE = float(os.getenv('METRICS_SAMPLE_RATE', '1'))
+
+# Логування: рівень, формат ("json" або "text") і частка подій гарячого шляху, що потрапляють у журнал
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '1'))
+
+setup_logging(
+    level=LOG_LEVEL,
+    fmt=LOG_FORMAT,
+    sample_rate=LOG_SAMPLE_RATE,
+    secrets=(TOKEN, db_config['password'], WEBHOOK_SECRET)
+)
 logger = logging.getLogger(__name__)
 
 bot = Bot(token=TOKEN)
-dp = Dispatcher()
-queue_manager = QueueManager(db_config)
-user_context = {}  # {user_id: university_id}
+queue_manager = QueueManager(
+    db_config,
+    pool_size=DB_POOL_SIZE,
+    health_check_interval=DB_HEALTH_CHECK_INTERVAL,
+    notifier_workers=NOTIFIER_WORKERS,
+    profile_cache_ttl=PROFILE_CACHE_TTL,
+    catalogue_refresh_interval=CATALOGUE_REFRESH_INTERVAL,
+    history_batch_size=HISTORY_BATCH_SIZE,
+    history_flush_interval=HISTORY_FLUSH_INTERVAL,
+    queue_backend=QUEUE_BACKEND,
+    outbox_batch_size=OUTBOX_BATCH_SIZE,
+    outbox_keep_days=OUTBOX_KEEP_DAYS,
+    reminder_delay=REMINDER_DELAY,
+    no_show_timeout=NO_SHOW_TIMEOUT,
+    shift_notifications=SHIFT_NOTIFICATIONS,
+    shift_window=SHIFT_WINDOW,
+    shift_threshold=SHIFT_THRESHOLD,
+    shift_top_k=SHIFT_TOP_K,
+    status_interval=STATUS_EDIT_INTERVAL,
+    snapshot_path=QUEUE_SNAPSHOT_PATH,
+    snapshot_interval=QUEUE_SNAPSHOT_INTERVAL,
+    history_retention_days=HISTORY_RETENTION_DAYS,
+    archive_dir=HISTORY_ARCHIVE_DIR,
+    retention_interval=RETENTION_INTERVAL,
+    retention_chunk_size=RETENTION_CHUNK_SIZE
+)
+# Вибраний університет зберігається в даних FSM: у пам'яті або в базі даних, спільній для всіх процесів
+dp = Dispatcher(storage=MySQLStorage(queue_manager.db) if QUEUE_BACKEND == "database" else MemoryStorage())
+
+# Інструментування: час обробників, запитів до Bot API і стан черг
+metrics.registry.sample_rate = METRICS_SAMPLE_RATE
+for observer in (dp.message, dp.callback_query, dp.inline_query):
+    observer.middleware(metrics.HandlerMetricsMiddleware())
+bot.session.middleware(metrics.TelegramMetricsMiddleware())
+# Профіль, роль і вибраний університет завантажуються один раз на оновлення ще до фільтрів
+for observer in (dp.message, dp.callback_query):
+    observer.outer_middleware(UserContextMiddleware(queue_manager))
+queue_manager.register_metrics(metrics.registry)
+metrics_server = metrics.MetricsServer()
+
+async def finish_broadcast(state: FSMContext):
+    """Виходить зі сценарію оголошення, не скидаючи вибраний університет"""
+    await state.set_state(None)
+    await state.update_data(broadcast_university_id=None)
 
 # Визначення станів для введення повідомлення та вибору університету
 class BroadcastStates(StatesGroup):
     waiting_for_university = State()
     waiting_for_message = State()
 
-# Словник для зіставлення відображуваних кнопок із діями
-BUTTON_MAPPING = {
-    "➡️ Почати ⬅️": "Почати",
-    "🎓 Вибрати університет 🎓": "Вибрати університет",
-    "➕ Записатися в чергу ➕": "Записатися в чергу",
-    "➖ Покинути чергу ➖": "Покинути чергу",
-    "🔍 Переглянути чергу 🔍": "Переглянути чергу",
-    "🪪 Моя позиція 🪪": "Моя позиція",
-    "📜 Переглянути історію 📜": "Переглянути історію",
-    "⏭️ Видалити першого ⏭️": "Видалити першого",
-    "📢 Надіслати оголошення 📢": "Надіслати оголошення"
-}
-
-# Функція для очищення тексту від емодзі та пробілів
-def clean_button_text(text: str) -> str:
-    # Видаляємо емодзі за допомогою regex та зайві пробіли
-    text = re.sub(r'[^\w\s]', '', text).strip()
-    return text
-
+# Клавіатури будуються один раз під час запуску і використовуються повторно
 # Кнопка для надсилання номера
-def get_contact_keyboard() -> ReplyKeyboardMarkup:
-    kb = [[KeyboardButton(text="Поділитися номером телефону 📱", request_contact=True)]]
-    return ReplyKeyboardMarkup(keyboard=kb, resize_keyboard=True, one_time_keyboard=True)
+CONTACT_KEYBOARD = ReplyKeyboardMarkup(
+    keyboard=[[KeyboardButton(text="Поділитися номером телефону 📱", request_contact=True)]],
+    resize_keyboard=True,
+    one_time_keyboard=True
+)
+
+START_KEYBOARD = ReplyKeyboardMarkup(
+    keyboard=[[KeyboardButton(text="➡️ Почати ⬅️")]],
+    resize_keyboard=True,
+    one_time_keyboard=True
+)
 
 # Основне меню з кнопками ReplyKeyboardMarkup
-async def get_main_keyboard(user_id: int) -> ReplyKeyboardMarkup:
-    is_admin = await queue_manager.is_admin(user_id)
-    keyboard = [
-        [KeyboardButton(text="🎓 Вибрати університет 🎓")],
-        [KeyboardButton(text="➕ Записатися в чергу ➕")],
-        [KeyboardButton(text="➖ Покинути чергу ➖")],
-        [KeyboardButton(text="🔍 Переглянути чергу 🔍")],
-        [KeyboardButton(text="🪪 Моя позиція 🪪")]
-    ]
-    if is_admin:
-        keyboard.append([KeyboardButton(text="📜 Переглянути історію 📜")])
-        keyboard.append([KeyboardButton(text="⏭️ Видалити першого ⏭️")])
-        keyboard.append([KeyboardButton(text="📢 Надіслати оголошення 📢")])
-    return ReplyKeyboardMarkup(keyboard=keyboard, resize_keyboard=True, one_time_keyboard=False)
+_USER_BUTTONS = [
+    [KeyboardButton(text="🎓 Вибрати університет 🎓")],
+    [KeyboardButton(text="➕ Записатися в чергу ➕")],
+    [KeyboardButton(text="➖ Покинути чергу ➖")],
+    [KeyboardButton(text="🔍 Переглянути чергу 🔍")],
+    [KeyboardButton(text="🪪 Моя позиція 🪪")]
+]
+_ADMIN_BUTTONS = [
+    [KeyboardButton(text="📜 Переглянути історію 📜")],
+    [KeyboardButton(text="⏭️ Видалити першого ⏭️")],
+    [KeyboardButton(text="📢 Надіслати оголошення 📢")]
+]
+USER_KEYBOARD = ReplyKeyboardMarkup(keyboard=_USER_BUTTONS, resize_keyboard=True, one_time_keyboard=False)
+ADMIN_KEYBOARD = ReplyKeyboardMarkup(keyboard=_USER_BUTTONS + _ADMIN_BUTTONS, resize_keyboard=True, one_time_keyboard=False)
 
-# Клавіатура для вибору університету
-def get_universities_keyboard(universities) -> InlineKeyboardMarkup:
-    buttons = [[InlineKeyboardButton(text=name, callback_data=f"uni_{id}")] for id, name in universities]
-    return InlineKeyboardMarkup(inline_keyboard=buttons)
+def get_contact_keyboard() -> ReplyKeyboardMarkup:
+    return CONTACT_KEYBOARD
+
+def get_main_keyboard(is_admin: bool) -> ReplyKeyboardMarkup:
+    return ADMIN_KEYBOARD if is_admin else USER_KEYBOARD
+
+# Кнопка наступної сторінки історії; курсор (timestamp, id) і фільтри кодуються в callback_data (до 64 байтів)
+def get_history_keyboard(target_id: int, cursor, action: str = None, university_id: int = None):
+    if cursor is None:
+        return None
+    timestamp, history_id = cursor
+    data = f"hist_{target_id}_{timestamp:%Y%m%d%H%M%S}_{history_id}_{action or '-'}_{university_id or 0}"
+    return InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="Далі ▶️", callback_data=data)]])
+
+# Гортання сторінок перегляду черги; університет передається в callback_data, бо повідомлення стосується саме його
+def get_queue_keyboard(university_id: int, page: int, pages: int):
+    if pages <= 1:
+        return None
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton(text="◀️", callback_data=f"qpage_{university_id}_{page - 1}"))
+    navigation.append(InlineKeyboardButton(text=f"{page + 1}/{pages}", callback_data=f"qpage_{university_id}_{page}"))
+    if page < pages - 1:
+        navigation.append(InlineKeyboardButton(text="▶️", callback_data=f"qpage_{university_id}_{page + 1}"))
+    return InlineKeyboardMarkup(inline_keyboard=[navigation])
+
+# Посторінкова клавіатура для вибору університету, сторінки перебудовуються лише при зміні каталогу
+UNIVERSITIES_PAGE_SIZE = 8
+INLINE_SEARCH_LIMIT = 20
+_universities_keyboards = {}  # {(версія каталогу, сторінка): InlineKeyboardMarkup}
+
+def get_universities_keyboard(page: int = 0) -> InlineKeyboardMarkup:
+    catalogue = queue_manager.catalogue
+    universities, page, pages = catalogue.page(page, UNIVERSITIES_PAGE_SIZE)
+    key = (catalogue.version, page)
+    keyboard = _universities_keyboards.get(key)
+    if keyboard is None:
+        if any(version != catalogue.version for version, _ in _universities_keyboards):
+            _universities_keyboards.clear()
+        buttons = [[InlineKeyboardButton(text=name, callback_data=f"uni_{id}")] for id, name in universities]
+        navigation = []
+        if page > 0:
+            navigation.append(InlineKeyboardButton(text="◀️", callback_data=f"unipage_{page - 1}"))
+        if pages > 1:
+            navigation.append(InlineKeyboardButton(text=f"{page + 1}/{pages}", callback_data=f"unipage_{page}"))
+        if page < pages - 1:
+            navigation.append(InlineKeyboardButton(text="▶️", callback_data=f"unipage_{page + 1}"))
+        if navigation:
+            buttons.append(navigation)
+        buttons.append([InlineKeyboardButton(text="🔎 Пошук університету", switch_inline_query_current_chat="")])
+        keyboard = _universities_keyboards[key] = InlineKeyboardMarkup(inline_keyboard=buttons)
+    return keyboard
 
 @dp.message(Command("start"))
-async def start_command(message: types.Message):
+async def start_command(message: types.Message, state: FSMContext):
     """Обробник команди /start"""
     user_id = message.from_user.id
-    if user_id in user_context:
-        del user_context[user_id]  # Очищаємо контекст для нового акаунта
-    logger.info(f"Отримано команду /start від користувача {user_id} ({message.from_user.username})")
-    
-    start_keyboard = ReplyKeyboardMarkup(
-        keyboard=[[
-            KeyboardButton(text="➡️ Почати ⬅️")
-        ]],
-        resize_keyboard=True,
-        one_time_keyboard=True
-    )
+    await state.clear()  # Очищаємо контекст для нового акаунта
+    logger.info(f"Отримано команду /start від користувача {user_id} ({message.from_user.username})", extra=HOT_PATH)
     
     await message.answer(
         "Вітаю! Це бот електронної черги. Натисніть 'Почати', щоб обрати дію:",
-        reply_markup=start_keyboard
+        reply_markup=START_KEYBOARD
     )
 
-@dp.message(lambda message: message.text == "➡️ Почати ⬅️")
-async def handle_start_button(message: types.Message):
-    """Обробник натискання кнопки 'Почати'"""
-    user_id = message.from_user.id
-    logger.info(f"Користувач {user_id} ({message.from_user.username}) натиснув 'Почати' (отриманий текст: '{message.text}')")
-    try:
-        phone_number = await queue_manager.phone_exists(user_id)
-        logger.info(f"Перевірка номера телефону для user_id {user_id}: {'Знайдено: ' + phone_number if phone_number else 'Не знайдено'}")
-        if not phone_number:
-            await message.answer(
-                "Будь ласка, поділіться своїм номером телефону, щоб продовжити:",
-                reply_markup=get_contact_keyboard()
-            )
-        else:
-            await message.answer(
-                "Оберіть дію:",
-                reply_markup=await get_main_keyboard(user_id)
-            )
-    except Exception as e:
-        logger.error(f"Помилка в handle_start_button для user_id {user_id}: {e}")
-        await message.answer("Сталася помилка при перевірці номера телефону. Спробуйте ще раз.", reply_markup=get_contact_keyboard())
+# Кнопки головного меню: {текст кнопки: (обробник, лише для адміністраторів, потрібен вибраний університет)}.
+# Обробник отримує повідомлення і контекст користувача та повертає відповідь
+# (None, якщо вже відповів сам); перевірки прав і вибору університету спільні.
+BUTTON_ROUTES = {}
+
+def button(text: str, admin_only: bool = False, needs_university: bool = False):
+    """Реєструє обробник кнопки в таблиці маршрутів"""
+    def register(handler):
+        BUTTON_ROUTES[text] = (handler, admin_only, needs_university)
+        return handler
+    return register
 
-# Обробка текстових команд від кнопок
-@dp.message(lambda message: message.text in BUTTON_MAPPING)
-async def button_handler(message: types.Message, state: FSMContext):
+@button("➡️ Почати ⬅️")
+async def start_button(message: types.Message, state: FSMContext, profile, is_admin: bool, university_id):
     user_id = message.from_user.id
+    logger.debug(f"Перевірка номера телефону для user_id {user_id}: {'знайдено' if profile and profile.phone_number else 'не знайдено'}")
+    if not (profile and profile.phone_number):
+        await message.answer(
+            "Будь ласка, поділіться своїм номером телефону, щоб продовжити:",
+            reply_markup=get_contact_keyboard()
+        )
+        return None
+    return "Оберіть дію:"
+
+@button("🎓 Вибрати університет 🎓")
+async def choose_university_button(message: types.Message, state: FSMContext, profile, is_admin: bool, university_id):
+    if not await queue_manager.get_universities():
+        return "Немає доступних університетів."
+    await message.answer("Виберіть університет:", reply_markup=get_universities_keyboard())
+    return None
+
+@button("➕ Записатися в чергу ➕", needs_university=True)
+async def join_button(message: types.Message, state: FSMContext, profile, is_admin: bool, university_id):
+    if not (profile and profile.phone_number):
+        await message.answer(
+            "Будь ласка, спочатку поділіться номером телефону за допомогою /start.",
+            reply_markup=get_contact_keyboard()
+        )
+        return None
     user_name = message.from_user.first_name or "Анонім"
-    received_text = message.text
-    action = BUTTON_MAPPING[received_text]
+    return await queue_manager.join_queue(message.from_user.id, user_name, university_id)
+
+@button("➖ Покинути чергу ➖", needs_university=True)
+async def leave_button(message: types.Message, state: FSMContext, profile, is_admin: bool, university_id):
+    return await queue_manager.leave_queue(message.from_user.id, university_id)
+
+@button("🔍 Переглянути чергу 🔍", needs_university=True)
+async def view_button(message: types.Message, state: FSMContext, profile, is_admin: bool, university_id):
+    response, page, pages = await queue_manager.view_queue(university_id, message.from_user.id)
+    if pages <= 1:
+        return response
+    await message.answer(response, reply_markup=get_queue_keyboard(university_id, page, pages))
+    return None
+
+@button("🪪 Моя позиція 🪪", needs_university=True)
+async def position_button(message: types.Message, state: FSMContext, profile, is_admin: bool, university_id):
+    return await queue_manager.notify_position(message.from_user.id, university_id)
+
+@button("📜 Переглянути історію 📜", admin_only=True)
+async def history_button(message: types.Message, state: FSMContext, profile, is_admin: bool, university_id):
+    user_id = message.from_user.id
+    response, cursor = await queue_manager.get_user_history(user_id)
+    if cursor is None:
+        return response
+    await message.answer(response, reply_markup=get_history_keyboard(user_id, cursor))
+    return None
+
+@button("⏭️ Видалити першого ⏭️", admin_only=True, needs_university=True)
+async def next_button(message: types.Message, state: FSMContext, profile, is_admin: bool, university_id):
+    response, _ = await queue_manager.next_in_queue(university_id, bot)
+    return response
+
+@button("📢 Надіслати оголошення 📢", admin_only=True)
+async def broadcast_button(message: types.Message, state: FSMContext, profile, is_admin: bool, university_id):
+    if not await queue_manager.get_universities():
+        return "Немає доступних університетів."
+    await message.answer("Виберіть університет для оголошення:", reply_markup=get_universities_keyboard())
+    await state.set_state(BroadcastStates.waiting_for_university)
+    return None
 
-    logger.info(f"🔘 Кнопка '{received_text}' (дія: {action}) від {user_id} ({user_name})")
+# Обробка текстових команд від кнопок: один пошук у таблиці маршрутів
+@dp.message(lambda message: message.text in BUTTON_ROUTES)
+async def button_router(message: types.Message, state: FSMContext, profile, is_admin: bool, university_id):
+    user_id = message.from_user.id
+    handler, admin_only, needs_university = BUTTON_ROUTES[message.text]
+    logger.info(f"🔘 Кнопка '{message.text}' від {user_id} ({message.from_user.first_name})", extra=HOT_PATH)
 
+    if admin_only and not is_admin:
+        await message.answer("Ця дія доступна лише для адміністраторів.", reply_markup=get_main_keyboard(is_admin))
+        return
+    if needs_university and not university_id:
+        await message.answer("Спочатку виберіть університет за допомогою кнопки 'Вибрати університет'.", reply_markup=get_main_keyboard(is_admin))
+        return
     try:
-        # Перевірка, чи є користувач адміністратором
-        is_admin = await queue_manager.is_admin(user_id)
-
-        if action in ["Переглянути історію", "Видалити першого", "Надіслати оголошення"] and not is_admin:
-            await message.answer("Ця дія доступна лише для адміністраторів.", reply_markup=await get_main_keyboard(user_id))
-            return
-
-        if action == "Надіслати оголошення":
-            universities = await queue_manager.get_universities()
-            if not universities:
-                await message.answer("Немає доступних університетів.", reply_markup=await get_main_keyboard(user_id))
-                return
-            await message.answer("Виберіть університет для оголошення:", reply_markup=get_universities_keyboard(universities))
-            await state.set_state(BroadcastStates.waiting_for_university)
-            return
-
-        if action == "Вибрати університет":
-            universities = await queue_manager.get_universities()
-            if not universities:
-                await message.answer("Немає доступних університетів.")
-                return
-            await message.answer("Виберіть університет:", reply_markup=get_universities_keyboard(universities))
-            return
-
-        # Перевірка, чи вибрано університет (окрім адмінських дій)
-        university_id = user_context.get(user_id)
-        if not university_id and action not in ["Переглянути історію", "Надіслати оголошення"]:
-            await message.answer("Спочатку виберіть університет за допомогою кнопки 'Вибрати університет'.", reply_markup=await get_main_keyboard(user_id))
-            return
-
-        if action == "Записатися в чергу":
-            phone_number = await queue_manager.phone_exists(user_id)
-            if not phone_number:
-                await message.answer(
-                    "Будь ласка, спочатку поділіться номером телефону за допомогою /start.",
-                    reply_markup=get_contact_keyboard()
-                )
-                return
-            response = queue_manager.join_queue(user_id, user_name, university_id)
-            await queue_manager.save_queue()
-
-        elif action == "Покинути чергу":
-            response = queue_manager.leave_queue(user_id, university_id)
-            await queue_manager.save_queue()
-
-        elif action == "Переглянути чергу":
-            response = queue_manager.view_queue(university_id)
-
-        elif action == "Моя позиція":
-            response = await queue_manager.notify_position(user_id, university_id)
-
-        elif action == "Переглянути історію":
-            response = await queue_manager.get_user_history(user_id)
-
-        elif action == "Видалити першого":
-            response, updated_users = await queue_manager.next_in_queue(university_id, bot)
-            await queue_manager.save_queue()
-            if updated_users:
-                asyncio.create_task(queue_manager.remind_first(bot, user_id, university_id))
-
-        await message.answer(response, reply_markup=await get_main_keyboard(user_id))
-
+        response = await handler(message, state, profile, is_admin, university_id)
+        if response is not None:
+            await message.answer(response, reply_markup=get_main_keyboard(is_admin))
     except Exception as e:
-        logger.error(f"❌ Помилка обробки '{action}' (кнопка: {received_text}): {e}")
-        await message.answer("Сталася помилка. Спробуйте ще раз.", reply_markup=await get_main_keyboard(user_id))
+        logger.error(f"❌ Помилка обробки кнопки '{message.text}': {e}")
+        await message.answer("Сталася помилка. Спробуйте ще раз.", reply_markup=get_main_keyboard(is_admin))
 
 # Обробка вибору університету для оголошення
 @dp.callback_query(StateFilter(BroadcastStates.waiting_for_university), lambda c: c.data.startswith("uni_"))
-async def broadcast_university_selection(callback: types.CallbackQuery, state: FSMContext):
+async def broadcast_university_selection(callback: types.CallbackQuery, state: FSMContext, is_admin: bool):
     user_id = callback.from_user.id
     user_name = callback.from_user.first_name or "Анонім"
     university_id = int(callback.data.split("_")[1])
@@ -213,24 +349,24 @@ async def broadcast_university_selection(callback: types.CallbackQuery, state: F
     logger.info(f"🔘 Вибір університету {university_id} для оголошення від {user_id} ({user_name})")
     
     try:
-        await state.update_data(university_id=university_id)
+        await state.update_data(broadcast_university_id=university_id)
         await callback.message.edit_text("Введіть текст оголошення для користувачів цього університету:")
         await state.set_state(BroadcastStates.waiting_for_message)
         await callback.answer()
     except Exception as e:
         logger.error(f"❌ Помилка вибору університету для оголошення: {e}")
-        await callback.message.answer("Сталася помилка. Спробуйте ще раз.", reply_markup=await get_main_keyboard(user_id))
-        await state.clear()
+        await callback.message.answer("Сталася помилка. Спробуйте ще раз.", reply_markup=get_main_keyboard(is_admin))
+        await finish_broadcast(state)
         await callback.answer()
 
 # Обробка введення тексту оголошення
 @dp.message(StateFilter(BroadcastStates.waiting_for_message))
-async def process_broadcast_message(message: types.Message, state: FSMContext):
+async def process_broadcast_message(message: types.Message, state: FSMContext, is_admin: bool):
     user_id = message.from_user.id
     user_name = message.from_user.first_name or "Анонім"
-    if not await queue_manager.is_admin(user_id):
-        await message.answer("Ця дія доступна лише для адміністраторів.", reply_markup=await get_main_keyboard(user_id))
-        await state.clear()
+    if not is_admin:
+        await message.answer("Ця дія доступна лише для адміністраторів.", reply_markup=get_main_keyboard(is_admin))
+        await finish_broadcast(state)
         return
 
     message_text = message.text.strip()
@@ -240,129 +376,274 @@ async def process_broadcast_message(message: types.Message, state: FSMContext):
 
     try:
         data = await state.get_data()
-        university_id = data.get('university_id')
+        university_id = data.get('broadcast_university_id')
         if not university_id:
-            await message.answer("Не вибрано університет. Спробуйте ще раз.", reply_markup=await get_main_keyboard(user_id))
-            await state.clear()
+            await message.answer("Не вибрано університет. Спробуйте ще раз.", reply_markup=get_main_keyboard(is_admin))
+            await finish_broadcast(state)
             return
 
-        await queue_manager.broadcast_message(bot, user_id, user_name, message_text, university_id)
-        await message.answer("Оголошення успішно надіслано користувачам університету!", reply_markup=await get_main_keyboard(user_id))
-        await state.clear()
+        batch = await queue_manager.broadcast_message(bot, user_id, user_name, message_text, university_id)
+        await message.answer(
+            f"Оголошення поставлено в чергу на надсилання {batch.total} користувачам університету. "
+            f"Звіт про доставку надійде окремим повідомленням.",
+            reply_markup=get_main_keyboard(is_admin)
+        )
+        await finish_broadcast(state)
     except Exception as e:
         logger.error(f"Помилка надсилання оголошення від {user_id}: {e}")
-        await message.answer("Сталася помилка при надсиланні оголошення. Спробуйте ще раз.", reply_markup=await get_main_keyboard(user_id))
-        await state.clear()
+        await message.answer("Сталася помилка при надсиланні оголошення. Спробуйте ще раз.", reply_markup=get_main_keyboard(is_admin))
+        await finish_broadcast(state)
 
 # Обробка контакту
 @dp.message(lambda message: message.contact is not None)
-async def handle_contact(message: types.Message):
+async def handle_contact(message: types.Message, is_admin: bool):
     contact = message.contact
     user_id = contact.user_id
     phone_number = contact.phone_number
     user_name = message.from_user.first_name or "Анонім"
 
-    logger.info(f"📞 Отримано номер: {phone_number} від {user_name} (ID: {user_id})")
+    logger.info(f"📞 Отримано номер телефону від {user_name} (ID: {user_id})")
     await queue_manager.save_user_phone(user_id, user_name, phone_number)
 
     await message.answer(
         "✅ Дякую! Ваш номер збережено.\nОберіть дію нижче:",
-        reply_markup=await get_main_keyboard(user_id)
+        reply_markup=get_main_keyboard(is_admin)
     )
 
 # /stats
 @dp.message(Command("stats"))
-async def stats_command(message: types.Message):
-    user_id = message.from_user.id
-    university_id = user_context.get(user_id)
+async def stats_command(message: types.Message, is_admin: bool, university_id):
     if not university_id:
-        await message.answer("Спочатку виберіть університет за допомогою кнопки 'Вибрати університет'.", reply_markup=await get_main_keyboard(user_id))
+        await message.answer("Спочатку виберіть університет за допомогою кнопки 'Вибрати університет'.", reply_markup=get_main_keyboard(is_admin))
         return
-    stats = queue_manager.get_stats(university_id)
-    await message.answer(stats, reply_markup=await get_main_keyboard(user_id))
+    stats = await queue_manager.get_stats(university_id)
+    await message.answer(stats, reply_markup=get_main_keyboard(is_admin))
 
 # /next
 @dp.message(Command("next"))
-async def next_command(message: types.Message):
-    user_id = message.from_user.id
-    university_id = user_context.get(user_id)
+async def next_command(message: types.Message, is_admin: bool, university_id):
     if not university_id:
-        await message.answer("Спочатку виберіть університет за допомогою кнопки 'Вибрати університет'.", reply_markup=await get_main_keyboard(user_id))
+        await message.answer("Спочатку виберіть університет за допомогою кнопки 'Вибрати університет'.", reply_markup=get_main_keyboard(is_admin))
         return
-    response, updated_users = await queue_manager.next_in_queue(university_id, bot)
-    await queue_manager.save_queue()
-    await message.answer(response, reply_markup=await get_main_keyboard(user_id))
-    # Нагадування першому в черзі
-    if updated_users:
-        asyncio.create_task(queue_manager.remind_first(bot, user_id, university_id))
+    response, _ = await queue_manager.next_in_queue(university_id, bot)
+    await message.answer(response, reply_markup=get_main_keyboard(is_admin))
 
 # /remove_first
 @dp.message(Command("remove_first"))
-async def remove_first_command(message: types.Message):
-    user_id = message.from_user.id
-    if not await queue_manager.is_admin(user_id):
-        await message.answer("Ця команда доступна лише для адміністраторів.", reply_markup=await get_main_keyboard(user_id))
+async def remove_first_command(message: types.Message, is_admin: bool, university_id):
+    if not is_admin:
+        await message.answer("Ця команда доступна лише для адміністраторів.", reply_markup=get_main_keyboard(is_admin))
+        return
+    if not university_id:
+        await message.answer("Спочатку виберіть університет за допомогою кнопки 'Вибрати університет'.", reply_markup=get_main_keyboard(is_admin))
+        return
+    response, _ = await queue_manager.next_in_queue(university_id, bot)
+    await message.answer(response, reply_markup=get_main_keyboard(is_admin))
+
+async def get_admin_university(message: types.Message, is_admin: bool, university_id):
+    """Університет, вибраний адміністратором, або None (користувач уже отримав пояснення)"""
+    if not is_admin:
+        await message.answer("Ця команда доступна лише для адміністраторів.", reply_markup=get_main_keyboard(is_admin))
+        return None
+    if not university_id:
+        await message.answer("Спочатку виберіть університет за допомогою кнопки 'Вибрати університет'.", reply_markup=get_main_keyboard(is_admin))
+        return None
+    return university_id
+
+def parse_ints(args: str):
+    """Цілі числа з аргументів команди або None, якщо серед них є щось інше"""
+    parts = (args or "").replace(",", " ").split()
+    return [int(part) for part in parts] if all(part.isdigit() for part in parts) else None
+
+# Масові команди адміністратора над чергою вибраного університету: кожна — одна транзакція
+# і один прохід сповіщень. /call <k>, /remove <user_id> ..., /move <user_id> <позиція>,
+# /merge <university_id>, /split <university_id> <позиція>, /clear <кількість>
+BULK_USAGE = {
+    "call": "/call <кількість>",
+    "remove": "/remove <user_id> [user_id ...]",
+    "move": "/move <user_id> <позиція>",
+    "merge": "/merge <ID університету, чергу якого приєднати>",
+    "split": "/split <ID університету, куди перенести> <позиція, з якої переносити>",
+}
+
+@dp.message(Command("call", "remove", "move", "merge", "split"))
+async def bulk_queue_command(message: types.Message, command: CommandObject, is_admin: bool, university_id):
+    university_id = await get_admin_university(message, is_admin, university_id)
+    if not university_id:
         return
-    university_id = user_context.get(user_id)
+    args = parse_ints(command.args)
+    expected = {"call": 1, "move": 2, "merge": 1, "split": 2}.get(command.command)
+    if not args or (expected is not None and len(args) != expected) or (command.command == "call" and args[0] < 1):
+        await message.answer(f"Використання: {BULK_USAGE[command.command]}", reply_markup=get_main_keyboard(is_admin))
+        return
+    if command.command == "call":
+        response = await queue_manager.call_next(university_id, args[0])
+    elif command.command == "remove":
+        response = await queue_manager.remove_users(university_id, args)
+    elif command.command == "move":
+        response = await queue_manager.move_user(university_id, args[0], args[1])
+    elif command.command == "merge":
+        response = await queue_manager.transfer_queue(args[0], university_id)
+    else:
+        response = await queue_manager.transfer_queue(university_id, args[0], args[1])
+    await message.answer(response, reply_markup=get_main_keyboard(is_admin))
+
+# /clear <кількість> — кількість учасників підтверджує, що очищується саме та черга, яку бачить адміністратор
+@dp.message(Command("clear"))
+async def clear_command(message: types.Message, command: CommandObject, is_admin: bool, university_id):
+    university_id = await get_admin_university(message, is_admin, university_id)
     if not university_id:
-        await message.answer("Спочатку виберіть університет за допомогою кнопки 'Вибрати університет'.", reply_markup=await get_main_keyboard(user_id))
         return
-    response, updated_users = await queue_manager.next_in_queue(university_id, bot)
-    await queue_manager.save_queue()
-    await message.answer(response, reply_markup=await get_main_keyboard(user_id))
-    # Нагадування першому в черзі
-    if updated_users:
-        asyncio.create_task(queue_manager.remind_first(bot, user_id, university_id))
-
-# /admin_history
+    size = await queue_manager.state.size(university_id)
+    if command.args != str(size):
+        await message.answer(
+            f"У черзі {size} осіб. Щоб очистити її, надішліть /clear {size}",
+            reply_markup=get_main_keyboard(is_admin)
+        )
+        return
+    response = await queue_manager.clear_queue(university_id)
+    await message.answer(response, reply_markup=get_main_keyboard(is_admin))
+
+# /admin_history [user_id] [join|leave|next|bc] [uni=<university_id>]
 @dp.message(Command("admin_history"))
-async def admin_history_command(message: types.Message):
+async def admin_history_command(message: types.Message, command: CommandObject, is_admin: bool):
     user_id = message.from_user.id
-    if not await queue_manager.is_admin(user_id):
-        await message.answer("Ця команда доступна лише для адміністраторів.", reply_markup=await get_main_keyboard(user_id))
+    if not is_admin:
+        await message.answer("Ця команда доступна лише для адміністраторів.", reply_markup=get_main_keyboard(is_admin))
+        return
+    target_id, action, university_id = user_id, None, None
+    for arg in (command.args or "").split():
+        if arg.isdigit():
+            target_id = int(arg)
+        elif arg in HISTORY_ACTIONS:
+            action = arg
+        elif arg.startswith("uni=") and arg[4:].isdigit():
+            university_id = int(arg[4:])
+        else:
+            await message.answer(
+                f"Використання: /admin_history [user_id] [{'|'.join(HISTORY_ACTIONS)}] [uni=<id>]",
+                reply_markup=get_main_keyboard(is_admin)
+            )
+            return
+    history, cursor = await queue_manager.get_user_history(target_id, action=action, university_id=university_id)
+    keyboard = get_history_keyboard(target_id, cursor, action, university_id)
+    await message.answer(history, reply_markup=keyboard or get_main_keyboard(is_admin))
+
+# Наступна сторінка історії
+@dp.callback_query(lambda c: c.data.startswith("hist_"))
+async def history_page(callback: types.CallbackQuery, is_admin: bool):
+    if not is_admin:
+        await callback.answer("Ця дія доступна лише для адміністраторів.", show_alert=True)
         return
-    history = await queue_manager.get_user_history(user_id)
-    await message.answer(history, reply_markup=await get_main_keyboard(user_id))
+    _, target_id, timestamp, history_id, action, university_id = callback.data.split("_")
+    cursor = (datetime.strptime(timestamp, "%Y%m%d%H%M%S"), int(history_id))
+    action = None if action == "-" else action
+    university_id = int(university_id) or None
+    history, next_cursor = await queue_manager.get_user_history(
+        int(target_id), cursor=cursor, action=action, university_id=university_id
+    )
+    # Прибираємо кнопку з попередньої сторінки, щоб не відкривати її двічі
+    await callback.message.edit_reply_markup(reply_markup=None)
+    await callback.message.answer(history, reply_markup=get_history_keyboard(int(target_id), next_cursor, action, university_id))
+    await callback.answer()
 
 # /broadcast
 @dp.message(Command("broadcast"))
-async def broadcast_command(message: types.Message, state: FSMContext):
-    user_id = message.from_user.id
-    if not await queue_manager.is_admin(user_id):
-        await message.answer("Ця команда доступна лише для адміністраторів.", reply_markup=await get_main_keyboard(user_id))
+async def broadcast_command(message: types.Message, state: FSMContext, is_admin: bool):
+    if not is_admin:
+        await message.answer("Ця команда доступна лише для адміністраторів.", reply_markup=get_main_keyboard(is_admin))
         return
     universities = await queue_manager.get_universities()
     if not universities:
-        await message.answer("Немає доступних університетів.", reply_markup=await get_main_keyboard(user_id))
+        await message.answer("Немає доступних університетів.", reply_markup=get_main_keyboard(is_admin))
         return
-    await message.answer("Виберіть університет для оголошення:", reply_markup=get_universities_keyboard(universities))
+    await message.answer("Виберіть університет для оголошення:", reply_markup=get_universities_keyboard())
     await state.set_state(BroadcastStates.waiting_for_university)
 
+# Гортання сторінок списку університетів
+@dp.callback_query(lambda c: c.data.startswith("unipage_"))
+async def universities_page(callback: types.CallbackQuery):
+    page = int(callback.data.split("_")[1])
+    try:
+        await callback.message.edit_reply_markup(reply_markup=get_universities_keyboard(page))
+    except Exception as e:
+        # Повторне натискання на поточну сторінку не змінює повідомлення
+        logger.debug(f"Сторінку університетів {page} не оновлено: {e}")
+    await callback.answer()
+
+# Гортання сторінок черги
+@dp.callback_query(lambda c: c.data.startswith("qpage_"))
+async def queue_page(callback: types.CallbackQuery):
+    _, university_id, page = callback.data.split("_")
+    university_id, page = int(university_id), int(page)
+    text, page, pages = await queue_manager.view_queue(university_id, callback.from_user.id, page)
+    try:
+        await callback.message.edit_text(text, reply_markup=get_queue_keyboard(university_id, page, pages))
+    except Exception as e:
+        # Сторінка не змінилася з попереднього показу
+        logger.debug(f"Сторінку {page} черги університету {university_id} не оновлено: {e}")
+    await callback.answer()
+
+# Пошук університету через inline-режим
+@dp.inline_query()
+async def universities_search(inline_query: types.InlineQuery):
+    results = [
+        InlineQueryResultArticle(
+            id=str(university_id),
+            title=name,
+            input_message_content=InputTextMessageContent(message_text=f"🎓 {name}")
+        )
+        for university_id, name in queue_manager.catalogue.search(inline_query.query, INLINE_SEARCH_LIMIT)
+    ]
+    await inline_query.answer(results, cache_time=60, is_personal=False)
+
+# Вибір університету з результатів inline-пошуку
+@dp.message(lambda message: message.via_bot is not None and message.text is not None and message.text.startswith("🎓 "))
+async def university_search_selection(message: types.Message, state: FSMContext, is_admin: bool, raw_state: str = None):
+    user_id = message.from_user.id
+    university_id = queue_manager.catalogue.ids_by_name.get(message.text[2:])
+    if university_id is None:
+        await message.answer("Університет не знайдено. Спробуйте ще раз.", reply_markup=get_universities_keyboard())
+        return
+    if raw_state == BroadcastStates.waiting_for_university.state:
+        # Пошук відкрито з вибору університету для оголошення
+        if not is_admin:
+            await message.answer("Ця дія доступна лише для адміністраторів.", reply_markup=get_main_keyboard(is_admin))
+            await finish_broadcast(state)
+            return
+        logger.info(f"🔎 Вибір університету {university_id} для оголошення через пошук від {user_id}")
+        await state.update_data(broadcast_university_id=university_id)
+        await state.set_state(BroadcastStates.waiting_for_message)
+        await message.answer("Введіть текст оголошення для користувачів цього університету:")
+        return
+    logger.info(f"🔎 Вибір університету {university_id} через пошук від {user_id}")
+    await state.update_data(university_id=university_id)
+    await message.answer("Університет вибрано! Оберіть дію:", reply_markup=get_main_keyboard(is_admin))
+
 # Обробка вибору університету
 @dp.callback_query(lambda c: c.data.startswith("uni_"))
-async def university_selection(callback: types.CallbackQuery):
+async def university_selection(callback: types.CallbackQuery, state: FSMContext, is_admin: bool):
     user_id = callback.from_user.id
     user_name = callback.from_user.first_name or "Анонім"
     university_id = int(callback.data.split("_")[1])
 
-    logger.info(f"🔘 Вибір університету {university_id} від {user_id} ({user_name})")
-    user_context[user_id] = university_id
+    logger.info(f"🔘 Вибір університету {university_id} від {user_id} ({user_name})", extra=HOT_PATH)
+    await state.update_data(university_id=university_id)
 
     try:
         await callback.message.edit_text("Університет вибрано! Оберіть дію:")
-        await callback.message.answer("Оберіть дію:", reply_markup=await get_main_keyboard(user_id))
+        await callback.message.answer("Оберіть дію:", reply_markup=get_main_keyboard(is_admin))
         await callback.answer()
     except Exception as e:
         logger.error(f"❌ Помилка вибору університету: {e}")
-        await callback.message.answer("Сталася помилка. Спробуйте ще раз.", reply_markup=await get_main_keyboard(user_id))
+        await callback.message.answer("Сталася помилка. Спробуйте ще раз.", reply_markup=get_main_keyboard(is_admin))
         await callback.answer()
 
 # Обробка застарілих кнопок (для сумісності)
 @dp.callback_query()
-async def button_handler(callback: types.CallbackQuery):
+async def button_handler(callback: types.CallbackQuery, profile, is_admin: bool, university_id):
     user_id = callback.from_user.id
     user_name = callback.from_user.first_name or "Анонім"
-    university_id = user_context.get(user_id)
 
     logger.info(f"🔘 callback {callback.data} від {user_id} ({user_name})")
 
@@ -372,13 +653,13 @@ async def button_handler(callback: types.CallbackQuery):
                 "Спочатку виберіть університет за допомогою кнопки 'Вибрати університет'.",
                 reply_markup=None
             )
-            await callback.message.answer("Оберіть дію:", reply_markup=await get_main_keyboard(user_id))
+            await callback.message.answer("Оберіть дію:", reply_markup=get_main_keyboard(is_admin))
             await callback.answer()
             return
 
+        keyboard = None
         if callback.data == 'join':
-            phone_number = await queue_manager.phone_exists(user_id)
-            if not phone_number:
+            if not (profile and profile.phone_number):
                 await callback.message.edit_text(
                     "Будь ласка, спочатку поділіться номером телефону за допомогою /start.",
                     reply_markup=None
@@ -386,23 +667,22 @@ async def button_handler(callback: types.CallbackQuery):
                 await callback.message.answer("Поділіться номером:", reply_markup=get_contact_keyboard())
                 await callback.answer()
                 return
-            response = queue_manager.join_queue(user_id, user_name, university_id)
-            await queue_manager.save_queue()
+            response = await queue_manager.join_queue(user_id, user_name, university_id)
 
         elif callback.data == 'leave':
-            response = queue_manager.leave_queue(user_id, university_id)
-            await queue_manager.save_queue()
+            response = await queue_manager.leave_queue(user_id, university_id)
 
         elif callback.data == 'view':
-            response = queue_manager.view_queue(university_id)
+            response, page, pages = await queue_manager.view_queue(university_id, user_id)
+            keyboard = get_queue_keyboard(university_id, page, pages)
 
-        await callback.message.edit_text(response, reply_markup=None)
-        await callback.message.answer("Оберіть дію:", reply_markup=await get_main_keyboard(user_id))
+        await callback.message.edit_text(response, reply_markup=keyboard)
+        await callback.message.answer("Оберіть дію:", reply_markup=get_main_keyboard(is_admin))
         await callback.answer()
 
     except Exception as e:
         logger.error(f"❌ callback failure {callback.data}: {e}")
-        await callback.message.answer("Сталася помилка. Спробуйте ще раз.", reply_markup=await get_main_keyboard(user_id))
+        await callback.message.answer("Сталася помилка. Спробуйте ще раз.", reply_markup=get_main_keyboard(is_admin))
         await callback.answer()
 
 # Перевірка токену
@@ -423,10 +703,36 @@ async def disable_webhook():
     except Exception as e:
         logger.error(f"Вимкнення вебхуків: {e}")
 
+# Запуск у режимі вебхука
+webhook_server = None
+
+async def run_webhook():
+    global webhook_server
+    if not WEBHOOK_URL:
+        raise ValueError("❌ Для RUN_MODE=webhook потрібно задати WEBHOOK_URL у .env")
+    webhook_server = WebhookServer(
+        dp, bot, path=WEBHOOK_PATH, secret_token=WEBHOOK_SECRET, max_concurrency=WEBHOOK_MAX_CONNECTIONS
+    )
+    await webhook_server.start(WEBHOOK_HOST, WEBHOOK_PORT)
+    # Оновлення, що накопичилися під час простою, не відкидаються
+    await bot.set_webhook(
+        url=WEBHOOK_URL,
+        secret_token=WEBHOOK_SECRET,
+        max_connections=WEBHOOK_MAX_CONNECTIONS,
+        allowed_updates=dp.resolve_used_update_types(),
+        drop_pending_updates=False
+    )
+    logger.info(f"🌐 Вебхук встановлено: {WEBHOOK_URL}")
+    await asyncio.Event().wait()
+
 # Обробка завершення
 async def shutdown():
     logger.info("Завершення роботи бота...")
     try:
+        if webhook_server is not None:
+            await webhook_server.stop()
+        await metrics_server.stop()
+        await queue_manager.shutdown()
         await bot.session.close()
         logger.info("Бот зупинений")
     except Exception as e:
@@ -438,10 +744,15 @@ async def main():
         logger.info("🔄 Запуск бота...")
         if not await check_token():
             raise ValueError("❌ Невірний TELEGRAM_TOKEN у .env")
-        await disable_webhook()
-        await queue_manager.startup()
+        await queue_manager.startup(bot)
+        if METRICS_PORT:
+            await metrics_server.start(METRICS_HOST, METRICS_PORT)
         logger.info("✅ Бот працює!")
-        await dp.start_polling(bot, skip_updates=True)
+        if RUN_MODE == "webhook":
+            await run_webhook()
+        else:
+            await disable_webhook()
+            await dp.start_polling(bot, skip_updates=True)
     except (KeyboardInterrupt, SystemExit):
         logger.info("Отримано запит на завершення")
         await shutdown()
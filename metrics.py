@@ -0,0 +1,193 @@
+import inspect
+import logging
+import random
+import time
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Межі гістограм у секундах: від швидкого запиту до БД до повільного виклику Telegram
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+class MetricsRegistry:
+    """Лічильники, гістограми та показники у текстовому форматі Prometheus.
+
+    Усі виміри робляться в циклі подій, тому блокування не потрібні. Якщо
+    sample_rate < 1, час вимірюється лише для частини викликів (sampled()),
+    а лічильники запитів і помилок залишаються точними.
+    """
+
+    def __init__(self, sample_rate: float = 1.0):
+        self.sample_rate = sample_rate
+        self._help = {}  # {назва метрики: (тип, опис)}
+        self._counters = {}  # {(назва, мітки): значення}
+        self._histograms = {}  # {(назва, мітки): Histogram}
+        self._gauges = {}  # {назва: (назва мітки або None, функція)}
+
+    def describe(self, name: str, kind: str, help_text: str):
+        self._help[name] = (kind, help_text)
+
+    def sampled(self) -> bool:
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def inc(self, name: str, labels=(), value: float = 1):
+        key = (name, labels)
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, labels=()):
+        histogram = self._histograms.get((name, labels))
+        if histogram is None:
+            histogram = self._histograms[(name, labels)] = Histogram()
+        histogram.observe(seconds)
+
+    def register_gauge(self, name: str, help_text: str, callback, label: str = None):
+        """Показник, що обчислюється під час запиту /metrics.
+
+        callback (звичайна функція або корутина) повертає число або, якщо
+        задано label, словник {значення мітки: число}.
+        """
+        self.describe(name, "gauge", help_text)
+        self._gauges[name] = (label, callback)
+
+    def register_counter(self, name: str, help_text: str, callback, label: str = None):
+        """Лічильник, який веде інший об'єкт; як і register_gauge, читається під час запиту /metrics"""
+        self.describe(name, "counter", help_text)
+        self._gauges[name] = (label, callback)
+
+    async def render(self) -> str:
+        lines = []
+        by_name = {}
+        for (name, labels), value in self._counters.items():
+            by_name.setdefault(name, []).append(f"{name}{_format_labels(labels)} {value}")
+        for (name, labels), histogram in self._histograms.items():
+            samples = by_name.setdefault(name, [])
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                samples.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {cumulative}")
+            samples.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+            samples.append(f"{name}_sum{_format_labels(labels)} {histogram.sum:.6f}")
+            samples.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        for name, (label, callback) in self._gauges.items():
+            try:
+                value = callback()
+                if inspect.isawaitable(value):
+                    value = await value
+            except Exception as e:
+                logger.error(f"Помилка обчислення метрики {name}: {e}")
+                continue
+            if label is None:
+                by_name[name] = [f"{name} {value}"]
+            else:
+                by_name[name] = [f"{name}{_format_labels(((label, key),))} {v}" for key, v in value.items()]
+
+        for name, samples in by_name.items():
+            kind, help_text = self._help.get(name, ("untyped", ""))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+registry.describe(
+    "queuebot_db_query_seconds", "histogram", "Тривалість звернень до бази даних разом з очікуванням з'єднання"
+)
+registry.describe("queuebot_db_errors_total", "counter", "Звернення до бази даних, що завершилися помилкою")
+registry.describe("queuebot_handler_seconds", "histogram", "Тривалість роботи обробників aiogram")
+registry.describe("queuebot_handler_errors_total", "counter", "Обробники, що завершилися помилкою")
+registry.describe("queuebot_telegram_request_seconds", "histogram", "Тривалість запитів до Bot API")
+registry.describe("queuebot_telegram_errors_total", "counter", "Запити до Bot API, що завершилися помилкою")
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Вимірює час роботи обробника; підключається як внутрішній middleware спостерігача"""
+
+    def __init__(self, metrics: MetricsRegistry = registry):
+        self.metrics = metrics
+
+    async def __call__(self, handler, event, data):
+        handler_object = data.get("handler")
+        labels = (("handler", handler_object.callback.__name__ if handler_object else "unknown"),)
+        started = time.perf_counter() if self.metrics.sampled() else None
+        try:
+            return await handler(event, data)
+        except Exception:
+            self.metrics.inc("queuebot_handler_errors_total", labels)
+            raise
+        finally:
+            if started is not None:
+                self.metrics.observe("queuebot_handler_seconds", time.perf_counter() - started, labels)
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """Вимірює час кожного запиту до Bot API (send_message, edit_message_text тощо)"""
+
+    def __init__(self, metrics: MetricsRegistry = registry):
+        self.metrics = metrics
+
+    async def __call__(self, make_request, bot, method):
+        labels = (("method", method.__api_method__),)
+        started = time.perf_counter() if self.metrics.sampled() else None
+        try:
+            return await make_request(bot, method)
+        except Exception:
+            self.metrics.inc("queuebot_telegram_errors_total", labels)
+            raise
+        finally:
+            if started is not None:
+                self.metrics.observe("queuebot_telegram_request_seconds", time.perf_counter() - started, labels)
+
+
+class MetricsServer:
+    """Локальний HTTP-сервер, що віддає метрики на /metrics"""
+
+    def __init__(self, metrics: MetricsRegistry = registry):
+        self.metrics = metrics
+        self._runner = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        return web.Response(text=await self.metrics.render(), content_type="text/plain", charset="utf-8")
+
+    async def start(self, host: str, port: int):
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logger.info(f"📈 Метрики доступні на http://{host}:{port}/metrics")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,180 @@
+import logging
+
+import mysql.connector
+from mysql.connector import errorcode
+
+from outbox import Outbox
+from retention import HistoryRetention
+from scheduler import TimerScheduler
+
+logger = logging.getLogger(__name__)
+
+# Блокування на рівні сервера MySQL: міграції одночасно виконує лише один процес бота
+MIGRATION_LOCK = "queuebot_migrations"
+MIGRATION_LOCK_TIMEOUT = 60
+
+
+def _base_schema(cursor):
+    """Схема до появи версій; ідемпотентна, тож безпечна і для наявних баз даних"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS universities (
+            university_id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            UNIQUE (name)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id BIGINT PRIMARY KEY,
+            user_name VARCHAR(255) NOT NULL,
+            phone_number VARCHAR(20) NOT NULL,
+            is_admin BOOLEAN NOT NULL DEFAULT FALSE
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS queue (
+            user_id BIGINT NOT NULL,
+            university_id INT NOT NULL,
+            join_time DATETIME NOT NULL,
+            seq BIGINT NOT NULL AUTO_INCREMENT,
+            PRIMARY KEY (user_id, university_id),
+            KEY idx_queue_seq (seq),
+            KEY idx_queue_university_seq (university_id, seq),
+            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
+            FOREIGN KEY (university_id) REFERENCES universities(university_id) ON DELETE CASCADE
+        )
+    """)
+    # Доповнюємо queue, створену до появи послідовності seq, зберігши порядок за часом входу
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'queue' AND COLUMN_NAME = 'seq'
+    """)
+    if not cursor.fetchone()[0]:
+        cursor.execute("""
+            ALTER TABLE queue
+                ADD COLUMN seq BIGINT NOT NULL AUTO_INCREMENT,
+                ADD KEY idx_queue_seq (seq),
+                ADD KEY idx_queue_university_seq (university_id, seq)
+        """)
+        cursor.execute("SET @queue_seq = 0")
+        cursor.execute("UPDATE queue SET seq = (@queue_seq := @queue_seq + 1) ORDER BY join_time")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_history (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id BIGINT NOT NULL,
+            action VARCHAR(255) NOT NULL,
+            university_id INT NULL,
+            timestamp DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_user_history_user_time (user_id, timestamp, id),
+            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+        )
+    """)
+    # Доповнюємо user_history, створену до появи фільтрів і посторінкового перегляду
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'user_history' AND COLUMN_NAME = 'university_id'
+    """)
+    if not cursor.fetchone()[0]:
+        cursor.execute("ALTER TABLE user_history ADD COLUMN university_id INT NULL AFTER action")
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'user_history' AND INDEX_NAME = 'idx_user_history_user_time'
+    """)
+    if not cursor.fetchone()[0]:
+        cursor.execute("CREATE INDEX idx_user_history_user_time ON user_history (user_id, timestamp, id)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS fsm_storage (
+            storage_key VARCHAR(255) PRIMARY KEY,
+            state VARCHAR(255) NULL,
+            data TEXT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS broadcast_messages (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            admin_id BIGINT NOT NULL,
+            message_text TEXT NOT NULL,
+            timestamp DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (admin_id) REFERENCES users(user_id) ON DELETE CASCADE
+        )
+    """)
+    Outbox.create_tables(cursor)
+    TimerScheduler.create_tables(cursor)
+
+
+def _history_retention(cursor):
+    """Денні підсумки history_daily та індекси за часом для порційного очищення історії"""
+    HistoryRetention.create_tables(cursor)
+    for table, index in (("user_history", "idx_user_history_time"), ("broadcast_messages", "idx_broadcast_messages_time")):
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+        """, (table, index))
+        if not cursor.fetchone()[0]:
+            cursor.execute(f"CREATE INDEX {index} ON {table} (timestamp)")
+
+
+# Упорядкований список міграцій: (версія, опис, функція(cursor)). Нові міграції додаються лише в кінець.
+MIGRATIONS = [
+    (1, "базова схема", _base_schema),
+    (2, "денні підсумки та очищення історії", _history_retention),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def _current_version(cursor) -> int:
+    try:
+        cursor.execute("SELECT MAX(version) FROM schema_version")
+    except mysql.connector.ProgrammingError as e:
+        if e.errno == errorcode.ER_NO_SUCH_TABLE:
+            return 0
+        raise
+    return cursor.fetchone()[0] or 0
+
+
+def _apply(cursor, version: int) -> list:
+    """Застосовує міграції, новіші за version, і записує кожну в schema_version"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INT PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    applied = []
+    for number, description, migration in MIGRATIONS:
+        if number <= version:
+            continue
+        migration(cursor)
+        cursor.execute("INSERT INTO schema_version (version, description) VALUES (%s, %s)", (number, description))
+        applied.append(number)
+    return applied
+
+
+async def migrate(db) -> int:
+    """Доводить схему бази даних до LATEST_VERSION.
+
+    Якщо схема актуальна, виконується один SELECT без жодного DDL. Інакше
+    нові міграції застосовуються під блокуванням GET_LOCK, щоб процеси, які
+    запускаються одночасно, не виконували їх двічі.
+    """
+    version = await db.run(_current_version)
+    if version >= LATEST_VERSION:
+        logger.info(f"Схема бази даних актуальна (версія {version})")
+        return version
+
+    def work(cursor):
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (MIGRATION_LOCK, MIGRATION_LOCK_TIMEOUT))
+        if not cursor.fetchone()[0]:
+            raise TimeoutError("Не вдалося отримати блокування міграцій")
+        try:
+            # Інший процес міг застосувати міграції, поки ми чекали на блокування
+            return _apply(cursor, _current_version(cursor))
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+            cursor.fetchall()
+
+    applied = await db.run(work)
+    if applied:
+        logger.info(f"Застосовано міграції бази даних: {', '.join(map(str, applied))} (версія {LATEST_VERSION})")
+    return LATEST_VERSION
@@ -0,0 +1,262 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+# Обмеження Telegram Bot API: ~30 повідомлень на секунду загалом і ~1 на секунду в один чат
+GLOBAL_RATE = 30.0
+PER_CHAT_RATE = 1.0
+
+
+class TokenBucket:
+    """Відро токенів: rate токенів на секунду, не більше capacity одночасно"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self) -> float:
+        """Забирає токен і повертає 0 або повертає, скільки секунд треба почекати"""
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self):
+        while True:
+            delay = self.try_acquire()
+            if not delay:
+                return
+            await asyncio.sleep(delay)
+
+    def release(self):
+        """Повертає невикористаний токен"""
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    def pause(self, seconds: float):
+        """Призупиняє видачу токенів (наприклад, після відповіді 429)"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def is_idle(self) -> bool:
+        now = time.monotonic()
+        self._refill(now)
+        return self.tokens >= self.capacity and now >= self.paused_until
+
+
+@dataclass
+class Outgoing:
+    """Вихідне повідомлення: нове (send_message) або редагування наявного (edit_message_text)"""
+    chat_id: int
+    text: str
+    edit_message_id: int = None
+    pin: bool = False  # Закріпити нове повідомлення в чаті без звукового сповіщення
+    on_sent: object = None  # Викликається з надісланим повідомленням (наприклад, щоб запам'ятати message_id)
+    key: object = None  # Ключ помилки в DeliveryReport.errors; типово chat_id
+
+
+@dataclass
+class DeliveryReport:
+    """Звіт про доставку однієї розсилки"""
+    total: int
+    sent: int = 0
+    failed: int = 0
+    retries: int = 0
+    errors: dict = field(default_factory=dict)  # {Outgoing.key або chat_id: текст помилки}
+    started: float = field(default_factory=time.monotonic)
+    finished: float = None
+
+    @property
+    def pending(self) -> int:
+        return self.total - self.sent - self.failed
+
+    def summary(self) -> str:
+        elapsed = (self.finished or time.monotonic()) - self.started
+        return f"доставлено {self.sent} з {self.total}, помилок {self.failed}, повторів {self.retries}, {elapsed:.1f} с"
+
+
+class Delivery:
+    """Розсилка, поставлена в чергу Notifier; wait() повертає DeliveryReport"""
+
+    def __init__(self, name: str, total: int):
+        self.name = name
+        self.report = DeliveryReport(total=total)
+        self._done = asyncio.get_running_loop().create_future()
+        if total == 0:
+            self._finish()
+
+    def _record(self, message: Outgoing, error: Exception = None):
+        if error is None:
+            self.report.sent += 1
+        else:
+            self.report.failed += 1
+            key = message.chat_id if message.key is None else message.key
+            self.report.errors[key] = str(error)
+        if self.report.pending == 0:
+            self._finish()
+
+    def _finish(self):
+        self.report.finished = time.monotonic()
+        if not self._done.done():
+            self._done.set_result(self.report)
+        logger.info(f"Розсилка '{self.name}': {self.report.summary()}")
+
+    def done(self) -> bool:
+        return self._done.done()
+
+    async def wait(self) -> DeliveryReport:
+        return await asyncio.shield(self._done)
+
+
+class Notifier:
+    """Фоновий рушій розсилки з обмеженим пулом обробників і обмеженням швидкості.
+
+    Повідомлення ставляться в чергу через submit() і надсилаються воркерами з
+    урахуванням глобального ліміту та ліміту на чат. На відповідь 429 чат
+    і глобальне відро призупиняються на retry_after секунд, а повідомлення повертається в чергу.
+    Підходить будь-який об'єкт bot з корутиною send_message(chat_id=..., text=...);
+    для Outgoing з edit_message_id або pin потрібні також edit_message_text і pin_chat_message.
+    """
+
+    def __init__(self, workers: int = 8, global_rate: float = GLOBAL_RATE, per_chat_rate: float = PER_CHAT_RATE,
+                 max_retries: int = 3):
+        self.workers = workers
+        self.per_chat_rate = per_chat_rate
+        self.max_retries = max_retries
+        self.global_bucket = TokenBucket(global_rate)
+        self.chat_buckets = {}  # {chat_id: TokenBucket}
+        self._queue = None
+        self._tasks = []
+        self._delayed = set()  # Таймери повторних спроб
+
+    @property
+    def pending(self) -> int:
+        """Кількість повідомлень, що ще очікують надсилання"""
+        queued = self._queue.qsize() if self._queue is not None else 0
+        return queued + len(self._delayed)
+
+    def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"Рушій розсилки запущено з {self.workers} воркерами")
+
+    def submit(self, bot, messages, name: str = "розсилка") -> Delivery:
+        """Ставить у чергу список (chat_id, text) або Outgoing і одразу повертає Delivery"""
+        self.start()
+        messages = [message if isinstance(message, Outgoing) else Outgoing(*message) for message in messages]
+        delivery = Delivery(name, len(messages))
+        for message in messages:
+            self._queue.put_nowait((delivery, bot, message, 0))
+        return delivery
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self.chat_buckets) > 10_000:
+                # Прибираємо відра чатів, які давно нічого не отримували
+                self.chat_buckets = {cid: b for cid, b in self.chat_buckets.items() if not b.is_idle()}
+            bucket = self.chat_buckets[chat_id] = TokenBucket(self.per_chat_rate, capacity=1.0)
+        return bucket
+
+    async def _acquire(self, chat_id: int):
+        """Забирає токени чату й глобального відра одночасно.
+
+        Якщо чекати на глобальне відро, уже тримаючи токен чату, повідомлення
+        в один чат можуть піти щільніше за per_chat_rate, тому токен чату
+        повертається, доки глобального токена немає.
+        """
+        chat_bucket = self._chat_bucket(chat_id)
+        while True:
+            delay = chat_bucket.try_acquire()
+            if not delay:
+                delay = self.global_bucket.try_acquire()
+                if not delay:
+                    return
+                chat_bucket.release()
+            await asyncio.sleep(delay)
+
+    def _retry_later(self, item, delay: float):
+        def requeue():
+            self._delayed.discard(handle)
+            self._queue.put_nowait(item)
+        handle = asyncio.get_running_loop().call_later(delay, requeue)
+        self._delayed.add(handle)
+
+    async def _worker(self, number: int):
+        while True:
+            item = await self._queue.get()
+            delivery, bot, message, attempt = item
+            chat_id = message.chat_id
+            try:
+                await self._acquire(chat_id)
+                if message.edit_message_id is not None:
+                    sent = await bot.edit_message_text(
+                        chat_id=chat_id, message_id=message.edit_message_id, text=message.text
+                    )
+                else:
+                    sent = await bot.send_message(chat_id=chat_id, text=message.text)
+                    if message.pin:
+                        try:
+                            await bot.pin_chat_message(
+                                chat_id=chat_id, message_id=sent.message_id, disable_notification=True
+                            )
+                        except Exception as e:
+                            # Повідомлення вже надіслано, тому не повторюємо його через невдале закріплення
+                            logger.warning(f"Не вдалося закріпити повідомлення для {chat_id}: {e}")
+                if message.on_sent is not None:
+                    message.on_sent(sent)
+                logger.debug(f"Повідомлення ({delivery.name}) надіслано користувачу {chat_id}")
+                delivery._record(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                retry_after = getattr(e, "retry_after", None)
+                if retry_after is not None and attempt < self.max_retries:
+                    logger.warning(f"Ліміт Telegram для {chat_id}, повтор через {retry_after} с")
+                    # Flood-wait Telegram діє на весь бот, тож зупиняємо і решту воркерів
+                    self._chat_bucket(chat_id).pause(retry_after)
+                    self.global_bucket.pause(retry_after)
+                    delivery.report.retries += 1
+                    self._retry_later((delivery, bot, message, attempt + 1), retry_after)
+                else:
+                    logger.error(f"Помилка надсилання ({delivery.name}) користувачу {chat_id}: {e}")
+                    delivery._record(message, e)
+            finally:
+                self._queue.task_done()
+
+    async def stop(self, timeout: float = 10.0):
+        """Чекає (не довше timeout) на доставку черги і зупиняє воркерів"""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._drain(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Рушій розсилки зупинено з {self.pending} ненадісланими повідомленнями")
+        for handle in self._delayed:
+            handle.cancel()
+        self._delayed.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _drain(self):
+        while True:
+            await self._queue.join()
+            if not self._delayed:
+                return
+            await asyncio.sleep(0.1)
@@ -0,0 +1,320 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+import mysql.connector
+
+from notifier import Outgoing
+
+logger = logging.getLogger(__name__)
+
+# Пріоритети: сповіщення про рух черги не повинні чекати, поки дійде велике оголошення
+PRIORITY_QUEUE = 0
+PRIORITY_BROADCAST = 1
+
+OUTBOX_TABLES = (
+    """
+    CREATE TABLE IF NOT EXISTS outbox_batches (
+        batch_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        admin_id BIGINT NULL,
+        total INT NOT NULL,
+        created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        finished_at DATETIME NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS outbox_messages (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        batch_id BIGINT NOT NULL,
+        chat_id BIGINT NOT NULL,
+        text TEXT NOT NULL,
+        priority TINYINT NOT NULL DEFAULT 1,
+        status ENUM('pending', 'sending', 'sent', 'failed') NOT NULL DEFAULT 'pending',
+        attempts INT NOT NULL DEFAULT 0,
+        claimed_at DATETIME NULL,
+        error VARCHAR(255) NULL,
+        UNIQUE KEY uq_outbox_batch_chat (batch_id, chat_id),
+        KEY idx_outbox_status (status, priority, id),
+        FOREIGN KEY (batch_id) REFERENCES outbox_batches(batch_id) ON DELETE CASCADE
+    )
+    """,
+)
+
+
+@dataclass(frozen=True)
+class OutboxBatch:
+    batch_id: int
+    name: str
+    total: int
+
+
+class Outbox:
+    """Стійка черга вихідних повідомлень у таблицях outbox_batches і outbox_messages.
+
+    enqueue() записує розсилку в базу даних однією транзакцією, а фоновий
+    диспетчер забирає пакети рядків 'pending', надсилає їх через Notifier і
+    позначає 'sent' або 'failed'. Після падіння бота рядки, що залишилися
+    'sending' довше claim_timeout, повертаються в 'pending', тому розсилка
+    продовжується з місця зупинки; одержувач пакета, який надсилався в момент
+    падіння, може отримати повідомлення вдруге, але ніколи не втратить його.
+    Раз на purge_interval секунд розсилки, завершені понад keep_days днів тому,
+    видаляються разом з їхніми рядками (0 днів — зберігати все).
+    """
+
+    def __init__(self, db, notifier, batch_size: int = 100, poll_interval: float = 1.0,
+                 claim_timeout: float = 300.0, max_attempts: int = 3, progress_interval: float = 30.0,
+                 keep_days: int = 7, purge_interval: float = 3600.0, purge_chunk_size: int = 1000):
+        self.db = db
+        self.notifier = notifier
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.claim_timeout = claim_timeout
+        self.max_attempts = max_attempts
+        self.progress_interval = progress_interval
+        self.keep_days = keep_days
+        self.purge_interval = purge_interval
+        self.purge_chunk_size = purge_chunk_size
+        self._next_purge = 0.0
+        self._bot = None
+        self._task = None
+        self._wakeup = None
+        self._claimed = []  # Рядки поточного пакета: [(id, batch_id, chat_id, text, attempts)]
+        self._last_progress = {}  # Час останнього звіту адміністратору: {batch_id: monotonic}
+
+    @staticmethod
+    def create_tables(cursor):
+        for statement in OUTBOX_TABLES:
+            cursor.execute(statement)
+
+    async def enqueue(self, name: str, messages, admin_id: int = None, priority: int = PRIORITY_BROADCAST) -> OutboxBatch:
+        """Зберігає розсилку (список (chat_id, text)); admin_id отримає звіт про доставку"""
+        # Один одержувач отримує повідомлення розсилки один раз
+        messages = list(dict(messages).items())
+
+        def work(cursor):
+            cursor.execute(
+                "INSERT INTO outbox_batches (name, admin_id, total) VALUES (%s, %s, %s)",
+                (name, admin_id, len(messages))
+            )
+            batch_id = cursor.lastrowid
+            if messages:
+                cursor.executemany(
+                    "INSERT INTO outbox_messages (batch_id, chat_id, text, priority) VALUES (%s, %s, %s, %s)",
+                    [(batch_id, chat_id, text, priority) for chat_id, text in messages]
+                )
+            else:
+                cursor.execute("UPDATE outbox_batches SET finished_at = %s WHERE batch_id = %s",
+                               (datetime.now(), batch_id))
+            return batch_id
+
+        batch_id = await self.db.run(work)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return OutboxBatch(batch_id, name, len(messages))
+
+    async def pending(self) -> int:
+        """Кількість повідомлень, що ще не доставлені"""
+        row = await self.db.fetchone("SELECT COUNT(*) FROM outbox_messages WHERE status IN ('pending', 'sending')")
+        return row[0]
+
+    def start(self, bot):
+        if self._task is not None:
+            return
+        self._bot = bot
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Диспетчер вихідних повідомлень запущено")
+
+    async def _run(self):
+        while True:
+            try:
+                if self.keep_days > 0 and time.monotonic() >= self._next_purge:
+                    self._next_purge = time.monotonic() + self.purge_interval
+                    await self.purge()
+                rows = await self._claim()
+                if rows:
+                    await self._deliver(rows)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Диспетчер не повинен зупинятися: рядки повернуться в роботу після claim_timeout
+                logger.error(f"Помилка диспетчера вихідних повідомлень: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def purge(self) -> int:
+        """Видаляє рядки розсилок, завершених понад keep_days днів тому; повертає кількість видалених рядків"""
+        cutoff = datetime.now() - timedelta(days=self.keep_days)
+        removed = 0
+        # Рядки видаляються короткими транзакціями по purge_chunk_size, щоб не блокувати диспетчер
+        while True:
+            rows = await self.db.fetchall(
+                "SELECT m.id FROM outbox_messages m JOIN outbox_batches b ON b.batch_id = m.batch_id "
+                "WHERE b.finished_at < %s LIMIT %s",
+                (cutoff, self.purge_chunk_size)
+            )
+            if not rows:
+                break
+            removed += await self.db.execute(
+                f"DELETE FROM outbox_messages WHERE id IN ({', '.join(['%s'] * len(rows))})",
+                [row[0] for row in rows]
+            )
+            await asyncio.sleep(0.1)
+        batches = await self.db.execute("DELETE FROM outbox_batches WHERE finished_at < %s", (cutoff,))
+        if removed or batches:
+            logger.info(f"Видалено завершені розсилки, старші за {self.keep_days} дн.: {batches}, "
+                        f"їхніх повідомлень: {removed}")
+        return removed
+
+    async def _claim(self):
+        """Позначає пакет рядків 'sending' і повертає їх"""
+        now = datetime.now()
+        stale = now - timedelta(seconds=self.claim_timeout)
+
+        def work(cursor):
+            # Повертаємо рядки, захоплені процесом, який впав
+            cursor.execute(
+                "UPDATE outbox_messages SET status = 'pending' WHERE status = 'sending' AND claimed_at < %s", (stale,)
+            )
+            cursor.execute(
+                "SELECT id, batch_id, chat_id, text, attempts FROM outbox_messages WHERE status = 'pending' "
+                "ORDER BY priority, id LIMIT %s FOR UPDATE SKIP LOCKED",
+                (self.batch_size,)
+            )
+            rows = cursor.fetchall()
+            if rows:
+                cursor.execute(
+                    f"UPDATE outbox_messages SET status = 'sending', claimed_at = %s "
+                    f"WHERE id IN ({', '.join(['%s'] * len(rows))})",
+                    (now, *(row[0] for row in rows))
+                )
+            return rows
+
+        self._claimed = await self.db.run(work)
+        return self._claimed
+
+    async def _deliver(self, rows):
+        # Результати ключуються id рядка: у пакеті можуть бути рядки різних розсилок для одного чату
+        delivery = self.notifier.submit(
+            self._bot, [Outgoing(chat_id, text, key=message_id) for message_id, _, chat_id, text, _ in rows],
+            name=f"вихідні ({len(rows)})"
+        )
+        report = await delivery.wait()
+        sent, retry, failed = [], [], []
+        for message_id, _, _, _, attempts in rows:
+            error = report.errors.get(message_id)
+            if error is None:
+                sent.append(message_id)
+            elif attempts + 1 < self.max_attempts:
+                retry.append((error[:255], message_id))
+            else:
+                failed.append((error[:255], message_id))
+
+        def work(cursor):
+            if sent:
+                cursor.execute(
+                    f"UPDATE outbox_messages SET status = 'sent', attempts = attempts + 1 "
+                    f"WHERE id IN ({', '.join(['%s'] * len(sent))})",
+                    sent
+                )
+            if retry:
+                cursor.executemany(
+                    "UPDATE outbox_messages SET status = 'pending', attempts = attempts + 1, error = %s WHERE id = %s",
+                    retry
+                )
+            if failed:
+                cursor.executemany(
+                    "UPDATE outbox_messages SET status = 'failed', attempts = attempts + 1, error = %s WHERE id = %s",
+                    failed
+                )
+
+        try:
+            await self.db.run(work)
+        except mysql.connector.Error as e:
+            # Рядки залишаться 'sending' і повернуться в роботу після claim_timeout
+            logger.error(f"Помилка оновлення стану вихідних повідомлень: {e}")
+            return
+        await self._report_progress({batch_id for _, batch_id, _, _, _ in rows})
+        self._claimed = []
+
+    async def _report_progress(self, batch_ids):
+        """Надсилає адміністратору проміжний або підсумковий звіт про розсилку"""
+        for batch_id in batch_ids:
+            def work(cursor):
+                cursor.execute(
+                    "SELECT name, admin_id, total, finished_at FROM outbox_batches WHERE batch_id = %s", (batch_id,)
+                )
+                batch = cursor.fetchone()
+                cursor.execute(
+                    "SELECT status, COUNT(*) FROM outbox_messages WHERE batch_id = %s GROUP BY status", (batch_id,)
+                )
+                counts = dict(cursor.fetchall())
+                finished = batch is not None and batch[3] is None and not counts.get("pending") and not counts.get("sending")
+                if finished:
+                    cursor.execute(
+                        "UPDATE outbox_batches SET finished_at = %s WHERE batch_id = %s AND finished_at IS NULL",
+                        (datetime.now(), batch_id)
+                    )
+                    finished = cursor.rowcount == 1  # Звіт надсилає лише один процес
+                return batch, counts, finished
+
+            try:
+                batch, counts, finished = await self.db.run(work)
+            except mysql.connector.Error as e:
+                logger.error(f"Помилка підрахунку прогресу розсилки {batch_id}: {e}")
+                continue
+            if batch is None:
+                continue
+            name, admin_id, total, _ = batch
+            summary = f"{name}: доставлено {counts.get('sent', 0)} з {total}, помилок {counts.get('failed', 0)}"
+            if finished:
+                self._last_progress.pop(batch_id, None)
+                logger.info(f"Розсилка завершена — {summary}")
+            else:
+                now = time.monotonic()
+                if now - self._last_progress.setdefault(batch_id, now) < self.progress_interval:
+                    continue
+                self._last_progress[batch_id] = now
+            if admin_id is None:
+                continue
+            try:
+                prefix = "📬" if finished else "⏳"
+                await self._bot.send_message(chat_id=admin_id, text=f"{prefix} {summary}")
+            except Exception as e:
+                logger.error(f"Помилка надсилання звіту про розсилку адміністратору {admin_id}: {e}")
+
+    async def stop(self, timeout: float = 10.0):
+        """Чекає (не довше timeout) на поточний пакет і повертає недоставлені рядки в 'pending'"""
+        if self._task is None:
+            return
+        if self._claimed:
+            try:
+                await asyncio.wait_for(self._wait_idle(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        if self._claimed:
+            ids = [row[0] for row in self._claimed]
+            try:
+                await self.db.execute(
+                    f"UPDATE outbox_messages SET status = 'pending' "
+                    f"WHERE status = 'sending' AND id IN ({', '.join(['%s'] * len(ids))})",
+                    ids
+                )
+                logger.warning(f"Повернено в чергу недоставлених повідомлень: {len(ids)}")
+            except mysql.connector.Error as e:
+                logger.error(f"Помилка повернення вихідних повідомлень у чергу: {e}")
+            self._claimed = []
+
+    async def _wait_idle(self):
+        while self._claimed:
+            await asyncio.sleep(0.05)
@@ -0,0 +1,576 @@
+import asyncio
+import contextlib
+import logging
+from datetime import datetime
+from itertools import groupby
+
+import mysql.connector
+
+from logging_setup import HOT_PATH
+from university_queue import UniversityQueue
+
+logger = logging.getLogger(__name__)
+
+
+def _delete_members(cursor, university_id: int, user_ids):
+    """Видаляє користувачів з черги університету одним запитом"""
+    if user_ids:
+        cursor.execute(
+            f"DELETE FROM queue WHERE university_id = %s AND user_id IN ({', '.join(['%s'] * len(user_ids))})",
+            (university_id, *user_ids)
+        )
+
+
+class MemoryQueueState:
+    """Черги в пам'яті одного процесу з інкрементальним збереженням у таблицю queue.
+
+    Підходить лише для одного екземпляра бота: інші процеси не бачать змін,
+    доки не перезавантажать черги з бази даних.
+
+    Ідентифікатори та час входу зберігаються в масивах UniversityQueue, а
+    ім'я користувача — один раз у спільній таблиці names, навіть якщо він
+    стоїть у кількох чергах.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.queues = {}  # Словник черг: {university_id: UniversityQueue}
+        self.names = {}  # Спільна таблиця імен тих, хто стоїть хоча б в одній черзі: {user_id: user_name}
+        self.pending_changes = []  # Незбережені зміни черг: [(дія, user_id, university_id, join_time)]
+        self.revision = 0  # Лічильник змін, щоб не перезаписувати незмінний знімок
+        self.versions = {}  # Версії окремих черг для кешу відображення: {university_id: лічильник змін}
+        self._journal = None  # Зміни під час звірки з базою даних (reconcile)
+        # Збереження однієї черги виконуються по черзі, щоб пізніші зміни не потрапили в базу даних раніше
+        # за попередні; збереження різних черг не чекають одне на одного: {university_id: asyncio.Lock}
+        self._flush_locks = {}
+
+    def _replace(self, rows):
+        """Замінює стан черг рядками (user_id, user_name, university_id, join_time) у порядку черги"""
+        queues, names = {}, {}
+        for user_id, user_name, university_id, join_time in rows:
+            user_ids, joined = queues.setdefault(university_id, ([], []))
+            user_ids.append(user_id)
+            joined.append(join_time.timestamp())
+            names[user_id] = user_name
+        self.queues = {
+            university_id: UniversityQueue(user_ids, joined) for university_id, (user_ids, joined) in queues.items()
+        }
+        self.names = names
+        self.revision += 1
+        for university_id in self.versions.keys() | self.queues.keys():
+            self._bump(university_id)
+
+    async def _fetch_rows(self):
+        return await self.db.fetchall("""
+            SELECT q.user_id, u.user_name, q.university_id, q.join_time
+            FROM queue q
+            JOIN users u ON q.user_id = u.user_id
+            ORDER BY q.seq
+        """)
+
+    async def load(self):
+        """Завантаження черг з бази даних для всіх університетів"""
+        self.pending_changes = []
+        try:
+            self._replace(await self._fetch_rows())
+            logger.info("Черги успішно завантажені з бази даних")
+        except mysql.connector.Error as e:
+            self._replace([])
+            logger.error(f"Помилка завантаження черг: {e}")
+
+    def _rows(self):
+        """Усі записи черг: (user_id, user_name, university_id, join_time) у порядку черги"""
+        for university_id, queue in self.queues.items():
+            for user_id in queue:
+                yield user_id, self.names[user_id], university_id, datetime.fromtimestamp(queue.joined_at(user_id))
+
+    def dump(self) -> dict:
+        """Стан черг для знімка: {university_id: [[user_id, user_name, join_time], ...]}"""
+        queues = {}
+        for user_id, user_name, university_id, join_time in self._rows():
+            queues.setdefault(str(university_id), []).append([user_id, user_name, join_time.isoformat()])
+        return queues
+
+    def restore(self, queues: dict):
+        """Відновлює стан черг зі знімка, створеного dump()"""
+        self.pending_changes = []
+        self._replace(
+            (user_id, user_name, int(university_id), datetime.fromisoformat(join_time))
+            for university_id, entries in queues.items()
+            for user_id, user_name, join_time in entries
+        )
+
+    async def reconcile(self) -> int:
+        """Звіряє черги, відновлені зі знімка, з базою даних і повертає кількість черг із розбіжностями.
+
+        Джерело істини — таблиця queue. Зміни, зроблені після відновлення,
+        спершу зберігаються, а зміни, що відбулися під час звірки, повторно
+        застосовуються поверх стану з бази даних (вони ідемпотентні).
+        """
+        self._journal = list(self.pending_changes)
+        try:
+            await self.flush()
+            rows = await self._fetch_rows()
+        finally:
+            journal, self._journal = self._journal, None
+        before = {university_id: list(queue) for university_id, queue in self.queues.items()}
+        names = self.names
+        self._replace(rows)
+        for action, user_id, university_id, join_time in journal:
+            queue = self.queues.setdefault(university_id, UniversityQueue())
+            if action == "join" and user_id not in queue:
+                queue.append(user_id, join_time.timestamp())
+                self.names.setdefault(user_id, names.get(user_id, ""))
+            elif action == "leave" and user_id in queue:
+                queue.remove(user_id)
+                self._release_name(user_id)
+            if not queue:
+                del self.queues[university_id]
+        after = {university_id: list(queue) for university_id, queue in self.queues.items()}
+        return sum(before.get(university_id) != after.get(university_id) for university_id in before.keys() | after.keys())
+
+    def _bump(self, university_id: int):
+        self.versions[university_id] = self.versions.get(university_id, 0) + 1
+
+    def _track_change(self, action: str, user_id: int, university_id: int, join_time=None):
+        """Запам'ятовує зміну черги для наступного flush"""
+        self.pending_changes.append((action, user_id, university_id, join_time))
+        if self._journal is not None:
+            self._journal.append((action, user_id, university_id, join_time))
+        self.revision += 1
+        self._bump(university_id)
+
+    def _release_name(self, user_id: int):
+        """Прибирає ім'я зі спільної таблиці, коли користувач не стоїть у жодній черзі"""
+        if not any(user_id in queue for queue in self.queues.values()):
+            self.names.pop(user_id, None)
+
+    def _forget(self, user_id: int, university_id: int) -> str:
+        user_name = self.names[user_id]
+        self._track_change("leave", user_id, university_id)
+        if not self.queues[university_id]:
+            del self.queues[university_id]
+        self._release_name(user_id)
+        return user_name
+
+    async def join(self, university_id: int, user_id: int, user_name: str, join_time):
+        """Додає користувача в кінець черги; повертає позицію або None, якщо він уже в черзі"""
+        queue = self.queues.setdefault(university_id, UniversityQueue())
+        if user_id in queue:
+            return None
+        if self.names.get(user_id, user_name) != user_name:
+            # Нове ім'я видно й у тих чергах, де користувач уже стоїть
+            for other_id, other in self.queues.items():
+                if user_id in other:
+                    self._bump(other_id)
+        queue.append(user_id, join_time.timestamp())
+        self.names[user_id] = user_name
+        self._track_change("join", user_id, university_id, join_time)
+        return len(queue)
+
+    async def leave(self, university_id: int, user_id: int):
+        """Видаляє користувача з черги; повертає його ім'я або None"""
+        queue = self.queues.get(university_id)
+        if queue is None or user_id not in queue:
+            return None
+        queue.remove(user_id)
+        return self._forget(user_id, university_id)
+
+    async def pop_first(self, university_id: int):
+        """Видаляє першого з черги; повертає (user_id, user_name) або None"""
+        queue = self.queues.get(university_id)
+        if not queue:
+            return None
+        user_id = queue.popleft()
+        return user_id, self._forget(user_id, university_id)
+
+    async def first(self, university_id: int):
+        queue = self.queues.get(university_id)
+        if not queue:
+            return None
+        user_id = queue.first()
+        return user_id, self.names[user_id]
+
+    async def position(self, university_id: int, user_id: int):
+        """Повертає (позиція, user_name) або None, якщо користувача немає в черзі"""
+        queue = self.queues.get(university_id)
+        if queue is None or user_id not in queue:
+            return None
+        return queue.position(user_id), self.names[user_id]
+
+    async def members(self, university_id: int):
+        """Учасники черги по порядку: [(user_id, user_name)]"""
+        names = self.names
+        return [(user_id, names[user_id]) for user_id in self.queues.get(university_id, ())]
+
+    async def window(self, university_id: int, start: int, count: int):
+        """Учасники на позиціях start..start+count-1: [(user_id, user_name)]"""
+        queue = self.queues.get(university_id)
+        if queue is None:
+            return []
+        names = self.names
+        return [(user_id, names[user_id]) for user_id in queue.window(start, count)]
+
+    async def size(self, university_id: int) -> int:
+        return len(self.queues.get(university_id, ()))
+
+    async def version(self, university_id: int):
+        """Значення, що змінюється з кожною зміною черги університету"""
+        return self.versions.get(university_id, 0)
+
+    async def lengths(self) -> dict:
+        """Довжини всіх непорожніх черг: {university_id: кількість}"""
+        return {university_id: len(queue) for university_id, queue in self.queues.items()}
+
+    async def pop_many(self, university_id: int, count: int):
+        """Видаляє перших count користувачів; повертає [(user_id, user_name)]"""
+        queue = self.queues.get(university_id)
+        popped = []
+        while queue and len(popped) < count:
+            user_id = queue.popleft()
+            popped.append((user_id, self._forget(user_id, university_id)))
+        return popped
+
+    async def remove_many(self, university_id: int, user_ids):
+        """Видаляє вказаних користувачів з черги; повертає [(user_id, user_name)] тих, хто в ній був"""
+        queue = self.queues.get(university_id)
+        removed = []
+        for user_id in dict.fromkeys(user_ids):
+            if queue and user_id in queue:
+                queue.remove(user_id)
+                removed.append((user_id, self._forget(user_id, university_id)))
+        return removed
+
+    async def clear(self, university_id: int):
+        """Очищує чергу; повертає [(user_id, user_name)] усіх, хто в ній був"""
+        return await self.pop_many(university_id, await self.size(university_id))
+
+    def _requeue(self, university_id: int, user_ids):
+        """Записує user_ids у кінець черги в базі даних (нові seq) у поточному порядку"""
+        queue = self.queues[university_id]
+        for user_id in user_ids:
+            self._track_change("leave", user_id, university_id)
+        for user_id in user_ids:
+            self._track_change("join", user_id, university_id, datetime.fromtimestamp(queue.joined_at(user_id)))
+
+    async def move(self, university_id: int, user_id: int, position: int):
+        """Переміщує користувача на позицію position; повертає (стара, нова позиція) або None"""
+        queue = self.queues.get(university_id)
+        if queue is None or user_id not in queue:
+            return None
+        old = queue.position(user_id)
+        position = max(1, min(position, len(queue)))
+        if old == position:
+            return old, position
+        order = list(queue)
+        joined = [queue.joined_at(member) for member in order]
+        order.insert(position - 1, order.pop(old - 1))
+        joined.insert(position - 1, joined.pop(old - 1))
+        self.queues[university_id] = UniversityQueue(order, joined)
+        # Порядок у таблиці queue задає seq, тож перезаписуємо лише хвіст, що змінився
+        self._requeue(university_id, order[min(old, position) - 1:])
+        return old, position
+
+    async def transfer(self, source_id: int, target_id: int, start_position: int = 1):
+        """Переносить учасників source_id з позиції start_position у кінець черги target_id.
+
+        Хто вже стоїть у цільовій черзі, зберігає там своє місце. Повертає
+        [(user_id, user_name)] перенесених.
+        """
+        source = self.queues.get(source_id)
+        if not source or source_id == target_id:
+            return []
+        target = self.queues.setdefault(target_id, UniversityQueue())
+        moved = []
+        for user_id in list(source)[max(start_position, 1) - 1:]:
+            joined = source.joined_at(user_id)
+            source.remove(user_id)
+            self._track_change("leave", user_id, source_id)
+            if user_id not in target:
+                target.append(user_id, joined)
+                self._track_change("join", user_id, target_id, datetime.fromtimestamp(joined))
+                moved.append((user_id, self.names[user_id]))
+        for university_id in (source_id, target_id):
+            if not self.queues[university_id]:
+                del self.queues[university_id]
+        return moved
+
+    @contextlib.asynccontextmanager
+    async def _flushing(self, university_ids):
+        """Блокує збереження вказаних черг (у порядку зростання ідентифікаторів, щоб уникнути взаємоблокування)"""
+        async with contextlib.AsyncExitStack() as stack:
+            for university_id in sorted(university_ids):
+                await stack.enter_async_context(self._flush_locks.setdefault(university_id, asyncio.Lock()))
+            yield
+
+    async def flush(self, university_ids=None):
+        """Збереження змін черг university_ids (усіх, якщо None), накопичених з моменту попереднього збереження"""
+        if university_ids is None:
+            university_ids = {university_id for _, _, university_id, _ in self.pending_changes}
+        university_ids = set(university_ids)
+        async with self._flushing(university_ids):
+            changes = [change for change in self.pending_changes if change[2] in university_ids]
+            if not changes:
+                return
+            self.pending_changes = [change for change in self.pending_changes if change[2] not in university_ids]
+
+            def apply_changes(cursor):
+                # Послідовні однакові зміни записуються пакетом, зберігаючи загальний порядок
+                for action, run in groupby(changes, key=lambda change: change[0]):
+                    run = list(run)
+                    if action == "join":
+                        cursor.executemany(
+                            "INSERT INTO queue (user_id, university_id, join_time) VALUES (%s, %s, %s) "
+                            "ON DUPLICATE KEY UPDATE join_time = VALUES(join_time)",
+                            [(user_id, university_id, join_time) for _, user_id, university_id, join_time in run]
+                        )
+                        continue
+                    by_university = {}
+                    for _, user_id, university_id, _ in run:
+                        by_university.setdefault(university_id, []).append(user_id)
+                    for university_id, user_ids in by_university.items():
+                        _delete_members(cursor, university_id, user_ids)
+
+            try:
+                await self.db.run(apply_changes)
+                logger.info(f"Збережено змін черг: {len(changes)}", extra=HOT_PATH)
+            except mysql.connector.Error as e:
+                # Повертаємо зміни на початок, щоб не втратити їх при наступному збереженні
+                self.pending_changes[:0] = changes
+                logger.error(f"Помилка збереження черг: {e}")
+
+    async def sync(self):
+        """Повна синхронізація всіх черг з базою даних одним пакетним записом"""
+        async with self._flushing(self._flush_locks.keys() | self.queues.keys()):
+            changes, self.pending_changes = self.pending_changes, []
+            rows = [(user_id, university_id, join_time) for user_id, _, university_id, join_time in self._rows()]
+
+            def replace_queue(cursor):
+                cursor.execute("DELETE FROM queue")
+                if rows:
+                    cursor.executemany("INSERT INTO queue (user_id, university_id, join_time) VALUES (%s, %s, %s)", rows)
+
+            try:
+                await self.db.run(replace_queue)
+                logger.info(f"Черги повністю синхронізовані з базою даних ({len(rows)} записів)")
+            except mysql.connector.Error as e:
+                self.pending_changes[:0] = changes
+                logger.error(f"Помилка синхронізації черг: {e}")
+
+
+class DatabaseQueueState:
+    """Черги безпосередньо в таблиці queue, спільні для кількох процесів бота.
+
+    Порядок у черзі задає атомарна послідовність seq (AUTO_INCREMENT), а
+    зміни однієї черги серіалізуються блокуванням рядка університету
+    (SELECT ... FOR UPDATE) в межах транзакції.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    @staticmethod
+    def _lock_university(cursor, university_id: int):
+        cursor.execute("SELECT university_id FROM universities WHERE university_id = %s FOR UPDATE", (university_id,))
+        cursor.fetchall()
+
+    async def load(self):
+        """Стан живе в базі даних, тому завантажувати нічого не потрібно"""
+
+    async def join(self, university_id: int, user_id: int, user_name: str, join_time):
+        def work(cursor):
+            self._lock_university(cursor, university_id)
+            cursor.execute("SELECT 1 FROM queue WHERE user_id = %s AND university_id = %s", (user_id, university_id))
+            if cursor.fetchone():
+                return None
+            cursor.execute(
+                "INSERT INTO queue (user_id, university_id, join_time) VALUES (%s, %s, %s)",
+                (user_id, university_id, join_time)
+            )
+            cursor.execute("SELECT COUNT(*) FROM queue WHERE university_id = %s", (university_id,))
+            return cursor.fetchone()[0]
+        return await self.db.run(work)
+
+    async def leave(self, university_id: int, user_id: int):
+        def work(cursor):
+            self._lock_university(cursor, university_id)
+            cursor.execute("""
+                SELECT u.user_name FROM queue q JOIN users u ON q.user_id = u.user_id
+                WHERE q.user_id = %s AND q.university_id = %s
+            """, (user_id, university_id))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            cursor.execute("DELETE FROM queue WHERE user_id = %s AND university_id = %s", (user_id, university_id))
+            return row[0]
+        return await self.db.run(work)
+
+    async def pop_first(self, university_id: int):
+        def work(cursor):
+            self._lock_university(cursor, university_id)
+            cursor.execute("""
+                SELECT q.user_id, u.user_name FROM queue q JOIN users u ON q.user_id = u.user_id
+                WHERE q.university_id = %s ORDER BY q.seq LIMIT 1
+            """, (university_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            cursor.execute("DELETE FROM queue WHERE user_id = %s AND university_id = %s", (row[0], university_id))
+            return row[0], row[1]
+        return await self.db.run(work)
+
+    async def first(self, university_id: int):
+        row = await self.db.fetchone("""
+            SELECT q.user_id, u.user_name FROM queue q JOIN users u ON q.user_id = u.user_id
+            WHERE q.university_id = %s ORDER BY q.seq LIMIT 1
+        """, (university_id,))
+        return (row[0], row[1]) if row else None
+
+    async def position(self, university_id: int, user_id: int):
+        def work(cursor):
+            cursor.execute("""
+                SELECT q.seq, u.user_name FROM queue q JOIN users u ON q.user_id = u.user_id
+                WHERE q.user_id = %s AND q.university_id = %s
+            """, (user_id, university_id))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            cursor.execute("SELECT COUNT(*) FROM queue WHERE university_id = %s AND seq <= %s", (university_id, row[0]))
+            return cursor.fetchone()[0], row[1]
+        return await self.db.run(work)
+
+    async def members(self, university_id: int):
+        rows = await self.db.fetchall("""
+            SELECT q.user_id, u.user_name FROM queue q JOIN users u ON q.user_id = u.user_id
+            WHERE q.university_id = %s ORDER BY q.seq
+        """, (university_id,))
+        return [(user_id, user_name) for user_id, user_name in rows]
+
+    async def window(self, university_id: int, start: int, count: int):
+        rows = await self.db.fetchall("""
+            SELECT q.user_id, u.user_name FROM queue q JOIN users u ON q.user_id = u.user_id
+            WHERE q.university_id = %s ORDER BY q.seq LIMIT %s OFFSET %s
+        """, (university_id, count, max(start, 1) - 1))
+        return [(user_id, user_name) for user_id, user_name in rows]
+
+    async def size(self, university_id: int) -> int:
+        row = await self.db.fetchone("SELECT COUNT(*) FROM queue WHERE university_id = %s", (university_id,))
+        return row[0]
+
+    async def version(self, university_id: int):
+        """(кількість, найбільший seq): вставка завжди збільшує seq, а видалення — зменшує кількість"""
+        row = await self.db.fetchone(
+            "SELECT COUNT(*), COALESCE(MAX(seq), 0) FROM queue WHERE university_id = %s", (university_id,)
+        )
+        return row[0], row[1]
+
+    async def lengths(self) -> dict:
+        rows = await self.db.fetchall("SELECT university_id, COUNT(*) FROM queue GROUP BY university_id")
+        return {university_id: count for university_id, count in rows}
+
+    @staticmethod
+    def _members_locked(cursor, university_id: int):
+        cursor.execute("""
+            SELECT q.user_id, u.user_name, q.join_time FROM queue q JOIN users u ON q.user_id = u.user_id
+            WHERE q.university_id = %s ORDER BY q.seq
+        """, (university_id,))
+        return cursor.fetchall()
+
+    @staticmethod
+    def _insert_members(cursor, university_id: int, rows):
+        """Додає (user_id, join_time) у кінець черги в заданому порядку"""
+        if rows:
+            cursor.executemany(
+                "INSERT INTO queue (user_id, university_id, join_time) VALUES (%s, %s, %s)",
+                [(user_id, university_id, join_time) for user_id, join_time in rows]
+            )
+
+    async def pop_many(self, university_id: int, count: int):
+        def work(cursor):
+            self._lock_university(cursor, university_id)
+            cursor.execute("""
+                SELECT q.user_id, u.user_name FROM queue q JOIN users u ON q.user_id = u.user_id
+                WHERE q.university_id = %s ORDER BY q.seq LIMIT %s
+            """, (university_id, count))
+            rows = cursor.fetchall()
+            _delete_members(cursor, university_id, [user_id for user_id, _ in rows])
+            return [(user_id, user_name) for user_id, user_name in rows]
+        return await self.db.run(work)
+
+    async def remove_many(self, university_id: int, user_ids):
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids:
+            return []
+
+        def work(cursor):
+            self._lock_university(cursor, university_id)
+            cursor.execute(f"""
+                SELECT q.user_id, u.user_name FROM queue q JOIN users u ON q.user_id = u.user_id
+                WHERE q.university_id = %s AND q.user_id IN ({', '.join(['%s'] * len(user_ids))}) ORDER BY q.seq
+            """, (university_id, *user_ids))
+            rows = cursor.fetchall()
+            _delete_members(cursor, university_id, [user_id for user_id, _ in rows])
+            return [(user_id, user_name) for user_id, user_name in rows]
+        return await self.db.run(work)
+
+    async def clear(self, university_id: int):
+        def work(cursor):
+            self._lock_university(cursor, university_id)
+            rows = self._members_locked(cursor, university_id)
+            cursor.execute("DELETE FROM queue WHERE university_id = %s", (university_id,))
+            return [(user_id, user_name) for user_id, user_name, _ in rows]
+        return await self.db.run(work)
+
+    async def move(self, university_id: int, user_id: int, position: int):
+        def work(cursor):
+            self._lock_university(cursor, university_id)
+            rows = self._members_locked(cursor, university_id)
+            order = [row[0] for row in rows]
+            if user_id not in order:
+                return None
+            old = order.index(user_id) + 1
+            new = max(1, min(position, len(rows)))
+            if old == new:
+                return old, new
+            rows.insert(new - 1, rows.pop(old - 1))
+            # Порядок задає seq, тож перезаписуємо лише хвіст, що змінився
+            tail = rows[min(old, new) - 1:]
+            _delete_members(cursor, university_id, [row[0] for row in tail])
+            self._insert_members(cursor, university_id, [(member, join_time) for member, _, join_time in tail])
+            return old, new
+        return await self.db.run(work)
+
+    async def transfer(self, source_id: int, target_id: int, start_position: int = 1):
+        if source_id == target_id:
+            return []
+
+        def work(cursor):
+            # Блокуємо обидва університети в одному порядку, щоб уникнути взаємного блокування
+            for university_id in sorted((source_id, target_id)):
+                self._lock_university(cursor, university_id)
+            moving = self._members_locked(cursor, source_id)[max(start_position, 1) - 1:]
+            if not moving:
+                return []
+            ids = [row[0] for row in moving]
+            cursor.execute(
+                f"SELECT user_id FROM queue WHERE university_id = %s AND user_id IN ({', '.join(['%s'] * len(ids))})",
+                (target_id, *ids)
+            )
+            already = {row[0] for row in cursor.fetchall()}
+            moved = [row for row in moving if row[0] not in already]
+            _delete_members(cursor, source_id, ids)
+            self._insert_members(cursor, target_id, [(user_id, join_time) for user_id, _, join_time in moved])
+            return [(user_id, user_name) for user_id, user_name, _ in moved]
+        return await self.db.run(work)
+
+    async def flush(self, university_ids=None):
+        """Кожна операція вже збережена у своїй транзакції"""
+
+    async def sync(self):
+        """Кожна операція вже збережена у своїй транзакції"""
+
+
+QUEUE_BACKENDS = {
+    "memory": MemoryQueueState,
+    "database": DatabaseQueueState,
+}
@@ -0,0 +1,171 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+from datetime import date, datetime, timedelta
+
+import mysql.connector
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_TABLE = """
+    CREATE TABLE IF NOT EXISTS history_daily (
+        day DATE NOT NULL,
+        university_id INT NOT NULL,
+        joins INT NOT NULL DEFAULT 0,
+        leaves INT NOT NULL DEFAULT 0,
+        calls INT NOT NULL DEFAULT 0,
+        broadcasts INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, university_id)
+    )
+"""
+
+# Стовпці денних підсумків: {префікс дії в user_history: стовпець history_daily}
+ROLLUP_COLUMNS = {
+    "join_queue": "joins",
+    "leave_queue": "leaves",
+    "next_in_queue": "calls",
+    "broadcast_message": "broadcasts",
+}
+
+# Таблиці, що очищаються: {таблиця: стовпці, які потрапляють в архів}
+RETAINED_TABLES = {
+    "user_history": ("id", "user_id", "action", "university_id", "timestamp"),
+    "broadcast_messages": ("id", "admin_id", "message_text", "timestamp"),
+}
+
+
+def _rollup(rows) -> tuple[dict, int]:
+    """Денні підсумки рядків user_history: ({(день, university_id): {стовпець: кількість}}, пропущено).
+
+    Рядки без university_id (старі записи) у підсумки не потрапляють, а лише
+    рахуються як пропущені: вони залишаються в архіві.
+    """
+    totals = {}
+    skipped = 0
+    for _, _, action, university_id, timestamp in rows:
+        column = next((column for prefix, column in ROLLUP_COLUMNS.items() if action.startswith(prefix)), None)
+        if column is None:
+            continue
+        if university_id is None:
+            skipped += 1
+            continue
+        counts = totals.setdefault((timestamp.date(), university_id), dict.fromkeys(ROLLUP_COLUMNS.values(), 0))
+        counts[column] += 1
+    return totals, skipped
+
+
+class HistoryRetention:
+    """Фонове обслуговування user_history і broadcast_messages.
+
+    Раз на interval секунд рядки, старші за retention_days днів, невеликими
+    порціями (chunk_size) дописуються в стиснений архів archive_dir і
+    видаляються. Перед видаленням події user_history додаються до денних
+    підсумків history_daily по університетах. Кожна порція — окрема коротка
+    транзакція, тож довгих блокувань таблиць немає. Архів пишеться до
+    видалення: після збою порція може потрапити в архів двічі, але не
+    загубиться, а підсумки рахуються в одній транзакції з видаленням лише
+    для рядків, які ще існують, тож не дублюються навіть при кількох процесах.
+    """
+
+    def __init__(self, db, retention_days: int, archive_dir: str, interval: float = 3600.0,
+                 chunk_size: int = 1000, pause: float = 0.1):
+        # Відносний шлях залежав би від робочого каталогу процесу, і архів видалених рядків легко загубити
+        if not archive_dir or not os.path.isabs(archive_dir):
+            raise ValueError(f"Каталог архіву історії має бути абсолютним шляхом, отримано: {archive_dir!r}")
+        self.db = db
+        self.retention_days = retention_days
+        self.archive_dir = archive_dir
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.pause = pause  # Перерва між порціями, щоб не забирати з'єднання в обробників
+        self._task = None
+
+    @staticmethod
+    def create_tables(cursor):
+        cursor.execute(ROLLUP_TABLE)
+
+    def _archive_path(self, table: str) -> str:
+        return os.path.join(self.archive_dir, f"{table}-{date.today():%Y%m%d}.jsonl.gz")
+
+    def _archive(self, table: str, rows):
+        """Дописує рядки в архів окремим gzip-членом (файл лишається коректним gzip) і скидає на диск"""
+        columns = RETAINED_TABLES[table]
+        os.makedirs(self.archive_dir, exist_ok=True)
+        lines = "".join(
+            json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=str) + "\n" for row in rows
+        )
+        with open(self._archive_path(table), "ab") as f:
+            f.write(gzip.compress(lines.encode("utf-8")))
+            f.flush()
+            os.fsync(f.fileno())
+
+    async def _expire_chunk(self, table: str, cutoff: datetime) -> int:
+        """Архівує та видаляє одну порцію застарілих рядків; повертає кількість видалених"""
+        columns = ", ".join(RETAINED_TABLES[table])
+        rows = await self.db.fetchall(
+            f"SELECT {columns} FROM {table} WHERE timestamp < %s ORDER BY timestamp, id LIMIT %s",
+            (cutoff, self.chunk_size)
+        )
+        if not rows:
+            return 0
+        await asyncio.to_thread(self._archive, table, rows)
+        ids = [row[0] for row in rows]
+        placeholders = ", ".join(["%s"] * len(ids))
+
+        def work(cursor):
+            if table == "user_history":
+                # Підсумовуємо лише рядки, які ще не видалив інший процес
+                cursor.execute(f"SELECT {columns} FROM user_history WHERE id IN ({placeholders}) FOR UPDATE", ids)
+                totals, skipped = _rollup(cursor.fetchall())
+                if skipped:
+                    logger.warning(f"Подій без університету не враховано в history_daily (лише архів): {skipped}")
+                if totals:
+                    cursor.executemany(
+                        "INSERT INTO history_daily (day, university_id, joins, leaves, calls, broadcasts) "
+                        "VALUES (%s, %s, %s, %s, %s, %s) ON DUPLICATE KEY UPDATE "
+                        "joins = joins + VALUES(joins), leaves = leaves + VALUES(leaves), "
+                        "calls = calls + VALUES(calls), broadcasts = broadcasts + VALUES(broadcasts)",
+                        [(day, university_id, counts["joins"], counts["leaves"], counts["calls"], counts["broadcasts"])
+                         for (day, university_id), counts in totals.items()]
+                    )
+            cursor.execute(f"DELETE FROM {table} WHERE id IN ({placeholders})", ids)
+            return cursor.rowcount
+
+        return await self.db.run(work)
+
+    async def run_once(self) -> dict:
+        """Один прохід обслуговування; повертає кількість видалених рядків: {таблиця: кількість}"""
+        cutoff = datetime.now() - timedelta(days=self.retention_days)
+        removed = {}
+        for table in RETAINED_TABLES:
+            removed[table] = 0
+            try:
+                while True:
+                    count = await self._expire_chunk(table, cutoff)
+                    if not count:
+                        break
+                    removed[table] += count
+                    await asyncio.sleep(self.pause)
+            except (mysql.connector.Error, OSError) as e:
+                logger.error(f"Помилка очищення {table}: {e}")
+        if any(removed.values()):
+            logger.info(f"Архівовано та видалено рядки, старші за {self.retention_days} дн.: "
+                        + ", ".join(f"{table} — {count}" for table, count in removed.items()))
+        return removed
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await self.run_once()
+            await asyncio.sleep(self.interval)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
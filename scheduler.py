@@ -0,0 +1,162 @@
+import asyncio
+import heapq
+import logging
+import time
+from datetime import datetime
+
+import mysql.connector
+
+logger = logging.getLogger(__name__)
+
+TIMERS_TABLE = """
+    CREATE TABLE IF NOT EXISTS queue_timers (
+        university_id INT NOT NULL,
+        kind VARCHAR(32) NOT NULL,
+        user_id BIGINT NOT NULL,
+        due_at DATETIME(3) NOT NULL,
+        PRIMARY KEY (university_id, kind),
+        KEY idx_queue_timers_due (due_at)
+    )
+"""
+
+
+class TimerScheduler:
+    """Єдиний планувальник таймерів черг на купі (heapq) з одним фоновим завданням.
+
+    На кожен університет і вид таймера ("remind", "no_show") існує не більше
+    одного таймера: повторне schedule() замінює попередній, cancel() скасовує.
+    Замінені записи видаляються з купи ліниво. Таймери зберігаються в таблиці
+    queue_timers і відновлюються load() після перезапуску; прострочені
+    спрацьовують одразу. handler(kind, university_id, user_id) викликається
+    лише тим процесом, який першим видалив рядок таймера з бази даних, в
+    окремому завданні, тож повільний обробник не затримує інші таймери.
+    """
+
+    def __init__(self, db, handler):
+        self.db = db
+        self.handler = handler
+        self._timers = {}  # {(university_id, kind): (due, user_id)}
+        self._heap = []  # [(due, university_id, kind, user_id)]
+        self._wakeup = None
+        self._task = None
+        self._firing = set()  # Завдання таймерів, що спрацювали й ще обробляються
+
+    @staticmethod
+    def create_tables(cursor):
+        cursor.execute(TIMERS_TABLE)
+
+    def __len__(self):
+        return len(self._timers)
+
+    def get(self, university_id: int, kind: str):
+        """Повертає (due, user_id) запланованого таймера або None"""
+        return self._timers.get((university_id, kind))
+
+    def _push(self, university_id: int, kind: str, user_id: int, due: float):
+        self._timers[(university_id, kind)] = (due, user_id)
+        heapq.heappush(self._heap, (due, university_id, kind, user_id))
+        if len(self._heap) > 2 * len(self._timers) + 64:
+            # Забагато замінених записів: перебудовуємо купу лише з актуальних таймерів
+            self._heap = [(due, uni, k, uid) for (uni, k), (due, uid) in self._timers.items()]
+            heapq.heapify(self._heap)
+        if self._wakeup is not None and self._heap[0][0] == due:
+            self._wakeup.set()
+
+    async def schedule(self, university_id: int, kind: str, user_id: int, delay: float):
+        """Планує (або переплановує) таймер через delay секунд"""
+        due = time.time() + delay
+        self._push(university_id, kind, user_id, due)
+        try:
+            await self.db.execute(
+                "INSERT INTO queue_timers (university_id, kind, user_id, due_at) VALUES (%s, %s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE user_id = VALUES(user_id), due_at = VALUES(due_at)",
+                (university_id, kind, user_id, datetime.fromtimestamp(due))
+            )
+        except mysql.connector.Error as e:
+            logger.error(f"Помилка збереження таймера {kind} для університету {university_id}: {e}")
+
+    async def cancel(self, university_id: int, *kinds: str):
+        """Скасовує таймери університету вказаних видів"""
+        removed = [kind for kind in kinds if self._timers.pop((university_id, kind), None) is not None]
+        if not removed:
+            return
+        try:
+            await self.db.execute(
+                f"DELETE FROM queue_timers WHERE university_id = %s AND kind IN ({', '.join(['%s'] * len(removed))})",
+                (university_id, *removed)
+            )
+        except mysql.connector.Error as e:
+            logger.error(f"Помилка скасування таймерів університету {university_id}: {e}")
+
+    async def load(self):
+        """Відновлює таймери з бази даних"""
+        try:
+            rows = await self.db.fetchall("SELECT university_id, kind, user_id, due_at FROM queue_timers")
+        except mysql.connector.Error as e:
+            logger.error(f"Помилка завантаження таймерів: {e}")
+            return
+        for university_id, kind, user_id, due_at in rows:
+            self._push(university_id, kind, user_id, due_at.timestamp())
+        logger.info(f"Відновлено таймерів черг: {len(rows)}")
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            timeout = None
+            while self._heap:
+                due, university_id, kind, user_id = self._heap[0]
+                if self._timers.get((university_id, kind)) != (due, user_id):
+                    heapq.heappop(self._heap)  # Замінений або скасований таймер
+                    continue
+                timeout = due - time.time()
+                if timeout > 0:
+                    break
+                heapq.heappop(self._heap)
+                del self._timers[(university_id, kind)]
+                task = asyncio.create_task(self._fire(university_id, kind, user_id))
+                self._firing.add(task)
+                task.add_done_callback(self._firing.discard)
+                timeout = None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire(self, university_id: int, kind: str, user_id: int):
+        try:
+            claimed = await self.db.execute(
+                "DELETE FROM queue_timers WHERE university_id = %s AND kind = %s AND user_id = %s",
+                (university_id, kind, user_id)
+            )
+            if not claimed:
+                return  # Таймер уже спрацював в іншому процесі або був перепланований
+        except mysql.connector.Error as e:
+            logger.error(f"Помилка видалення таймера {kind} для університету {university_id}: {e}")
+        try:
+            await self.handler(kind, university_id, user_id)
+        except Exception as e:
+            logger.error(f"Помилка обробки таймера {kind} для університету {university_id}: {e}")
+
+    async def stop(self, timeout: float = 10.0):
+        """Зупиняє фонове завдання і чекає (не довше timeout) на обробку таймерів, що вже спрацювали.
+
+        Збережені таймери, що ще не спрацювали, спрацюють після наступного запуску.
+        """
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        if self._firing:
+            _, pending = await asyncio.wait(set(self._firing), timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            if pending:
+                logger.warning(f"Зупинено необроблених таймерів: {len(pending)}")
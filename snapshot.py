@@ -0,0 +1,105 @@
+import asyncio
+import json
+import logging
+import os
+import time
+
+import mysql.connector
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 1
+
+
+class QueueSnapshot:
+    """Локальний знімок черг у пам'яті для швидкого старту після перезапуску.
+
+    Знімок записується у файл кожні interval секунд (якщо черги змінилися) і
+    під час зупинки. На старті restore() читає його замість повного
+    завантаження черг з бази даних, а start() у фоні звіряє відновлений стан
+    з таблицею queue, яка залишається джерелом істини.
+    """
+
+    def __init__(self, path: str, state, interval: float = 30.0):
+        self.path = path
+        self.state = state
+        self.interval = interval
+        self.restored = False
+        self._saved_revision = None
+        self._task = None
+        self._reconcile_task = None
+
+    def _read(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write(self, data):
+        # Пишемо в тимчасовий файл і атомарно замінюємо, щоб падіння не залишило пошкоджений знімок
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+    async def restore(self) -> bool:
+        """Відновлює черги зі знімка; повертає False, якщо знімка немає або його не вдалося прочитати"""
+        try:
+            data = await asyncio.to_thread(self._read)
+            if data.get("format") != SNAPSHOT_FORMAT:
+                logger.warning(f"Непідтримуваний формат знімка черг {self.path}: {data.get('format')}")
+                return False
+            self.state.restore(data["queues"])
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.error(f"Помилка читання знімка черг {self.path}: {e}")
+            return False
+        self.restored = True
+        self._saved_revision = self.state.revision
+        age = time.time() - data.get("saved_at", time.time())
+        logger.info(f"Черги відновлено зі знімка {self.path} (вік {age:.0f} с)")
+        return True
+
+    async def save(self):
+        """Записує знімок, якщо черги змінилися після попереднього запису"""
+        revision = self.state.revision
+        if revision == self._saved_revision:
+            return
+        # Стан збирається в циклі подій, а серіалізація і запис — в окремому потоці
+        data = {"format": SNAPSHOT_FORMAT, "saved_at": time.time(), "queues": self.state.dump()}
+        try:
+            await asyncio.to_thread(self._write, data)
+            self._saved_revision = revision
+        except OSError as e:
+            logger.error(f"Помилка запису знімка черг {self.path}: {e}")
+
+    def start(self):
+        if self._task is not None:
+            return
+        if self.restored:
+            self._reconcile_task = asyncio.create_task(self._reconcile())
+        self._task = asyncio.create_task(self._run())
+
+    async def _reconcile(self):
+        started = time.perf_counter()
+        try:
+            mismatched = await self.state.reconcile()
+        except mysql.connector.Error as e:
+            logger.error(f"Помилка звірки знімка черг з базою даних: {e}")
+            return
+        log = logger.warning if mismatched else logger.info
+        log(f"Знімок черг звірено з базою даних за {time.perf_counter() - started:.2f} с, "
+            f"черг із розбіжностями: {mismatched}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.save()
+
+    async def stop(self):
+        """Зупиняє періодичний запис і зберігає остаточний знімок"""
+        for task in (self._task, self._reconcile_task):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._task = self._reconcile_task = None
+        await self.save()
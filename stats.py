@@ -0,0 +1,102 @@
+import time
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds} с"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes} хв {seconds} с" if seconds and minutes < 10 else f"{minutes} хв"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours} год {minutes} хв"
+
+
+class UniversityStats:
+    """Потокові агрегати однієї черги: фіксований набір чисел незалежно від трафіку"""
+
+    __slots__ = ("service", "interarrival", "abandonment", "last_served", "last_arrival", "joined", "left", "served")
+
+    def __init__(self):
+        self.service = None  # EWMA інтервалу між викликами одного користувача (секунди)
+        self.interarrival = None  # EWMA інтервалу між входами в чергу (секунди)
+        self.abandonment = None  # EWMA частки виходів із черги, що були самостійним виходом, а не викликом
+        self.last_served = None  # Початок поточного інтервалу обслуговування (None, якщо черга порожня)
+        self.last_arrival = None
+        self.joined = 0
+        self.left = 0
+        self.served = 0
+
+
+class QueueStats:
+    """Статистика черг за потоком подій, без запитів до історії.
+
+    Час обслуговування — експоненційне ковзне середнє (EWMA) інтервалу між
+    викликами з черги (/next, масовий виклик ділить інтервал на кількість
+    викликаних). Інтервали, довші за max_gap (перерва, кінець дня), і час,
+    коли черга була порожня, у середнє не потрапляють. Так само рахуються
+    потік приходу і частка тих, хто покидає чергу. Зразки, коротші за
+    min_interval (кілька подій за один такт, масове перенесення черги),
+    рахуються як min_interval, тож середні ніколи не дорівнюють нулю.
+    """
+
+    def __init__(self, alpha: float = 0.2, max_gap: float = 1800.0, min_interval: float = 1.0):
+        self.alpha = alpha
+        self.max_gap = max_gap
+        self.min_interval = min_interval
+        self._stats = {}  # {university_id: UniversityStats}
+
+    def get(self, university_id: int) -> UniversityStats:
+        stats = self._stats.get(university_id)
+        if stats is None:
+            stats = self._stats[university_id] = UniversityStats()
+        return stats
+
+    def _ewma(self, average, sample: float) -> float:
+        return sample if average is None else average + self.alpha * (sample - average)
+
+    def on_join(self, university_id: int, position: int, now: float = None):
+        now = time.monotonic() if now is None else now
+        stats = self.get(university_id)
+        stats.joined += 1
+        if stats.last_arrival is not None and now - stats.last_arrival <= self.max_gap:
+            stats.interarrival = self._ewma(stats.interarrival, max(now - stats.last_arrival, self.min_interval))
+        stats.last_arrival = now
+        if position == 1:
+            stats.last_served = now  # Черга була порожня: обслуговування починається з цього моменту
+
+    def on_leave(self, university_id: int, remaining: int):
+        stats = self.get(university_id)
+        stats.left += 1
+        stats.abandonment = self._ewma(stats.abandonment, 1.0)
+        if not remaining:
+            stats.last_served = None
+
+    def on_remove(self, university_id: int, remaining: int):
+        """Адміністратор прибрав користувачів з черги (не виклик і не самостійний вихід)"""
+        if not remaining:
+            self.get(university_id).last_served = None
+
+    def on_serve(self, university_id: int, count: int, remaining: int, now: float = None):
+        """Виклик count користувачів; remaining — скільки залишилося в черзі"""
+        now = time.monotonic() if now is None else now
+        stats = self.get(university_id)
+        stats.served += count
+        if stats.last_served is not None and now - stats.last_served <= self.max_gap:
+            stats.service = self._ewma(stats.service, max((now - stats.last_served) / count, self.min_interval))
+        stats.last_served = now if remaining else None
+        # count нульових зразків частки виходів за один крок
+        stats.abandonment = 0.0 if stats.abandonment is None else stats.abandonment * (1.0 - self.alpha) ** count
+
+    def estimate_wait(self, university_id: int, position: int):
+        """Орієнтовний час до виклику користувача на позиції position (секунди) або None"""
+        stats = self._stats.get(university_id)
+        if stats is None or stats.service is None:
+            return None
+        # Частина тих, хто попереду, піде сама, тож чекати доведеться лише на решту
+        ahead = (position - 1) * (1.0 - (stats.abandonment or 0.0))
+        return stats.service * (1.0 + ahead)
+
+    def service_times(self) -> dict:
+        """EWMA часу обслуговування для /metrics: {university_id: секунди}"""
+        return {university_id: stats.service for university_id, stats in self._stats.items() if stats.service is not None}
@@ -0,0 +1,161 @@
+from array import array
+
+
+class UniversityQueue:
+    """Черга університету з O(1) перевіркою членства та O(log n) пошуком позиції.
+
+    Кожен користувач займає слот із порядковим номером; над слотами побудоване
+    дерево Фенвіка з кількістю живих записів, тож позиція користувача — це
+    префіксна сума до його слота. Видалені слоти стають порожніми й періодично
+    ущільнюються. Слоти, час входу і дерево зберігаються в масивах array
+    (8 байт на значення) замість списків Python-об'єктів.
+    """
+
+    MIN_CAPACITY = 16
+    EMPTY = 0  # Позначка видаленого слота (user_id у Telegram завжди додатний)
+
+    def __init__(self, user_ids=(), joined_at=()):
+        self._index = {}  # {user_id: slot}
+        self._slots = array("q")  # user_id або EMPTY для видалених
+        self._joined = array("d")  # Час входу в чергу (секунди epoch) для кожного слота
+        self._head = 0  # Перший слот, що може бути живим
+        user_ids = list(user_ids)
+        joined_at = list(joined_at) or [0.0] * len(user_ids)
+        self._rebuild(user_ids, joined_at)
+
+    def _rebuild(self, user_ids, joined_at):
+        """Перебудовує слоти та дерево Фенвіка за O(n)"""
+        capacity = max(self.MIN_CAPACITY, 2 * len(user_ids))
+        self._slots = array("q", user_ids)
+        self._joined = array("d", joined_at)
+        self._index = {user_id: slot for slot, user_id in enumerate(user_ids)}
+        if len(self._index) != len(self._slots):
+            raise ValueError("Користувач не може бути в черзі двічі")
+        self._head = 0
+        tree = array("q", bytes(8 * (capacity + 1)))
+        live = len(self._slots)
+        for i in range(1, capacity + 1):
+            if i <= live:
+                tree[i] += 1
+            parent = i + (i & -i)
+            if parent <= capacity:
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _live(self):
+        """Живі записи по порядку: ([user_id], [час входу])"""
+        slots, joined = self._slots, self._joined
+        live = [slot for slot in range(self._head, len(slots)) if slots[slot] != self.EMPTY]
+        return [slots[slot] for slot in live], [joined[slot] for slot in live]
+
+    def _add(self, slot: int, delta: int):
+        i = slot + 1
+        tree = self._tree
+        size = len(tree)
+        while i < size:
+            tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, slot: int) -> int:
+        """Кількість живих записів у слотах [0, slot]"""
+        i = slot + 1
+        tree = self._tree
+        total = 0
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def _compact_if_sparse(self):
+        dead = len(self._slots) - len(self._index)
+        if dead > self.MIN_CAPACITY and dead > len(self._index):
+            self._rebuild(*self._live())
+
+    def __len__(self):
+        return len(self._index)
+
+    def __bool__(self):
+        return bool(self._index)
+
+    def __contains__(self, user_id):
+        return user_id in self._index
+
+    def __iter__(self):
+        slots = self._slots
+        for slot in range(self._head, len(slots)):
+            user_id = slots[slot]
+            if user_id != self.EMPTY:
+                yield user_id
+
+    def append(self, user_id: int, joined_at: float = 0.0):
+        """Додає користувача в кінець черги; joined_at — час входу (секунди epoch)"""
+        if user_id in self._index:
+            raise ValueError(f"Користувач {user_id} уже в черзі")
+        slot = len(self._slots)
+        if slot + 1 >= len(self._tree):
+            user_ids, joined = self._live()
+            self._rebuild(user_ids + [user_id], joined + [joined_at])
+            return
+        self._slots.append(user_id)
+        self._joined.append(joined_at)
+        self._index[user_id] = slot
+        self._add(slot, 1)
+
+    def remove(self, user_id: int):
+        """Видаляє користувача з будь-якого місця черги"""
+        slot = self._index.pop(user_id)  # KeyError, якщо користувача немає
+        self._slots[slot] = self.EMPTY
+        self._add(slot, -1)
+        self._compact_if_sparse()
+
+    def first(self):
+        """Повертає першого користувача черги або None"""
+        slots = self._slots
+        while self._head < len(slots) and slots[self._head] == self.EMPTY:
+            self._head += 1
+        return slots[self._head] if self._head < len(slots) else None
+
+    def popleft(self) -> int:
+        """Видаляє та повертає першого користувача черги"""
+        user_id = self.first()
+        if user_id is None:
+            raise IndexError("pop from an empty queue")
+        self.remove(user_id)
+        return user_id
+
+    def position(self, user_id: int):
+        """Позиція користувача (з 1) або None, якщо його немає в черзі"""
+        slot = self._index.get(user_id)
+        if slot is None:
+            return None
+        return self._prefix(slot)
+
+    def _find(self, position: int) -> int:
+        """Слот запису на позиції position (з 1) спуском по дереву Фенвіка за O(log n)"""
+        tree = self._tree
+        slot, step = 0, 1 << (len(tree) - 1).bit_length()
+        while step:
+            upper = slot + step
+            if upper < len(tree) and tree[upper] < position:
+                slot = upper
+                position -= tree[upper]
+            step >>= 1
+        return slot
+
+    def window(self, start: int, count: int) -> list:
+        """До count користувачів, починаючи з позиції start (з 1), без обходу всієї черги"""
+        start = max(start, 1)
+        if count <= 0 or start > len(self._index):
+            return []
+        slots = self._slots
+        result = []
+        slot = self._find(start)
+        while slot < len(slots) and len(result) < count:
+            if slots[slot] != self.EMPTY:
+                result.append(slots[slot])
+            slot += 1
+        return result
+
+    def joined_at(self, user_id: int) -> float:
+        """Час входу користувача в чергу (секунди epoch)"""
+        return self._joined[self._index[user_id]]
@@ -0,0 +1,36 @@
+import logging
+
+import mysql.connector
+from aiogram import BaseMiddleware
+
+logger = logging.getLogger(__name__)
+
+
+class UserContextMiddleware(BaseMiddleware):
+    """Завантажує контекст користувача один раз на оновлення і передає його обробникам.
+
+    Підключається як зовнішній middleware спостерігача, тому працює ще до
+    фільтрів. Обробники отримують іменовані аргументи profile (UserProfile
+    або None), is_admin і university_id (вибраний університет із даних FSM).
+    Профіль береться з кешу QueueManager, а дані FSM у MySQLStorage
+    читаються разом зі станом, який aiogram завантажує на кожне оновлення,
+    тож оновлення коштує одного запиту до fsm_storage і, лише при промаху
+    кешу, ще одного до users.
+    """
+
+    def __init__(self, queue_manager):
+        self.queue_manager = queue_manager
+
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        profile = None
+        if user is not None:
+            try:
+                profile = await self.queue_manager.get_user_profile(user.id)
+            except mysql.connector.Error as e:
+                logger.error(f"Помилка завантаження профілю користувача {user.id}: {e}")
+        state = data.get("state")
+        data["profile"] = profile
+        data["is_admin"] = profile is not None and profile.is_admin
+        data["university_id"] = (await state.get_data()).get("university_id") if state is not None else None
+        return await handler(event, data)
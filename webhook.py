@@ -0,0 +1,89 @@
+import asyncio
+import hmac
+import logging
+
+from aiohttp import web
+from aiogram.types import Update
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """HTTP-сервер для прийому оновлень Telegram через вебхук.
+
+    Перевіряє секретний токен, обробляє не більше max_concurrency оновлень
+    одночасно і під час зупинки перестає приймати нові запити та чекає
+    завершення тих, що вже обробляються.
+    """
+
+    def __init__(self, dp, bot, path: str = "/webhook", secret_token: str = None, max_concurrency: int = 40):
+        self.dp = dp
+        self.bot = bot
+        self.path = path
+        self.secret_token = secret_token
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._draining = False
+        self._runner = None
+
+    def _authorized(self, request: web.Request) -> bool:
+        if not self.secret_token:
+            return True
+        received = request.headers.get(SECRET_HEADER, "")
+        return hmac.compare_digest(received.encode(), self.secret_token.encode())
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not self._authorized(request):
+            logger.warning(f"Запит на вебхук з невірним секретним токеном від {request.remote}")
+            return web.Response(status=401)
+        if self._draining:
+            # Telegram повторить оновлення пізніше, коли бот знову запуститься
+            return web.Response(status=503)
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except Exception as e:
+            logger.error(f"Некоректне оновлення на вебхуку: {e}")
+            return web.Response(status=400)
+
+        self.in_flight += 1
+        self._idle.clear()
+        try:
+            async with self._semaphore:
+                await self.dp.feed_update(self.bot, update)
+        except Exception as e:
+            # Відповідаємо 200, щоб Telegram не надсилав те саме оновлення повторно
+            logger.error(f"Помилка обробки оновлення {update.update_id}: {e}")
+        finally:
+            self.in_flight -= 1
+            if self.in_flight == 0:
+                self._idle.set()
+        return web.Response()
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        return app
+
+    async def start(self, host: str, port: int):
+        self._runner = web.AppRunner(self.make_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logger.info(f"🌐 Вебхук слухає http://{host}:{port}{self.path}")
+
+    async def stop(self, timeout: float = 30.0):
+        """Припиняє прийом оновлень і чекає (не довше timeout) на обробку поточних"""
+        if self._runner is None:
+            return
+        self._draining = True
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Вебхук зупинено з {self.in_flight} необробленими оновленнями")
+        await self._runner.cleanup()
+        self._runner = None
+        logger.info("Вебхук зупинено")